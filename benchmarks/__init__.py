@@ -0,0 +1,32 @@
+"""
+Performance benchmarks for ``revenue_tracker``.
+
+Run them from the repository root with the app and its dependencies
+installed, e.g.::
+
+    python -m benchmarks.explain --transactions 1000000
+
+They use ``benchmarks.settings`` unless ``DJANGO_SETTINGS_MODULE`` is set,
+and always run against a throwaway test database.
+"""
+import contextlib
+import os
+
+
+def setup():
+    """Configure Django for a benchmark script."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database(verbosity=0):
+    """Create (and afterwards destroy) a migrated test database."""
+    from django.test.utils import setup_databases, teardown_databases
+
+    old_config = setup_databases(verbosity, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity)
@@ -0,0 +1,57 @@
+"""
+Compare two result files written by ``benchmarks.run``.
+
+    python -m benchmarks.compare before.json after.json
+
+Prints the median time and query count of each benchmark in both files,
+flagging those that got slower by more than ``--threshold`` or that run
+more queries.
+"""
+import argparse
+import json
+
+
+def load(path):
+    with open(path) as f:
+        results = json.load(f)
+    return results, {
+        (result['kind'], result['name']): result
+        for result in results['results']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument(
+        '--threshold', default=0.1, type=float,
+        help='Relative slowdown to flag as a regression (default: 0.1).')
+    args = parser.parse_args()
+
+    before, before_results = load(args.before)
+    after, after_results = load(args.after)
+    if before['data'] != after['data'] or before['seed'] != after['seed']:
+        print('Warning: the result files were seeded with different data.')
+
+    regressions = 0
+    print('{:<45} {:>10} {:>10} {:>8} {:>9}'.format(
+        'benchmark', 'before', 'after', 'change', 'queries'))
+    for key, result in after_results.items():
+        previous = before_results.get(key)
+        if previous is None:
+            continue
+        change = result['median'] / previous['median'] - 1
+        regressed = (
+            change > args.threshold or result['queries'] > previous['queries'])
+        regressions += regressed
+        print('{:<45} {:>9.4f}s {:>9.4f}s {:>+7.0%} {:>4} {:>4}{}'.format(
+            key[1][:45], previous['median'], result['median'], change,
+            previous['queries'], result['queries'], '  !' if regressed else ''))
+
+    print('{} regressions'.format(regressions))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
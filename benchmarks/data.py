@@ -0,0 +1,202 @@
+"""
+Deterministic synthetic data for the benchmarks.
+
+``generate()`` fills an empty database with customers, vendors, base price
+periods and transactions. The same arguments always produce the same rows.
+"""
+import datetime
+import itertools
+import random
+from decimal import Decimal
+
+from django.db import models
+from django.utils import timezone
+
+from revenue_tracker.models import (
+    BasePrice, Customer, CustomerStats, QuarterlyRevenue, Transaction, Vendor,
+    VendorStats)
+from revenue_tracker.models.transactions import (
+    TRANSACTION_TYPE_CHOICES, get_price_period_index)
+
+
+FIRST_DATE = datetime.date(2012, 1, 1)
+
+# A fixed end date, so the data does not depend on when it is generated.
+LAST_DATE = datetime.date(2019, 12, 31)
+
+INSTITUTION_TYPES = ['Academic', 'Government', 'Industry']
+
+TRANSACTION_TYPES = [choice for choice, label in TRANSACTION_TYPE_CHOICES]
+
+
+def required_values(model, index, shared, **values):
+    """
+    Return ``values`` plus values for the other fields of ``model`` that
+    must be set, derived from ``index`` so they are unique and
+    reproducible. Required foreign keys point to one object per related
+    model, created on demand and kept in ``shared``.
+
+    This keeps the generator working across versions of the models it
+    does not own, such as those of ``customer_tracker``.
+    """
+    for field in model._meta.concrete_fields:
+        if (field.name in values or field.primary_key or field.null
+                or field.blank or field.has_default()):
+            continue
+        if field.choices:
+            choices = [choice for choice, label in field.flatchoices]
+            values[field.name] = choices[index % len(choices)]
+        elif isinstance(field, models.ForeignKey):
+            values[field.name] = shared_instance(field.related_model, shared)
+        elif isinstance(field, models.EmailField):
+            values[field.name] = 'user{}@example.com'.format(index)
+        elif isinstance(field, models.URLField):
+            values[field.name] = 'https://example.com/{}'.format(index)
+        elif isinstance(field, (models.CharField, models.TextField)):
+            suffix = str(index)
+            prefix = field.name
+            if field.max_length:
+                prefix = prefix[:max(field.max_length - len(suffix), 0)]
+            values[field.name] = prefix + suffix
+        elif isinstance(field, models.DateTimeField):
+            values[field.name] = timezone.now()
+        elif isinstance(field, models.DateField):
+            values[field.name] = FIRST_DATE
+        elif isinstance(field, models.BooleanField):
+            values[field.name] = False
+        elif isinstance(field, (models.IntegerField, models.DecimalField,
+                                models.FloatField)):
+            values[field.name] = index % 100
+    return values
+
+
+def shared_instance(model, shared):
+    if model not in shared:
+        shared[model] = model.objects.create(
+            **required_values(model, 0, shared))
+    return shared[model]
+
+
+def create_customers(number, rnd, shared):
+    institution_model = Customer._meta.get_field('institution').related_model
+    type_field = institution_model._meta.get_field('institution_type')
+    institutions = []
+    for index in range(max(number // 2, 1)):
+        values = {}
+        if not type_field.choices:
+            values['institution_type'] = INSTITUTION_TYPES[
+                index % len(INSTITUTION_TYPES)]
+        institutions.append(institution_model.objects.create(
+            **required_values(institution_model, index, shared, **values)))
+    return [
+        Customer.objects.create(**required_values(
+            Customer, index, shared, institution=rnd.choice(institutions)))
+        for index in range(number)
+    ]
+
+
+def create_vendors(number, shared):
+    return [
+        Vendor.objects.create(**required_values(
+            Vendor, index, shared, name='Vendor {}'.format(index)))
+        for index in range(number)
+    ]
+
+
+def create_base_prices(last_date):
+    """Create a price period per transaction type for every year."""
+    for years in range(last_date.year - FIRST_DATE.year + 1):
+        for offset, transaction_type in enumerate(TRANSACTION_TYPES):
+            BasePrice.objects.create(
+                start_date=FIRST_DATE.replace(year=FIRST_DATE.year + years),
+                transaction_type=transaction_type,
+                price_per_reaction=Decimal('10.00') + offset + years,
+            )
+
+
+def generate_transactions(number, rnd, customers, vendors, last_date):
+    days = (last_date - FIRST_DATE).days
+    # A few customers account for most transactions, as in real data.
+    cum_weights = list(itertools.accumulate(
+        1 / (rank + 1) for rank in range(len(customers))))
+    price_indexes = {
+        transaction_type: get_price_period_index(transaction_type)
+        for transaction_type in TRANSACTION_TYPES
+    }
+    for _ in range(number):
+        transaction_type = rnd.choice(TRANSACTION_TYPES)
+        date = FIRST_DATE + datetime.timedelta(days=rnd.randint(0, days))
+        date_fulfilled = None
+        date_paid = None
+        if rnd.random() < 0.85:
+            date_fulfilled = min(
+                date + datetime.timedelta(days=rnd.randint(0, 60)), last_date)
+            if rnd.random() < 0.8:
+                date_paid = min(
+                    date_fulfilled + datetime.timedelta(
+                        days=rnd.randint(0, 90)),
+                    last_date)
+        number_of_reactions = rnd.randint(1, 96)
+        total_price = Decimal(number_of_reactions * rnd.randint(8, 20))
+        if transaction_type == 'kit':
+            ip_related_price = total_price
+        else:
+            ip_related_price = (total_price * Decimal('0.6')).quantize(
+                Decimal('0.01'))
+        yield Transaction(
+            transaction_type=transaction_type,
+            customer=rnd.choices(customers, cum_weights=cum_weights)[0],
+            vendor=rnd.choice(vendors) if rnd.random() < 0.3 else None,
+            number_of_reactions=number_of_reactions,
+            total_price=total_price,
+            ip_related_price=ip_related_price,
+            base_ip_related_price_per_reaction=(
+                price_indexes[transaction_type].get_price(date) or 0),
+            date=date,
+            date_fulfilled=date_fulfilled,
+            date_paid=date_paid,
+        )
+
+
+def generate(transactions=10000, customers=None, vendors=None, seed=0,
+             last_date=LAST_DATE, batch_size=5000):
+    """
+    Fill the database with ``transactions`` transactions dated from
+    ``FIRST_DATE`` to ``last_date``, by default from one customer per 100
+    transactions and one vendor per 1,000, and fill in their search text
+    and rebuild the quarterly revenue rollup and the lifetime stats.
+
+    Returns the number of rows created per model and the last date.
+    """
+    if customers is None:
+        customers = max(transactions // 100, 10)
+    if vendors is None:
+        vendors = max(transactions // 1000, 3)
+
+    rnd = random.Random(seed)
+    shared = {}
+    customer_list = create_customers(customers, rnd, shared)
+    vendor_list = create_vendors(vendors, shared)
+    create_base_prices(last_date)
+
+    batch = []
+    for transaction in generate_transactions(
+            transactions, rnd, customer_list, vendor_list, last_date):
+        batch.append(transaction)
+        if len(batch) == batch_size:
+            Transaction.objects.bulk_create(batch)
+            batch = []
+    Transaction.objects.bulk_create(batch)
+    Transaction.objects.update_search_text()
+    Transaction.objects.update_derived_prices()
+    QuarterlyRevenue.objects.rebuild()
+    CustomerStats.objects.rebuild()
+    VendorStats.objects.rebuild()
+
+    return {
+        'customers': customers,
+        'vendors': vendors,
+        'base_prices': BasePrice.objects.count(),
+        'transactions': transactions,
+        'last_date': last_date.isoformat(),
+    }
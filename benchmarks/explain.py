@@ -0,0 +1,88 @@
+"""
+Print the query plans of the report and list queries on a seeded database,
+to check that they use the indexes added in migration 0004.
+
+    python -m benchmarks.explain --transactions 1000000
+"""
+import argparse
+import datetime
+
+from benchmarks import setup, test_database
+
+
+def report_queries():
+    """Return (label, queryset) pairs for the query shapes to explain."""
+    from django.db.models import Min
+
+    from revenue_tracker.models import BasePrice, Transaction
+    from revenue_tracker.models.reports import get_period_dates
+    from revenue_tracker.models.transactions import _report_sums
+
+    year = Transaction.objects.aggregate(year=Min('date'))['year'].year + 1
+    from_date, to_date = get_period_dates(year, 'Q2')
+    customer_id = Transaction.objects.values_list(
+        'customer_id', flat=True).first()
+
+    def sums(queryset):
+        return queryset.order_by().values('transaction_type').annotate(
+            **_report_sums())
+
+    return [
+        ('Period report', sums(Transaction.objects.get_report_queryset(
+            from_date=from_date, to_date=to_date))),
+        ('Period report for one transaction type', sums(
+            Transaction.objects.get_report_queryset(
+                from_date=from_date, to_date=to_date,
+                transaction_type='kit'))),
+        ('Unfulfilled report', sums(Transaction.objects.get_report_queryset(
+            in_progress_only=True))),
+        ('Outstanding report', sums(Transaction.objects.get_report_queryset(
+            outstanding=True))),
+        ('Pending transactions list', Transaction.objects.filter(
+            date_fulfilled__isnull=True)[:100]),
+        ('Outstanding invoices list', Transaction.objects.filter(
+            date_fulfilled__isnull=False, date_paid__isnull=True,
+        ).order_by('date_fulfilled', 'customer_id', 'pk')[:100]),
+        ('Transaction list', Transaction.objects.all()[:100]),
+        ('Customer transactions', Transaction.objects.filter(
+            customer_id=customer_id)),
+        ('Base price in effect', BasePrice.objects.filter(
+            transaction_type='kit', start_date__lte=datetime.date.today(),
+        ).order_by('-start_date')[:1]),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--transactions', default=1000000, type=int,
+        help='Number of transactions to seed (default: 1,000,000).')
+    parser.add_argument(
+        '--seed', default=0, type=int,
+        help='Random seed for the data generator (default: 0).')
+    parser.add_argument(
+        '--analyze', action='store_true',
+        help='Run the queries and show actual timings (PostgreSQL only).')
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection
+
+    from benchmarks.data import generate
+
+    with test_database():
+        generate(transactions=args.transactions, seed=args.seed)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        options = {}
+        if args.analyze and connection.vendor == 'postgresql':
+            options['analyze'] = True
+        for label, queryset in report_queries():
+            print('-- {}'.format(label))
+            print(queryset.explain(**options))
+            print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+"""
+Time the royalties reports, the revenue_tracker views and the admin
+changelists on a seeded database, and write the results as JSON.
+
+    python -m benchmarks.run --transactions 100000 --output results.json
+
+Each benchmark records its query count and its wall time over several
+runs. Compare two result files with ``python -m benchmarks.compare``.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+
+from benchmarks import setup, test_database
+
+
+def report_benchmarks():
+    """Return (name, callable) pairs for the report methods."""
+    from django.db.models import Count, Max, Min
+
+    from revenue_tracker.models import Transaction
+
+    dates = Transaction.objects.aggregate(first=Min('date'), last=Max('date'))
+    year = dates['last'].year - 1
+    customer_id = Transaction.objects.values('customer').annotate(
+        count=Count('pk')).order_by('-count')[0]['customer']
+    manager = Transaction.objects
+
+    return [
+        ('get_royalties_report', manager.get_royalties_report),
+        ('get_royalties_report (year)', lambda: manager.get_royalties_report(
+            from_date=dates['last'].replace(month=1, day=1),
+            to_date=dates['last'])),
+        ('get_royalties_report (outstanding)',
+            lambda: manager.get_royalties_report(outstanding=True)),
+        ('get_royalties_report_bundle', manager.get_royalties_report_bundle),
+        ('get_period_report (year)',
+            lambda: manager.get_period_report(year)),
+        ('get_period_report (quarter)',
+            lambda: manager.get_period_report(year, 'Q2')),
+        ('get_period_report (transaction type)',
+            lambda: manager.get_period_report(year, transaction_type='kit')),
+        ('get_period_report (customer)',
+            lambda: manager.get_period_report(year, customer_id=customer_id)),
+    ] + cube_benchmarks(dates['last'])
+
+
+def cube_benchmarks(last):
+    """Return (name, callable) pairs for the royalty cube, if available."""
+    from revenue_tracker import cube
+
+    if cube.numpy is None:
+        return []
+    royalty_cube = cube.RoyaltyCube().load()
+    return [
+        ('cube load', lambda: cube.RoyaltyCube().load()),
+        ('cube refresh', royalty_cube.refresh),
+        ('cube report (year)', lambda: royalty_cube.report(
+            from_date=last.replace(month=1, day=1), to_date=last)),
+        ('cube report (by vendor and quarter)',
+            lambda: royalty_cube.report(group_by=['vendor', 'quarter'])),
+        ('cube report (by customer)',
+            lambda: royalty_cube.report(group_by='customer')),
+    ]
+
+
+def view_urls():
+    """Return (name, url) pairs for every revenue_tracker view."""
+    from django.db.models import Count, Max
+    from django.urls import reverse
+
+    from revenue_tracker import urls
+    from revenue_tracker.models import Customer, Transaction, Vendor
+
+    busiest = {
+        'customer_detail': Customer.objects.annotate(
+            count=Count('transactions')).order_by('-count')[0].pk,
+        'vendor_detail': Vendor.objects.annotate(
+            count=Count('transactions')).order_by('-count')[0].pk,
+        'transaction_detail': Transaction.objects.latest('date').pk,
+    }
+    year = Transaction.objects.aggregate(last=Max('date'))['last'].year - 1
+
+    pairs = []
+    for pattern in urls.urlpatterns:
+        name = 'revenue_tracker:{}'.format(pattern.name)
+        if pattern.name == 'transaction_export':
+            pairs.extend(
+                ('{} ({})'.format(pattern.name, format),
+                    reverse(name, kwargs={'format': format}))
+                for format in ['csv', 'xlsx'])
+            continue
+        if pattern.name in busiest:
+            url = reverse(name, kwargs={'pk': busiest[pattern.name]})
+        else:
+            url = reverse(name)
+        pairs.append((pattern.name, url))
+    transaction_list = reverse('revenue_tracker:transaction_list')
+    pairs.extend([
+        ('transaction_list (quarter)',
+            '{}?year={}&quarter=Q2'.format(transaction_list, year)),
+        ('transaction_list (filtered)',
+            '{}?institution_type=Academic&transaction_type=kit'.format(
+                transaction_list)),
+    ])
+    return pairs
+
+
+def admin_urls():
+    """Return (name, url) pairs for the revenue_tracker admin changelists."""
+    from django.contrib import admin
+    from django.urls import reverse
+
+    pairs = sorted(
+        (
+            'admin {}'.format(model._meta.model_name),
+            reverse('admin:{}_{}_changelist'.format(
+                model._meta.app_label, model._meta.model_name)),
+        )
+        for model in admin.site._registry
+        if model._meta.app_label == 'revenue_tracker'
+    )
+    pairs.append((
+        'admin transaction search',
+        reverse('admin:revenue_tracker_transaction_changelist')
+        + '?q=vendor+1',
+    ))
+    return pairs
+
+
+def get_url(client, url):
+    def view():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError('{} returned {}'.format(
+                url, response.status_code))
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return view
+
+
+def clear_caches():
+    from django.conf import settings
+    from django.core.cache import caches
+
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+def measure(function, repeat, warm_cache):
+    """
+    Return the query count of ``function`` and its wall times over
+    ``repeat`` runs.
+    """
+    from revenue_tracker.instrumentation import RequestTimings, recording
+
+    if not warm_cache:
+        clear_caches()
+    # Count the queries before the timed runs. The recorder also counts
+    # those of the threads a page computes its panels in.
+    timings = RequestTimings()
+    with recording(timings):
+        function()
+    query_count = timings.query_count
+
+    times = []
+    for _ in range(repeat):
+        if not warm_cache:
+            clear_caches()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return {
+        'queries': query_count,
+        'repeat': repeat,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+    }
+
+
+def database_version(connection):
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version
+    if connection.vendor == 'postgresql':
+        return str(connection.pg_version)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--transactions', default=10000, type=int,
+        help='Number of transactions to seed (default: 10,000).')
+    parser.add_argument(
+        '--customers', type=int,
+        help='Number of customers (default: one per 100 transactions).')
+    parser.add_argument(
+        '--vendors', type=int,
+        help='Number of vendors (default: one per 1,000 transactions).')
+    parser.add_argument(
+        '--seed', default=0, type=int,
+        help='Random seed for the data generator (default: 0).')
+    parser.add_argument(
+        '--repeat', default=5, type=int,
+        help='Number of timed runs per benchmark (default: 5).')
+    parser.add_argument(
+        '--warm-cache', action='store_true',
+        help='Keep the cache between runs instead of clearing it.')
+    parser.add_argument(
+        '--only',
+        help='Only run benchmarks whose name contains this string.')
+    parser.add_argument(
+        '--label',
+        help='Label stored with the results, e.g. a release or commit.')
+    parser.add_argument(
+        '--output',
+        help='File to write the JSON results to (default: standard output).')
+    args = parser.parse_args()
+
+    setup()
+    import django
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+
+    from benchmarks.data import generate
+
+    with test_database():
+        start = time.perf_counter()
+        data = generate(
+            transactions=args.transactions,
+            customers=args.customers,
+            vendors=args.vendors,
+            seed=args.seed,
+        )
+        generate_seconds = time.perf_counter() - start
+
+        user = User.objects.create_superuser(
+            'benchmark', 'benchmark@example.com', 'benchmark')
+        client = Client()
+        client.force_login(user)
+
+        benchmarks = [
+            ('report', name, function)
+            for name, function in report_benchmarks()
+        ]
+        benchmarks.extend(
+            ('view', name, get_url(client, url))
+            for name, url in view_urls() + admin_urls()
+        )
+
+        results = []
+        for kind, name, function in benchmarks:
+            if args.only and args.only not in name:
+                continue
+            result = {'kind': kind, 'name': name}
+            result.update(measure(function, args.repeat, args.warm_cache))
+            results.append(result)
+            print('{:>9.4f}s {:>5} queries  {}'.format(
+                result['median'], result['queries'], name), file=sys.stderr)
+
+        output = {
+            'label': args.label,
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'database_version': database_version(connection),
+            },
+            'data': data,
+            'seed': args.seed,
+            'generate_seconds': generate_seconds,
+            'warm_cache': args.warm_cache,
+            'results': results,
+        }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
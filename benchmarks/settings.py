@@ -0,0 +1,118 @@
+"""
+Django settings for running the benchmarks outside of a project.
+
+SQLite is used by default. To benchmark a local PostgreSQL server instead,
+set ``BENCHMARK_DATABASE=postgresql`` and, as needed, ``BENCHMARK_DB_NAME``,
+``BENCHMARK_DB_USER``, ``BENCHMARK_DB_PASSWORD``, ``BENCHMARK_DB_HOST`` and
+``BENCHMARK_DB_PORT``. The benchmarks always run against a throwaway test
+database created from these settings.
+
+Set ``BENCHMARK_REPLICA=1`` to also route the views' reads to a ``replica``
+database. Locally it is a second connection to the same test database (a
+test mirror), which exercises the routing without a real replica.
+"""
+import os
+
+
+SECRET_KEY = 'revenue-tracker-benchmarks'
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['testserver']
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'django.contrib.humanize',
+    'ordered_model',
+    'crispy_forms',
+    'tempus_dominus',
+    'djmoney',
+    'customer_tracker',
+    'dropbox_file_tracker',
+    'project_home_tags',
+    'ngs_project_tracker',
+    'revenue_tracker',
+]
+
+MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+]
+
+ROOT_URLCONF = 'benchmarks.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+# Connections are kept open, as the README recommends for the report
+# thread pool.
+if os.environ.get('BENCHMARK_DATABASE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('BENCHMARK_DB_NAME', 'revenue_tracker'),
+            'USER': os.environ.get('BENCHMARK_DB_USER', ''),
+            'PASSWORD': os.environ.get('BENCHMARK_DB_PASSWORD', ''),
+            'HOST': os.environ.get('BENCHMARK_DB_HOST', ''),
+            'PORT': os.environ.get('BENCHMARK_DB_PORT', ''),
+            'CONN_MAX_AGE': 60,
+        },
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('BENCHMARK_DB_NAME', 'benchmarks.sqlite3'),
+            'CONN_MAX_AGE': 60,
+        },
+    }
+
+if os.environ.get('BENCHMARK_REPLICA'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'], TEST={'MIRROR': 'default'})
+    DATABASE_ROUTERS = ['revenue_tracker.routers.ReplicaRouter']
+    MIDDLEWARE.append('revenue_tracker.routers.ReplicaMiddleware')
+    ROYALTY_REPLICA_DATABASE = 'replica'
+
+# Cached template fragments get a cache of their own with room for a row
+# per transaction, as the README recommends.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+USE_TZ = True
+
+STATIC_URL = '/static/'
+MEDIA_URL = '/files/'
+
+ROYALTY_PERCENTAGE = 0.025
+PHONENUMBER_DEFAULT_REGION = 'US'
+CRISPY_TEMPLATE_PACK = 'bootstrap4'
+DROPBOX_ACCESS_TOKEN = ''
+DROPBOX_APP_KEY = ''
+BRANDING_NAME = 'Benchmarks'
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from django.urls import include, path
+
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('projects/', include('ngs_project_tracker.urls', namespace='ngs_project_tracker')),
+    path('transactions/', include('revenue_tracker.urls', namespace='revenue_tracker')),
+]
@@ -0,0 +1 @@
+default_app_config = 'revenue_tracker.apps.RevenueTrackerConfig'
@@ -1,3 +1,4 @@
 from .people import CustomerAdmin, VendorAdmin
+from .reports import RoyaltySnapshotAdmin
 from .transactions import (BasePriceAdmin, InvoiceAdmin, QuoteAdmin,
     TransactionAdmin)
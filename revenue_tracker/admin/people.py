@@ -11,9 +11,39 @@ class VendorInline(admin.TabularInline):
     model = Vendor
 
 
+class RevenueStatsAdminMixin:
+    """
+    Sortable transaction statistics columns, annotated onto the changelist
+    queryset instead of queried per row.
+    """
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_revenue_stats()
+
+    def tx_count(self, obj):
+        return obj.tx_count
+    tx_count.admin_order_field = 'annotated_tx_count'
+    tx_count.short_description = 'transaction dates'
+
+    def reaction_count(self, obj):
+        return obj.reaction_count
+    reaction_count.admin_order_field = 'annotated_reaction_count'
+    reaction_count.short_description = 'reactions'
+
+    def total_revenue(self, obj):
+        return obj.total_revenue
+    total_revenue.admin_order_field = 'annotated_total_revenue'
+    total_revenue.short_description = 'total revenue'
+
+
 @admin.register(Customer)
-class CustomerAdmin(CustomerAdmin):
+class CustomerAdmin(RevenueStatsAdminMixin, CustomerAdmin):
     inlines = [TransactionInline]
+    list_display = list(CustomerAdmin.list_display) + [
+        'tx_count',
+        'reaction_count',
+        'total_revenue',
+    ]
     search_fields = [
         'institution__name',
         'name',
@@ -24,18 +54,22 @@ class CustomerAdmin(CustomerAdmin):
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.filter(transactions__isnull=False).distinct()
+        return qs.filter(annotated_transaction_count__gt=0)
 
 
 @admin.register(Vendor)
-class VendorAdmin(admin.ModelAdmin):
+class VendorAdmin(RevenueStatsAdminMixin, admin.ModelAdmin):
     inlines = [TransactionInline]
     list_display = [
         'name',
         'contact_name',
         'country',
         'website',
+        'tx_count',
+        'reaction_count',
+        'total_revenue',
     ]
+    list_select_related = ['contact', 'country']
     save_on_top = True
     search_fields = [
         'name',
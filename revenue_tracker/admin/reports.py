@@ -0,0 +1,17 @@
+from django.contrib import admin
+
+from ..models import RoyaltySnapshot
+
+
+@admin.register(RoyaltySnapshot)
+class RoyaltySnapshotAdmin(admin.ModelAdmin):
+    """
+    Closed periods, which are closed with ``manage.py close_royalty_period``
+    and reopened by deleting their snapshot.
+    """
+    list_display = ['__str__', 'closed', 'edited']
+    list_filter = ['year']
+    readonly_fields = ['year', 'quarter', 'closed', 'edited']
+
+    def has_add_permission(self, request):
+        return False
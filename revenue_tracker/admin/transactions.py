@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.http import HttpResponseRedirect
+from django.utils.text import smart_split, unescape_string_literal
 
 from ngs_project_tracker.models import Project
 
@@ -126,8 +127,10 @@ class TransactionAdmin(admin.ModelAdmin):
         FulfillmentStatusFilter,
         PaymentStatusFilter,
     ]
+    list_select_related = ['customer', 'vendor']
     readonly_fields = ['base_ip_related_price_per_reaction']
     save_on_top = True
+    # Searched through Transaction.search_text; see get_search_results().
     search_fields = [
         'customer__code',
         'customer__name',
@@ -139,6 +142,26 @@ class TransactionAdmin(admin.ModelAdmin):
         'vendor__contact__name',
     ]
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Match each word of the search (or quoted phrase) against the search
+        text copied from the ``search_fields`` of each transaction, without
+        joining their tables.
+        """
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            queryset = queryset.filter(search_text__contains=bit.lower())
+        return queryset, False
+
+    def price_per_sample(self, obj):
+        return obj.price_per_sample
+    price_per_sample.admin_order_field = 'price_per_sample_amount'
+
+    def royalties_owed(self, obj):
+        return obj.royalties_owed
+    royalties_owed.admin_order_field = 'royalties_owed_amount'
+
     def get_changeform_initial_data(self, request):
         initial = super().get_changeform_initial_data(request)
 
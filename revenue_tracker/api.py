@@ -0,0 +1,274 @@
+"""
+Read-only JSON views of the revenue data, taking the same filters as the
+HTML views.
+
+Every response carries an ETag and a Last-Modified date derived from the
+``reports`` version stamp, which changes whenever the data behind the
+reports does, so polling clients can make conditional requests and get a
+304 without the report being rebuilt. The ETags of views taking the
+transaction list's filters also cover the period those resolve to, which
+by default depends on the data and the date.
+"""
+import datetime
+import hashlib
+
+from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.db.models import Q, Sum
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import condition
+from django.views.generic import View
+
+from .exports import format_value
+from .models import Customer, QuarterlyRevenue, Transaction, Vendor
+from .models.reports import ROLLUP_FIELDS
+from .pagination import InvalidCursor, KeysetPaginator
+from .routers import ReplicaReadMixin
+from .versioning import get_version
+from .views import TransactionFilterMixin
+
+
+# (key, lookup) pairs for the fields of a transaction, where the lookup is
+# on ``Transaction``.
+TRANSACTION_FIELDS = [
+    ('id', 'pk'),
+    ('transaction_type', 'transaction_type'),
+    ('date', 'date'),
+    ('date_samples_arrived', 'date_samples_arrived'),
+    ('date_fulfilled', 'date_fulfilled'),
+    ('date_paid', 'date_paid'),
+    ('customer_id', 'customer_id'),
+    ('customer', 'customer__code'),
+    ('institution', 'customer__institution__name'),
+    ('institution_type', 'customer__institution__institution_type'),
+    ('vendor_id', 'vendor_id'),
+    ('vendor', 'vendor__name'),
+    ('number_of_reactions', 'number_of_reactions'),
+    ('quote', 'quote__number'),
+    ('order', 'order__number'),
+    ('invoice', 'invoice__number'),
+    ('total_price', 'total_price'),
+    ('ip_related_price', 'ip_related_price'),
+    ('base_ip_related_price_per_reaction',
+        'base_ip_related_price_per_reaction'),
+    ('ip_related_gross_price', 'ip_related_gross_price_amount'),
+    ('ip_related_discount', 'ip_related_discount_amount'),
+    ('ip_related_discount_pct', 'ip_related_discount_ratio'),
+    ('royalties_owed', 'royalties_owed_amount'),
+]
+
+
+def _format(data, key=''):
+    """Round the numbers of a report for JSON, recursively."""
+    if isinstance(data, dict):
+        return {key: _format(value, key) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_format(value, key) for value in data]
+    return format_value(data, key.endswith('_pct'))
+
+
+class JsonView(ReplicaReadMixin, PermissionRequiredMixin, View):
+    """
+    Serve the dict returned by ``get_data()``, which subclasses must
+    implement, as JSON, answering conditional requests from the ETag and
+    Last-Modified date without calling it.
+    """
+    permission_required = 'revenue_tracker.view_transaction'
+    raise_exception = True
+
+    def get(self, request, *args, **kwargs):
+        @condition(
+            etag_func=self.get_etag, last_modified_func=self.get_last_modified)
+        def respond(request):
+            return JsonResponse(self.get_data())
+        return respond(request)
+
+    def get_data(self):
+        raise NotImplementedError(
+            '{} must implement get_data().'.format(type(self).__name__))
+
+    def get_etag(self, request):
+        return self.make_etag(request.get_full_path())
+
+    def get_last_modified(self, request):
+        return datetime.datetime.fromtimestamp(
+            get_version('reports'), datetime.timezone.utc)
+
+    def make_etag(self, *parts):
+        """Return an ETag for the current data and ``parts``."""
+        return hashlib.md5(':'.join(
+            str(part) for part in [get_version('reports'), *parts]
+        ).encode()).hexdigest()
+
+
+class FilteredJsonView(TransactionFilterMixin, JsonView):
+    """
+    A ``JsonView`` taking the filters of ``TransactionList``. Without
+    dates, the period defaults to the first and last dates fulfilled, or
+    to today, so the ETag covers the period it resolves to, and responses
+    count as modified at the start of each day.
+    """
+
+    def get_etag(self, request):
+        from_date, to_date = self.transaction_date_range[:2]
+        return self.make_etag(request.get_full_path(), from_date, to_date)
+
+    def get_last_modified(self, request):
+        # Local midnight, as the period's default is in local dates.
+        today = datetime.datetime.combine(
+            datetime.date.today(), datetime.time()).astimezone()
+        return max(super().get_last_modified(request), today)
+
+
+class CustomerListJson(JsonView):
+    """Customers and their transaction stats, optionally by institution type."""
+
+    def get_data(self):
+        customers = Customer.objects.select_related(
+            'institution').with_revenue_stats()
+        institution_type = self.request.GET.get('institution_type')
+        if institution_type:
+            customers = customers.filter(
+                institution__institution_type=institution_type)
+        return {'results': [
+            {
+                'id': customer.pk,
+                'code': customer.code,
+                'name': customer.name,
+                'institution': customer.institution.name,
+                'institution_type': customer.institution.institution_type,
+                'transaction_count': customer.transaction_count,
+                'tx_count': customer.tx_count,
+                'reaction_count': customer.reaction_count,
+                'total_revenue': format_value(customer.total_revenue),
+                'is_repeat_customer': customer.is_repeat_customer,
+            }
+            for customer in customers
+        ]}
+
+
+class QuarterlySeriesJson(FilteredJsonView):
+    """
+    Revenue by the quarter it was fulfilled in, from the quarterly rollup,
+    for the quarters overlapping the filtered period.
+    """
+
+    def get_data(self):
+        from_date, to_date = self.transaction_date_range[:2]
+        from_quarter = (from_date.month - 1) // 3 + 1
+        to_quarter = (to_date.month - 1) // 3 + 1
+        rows = QuarterlyRevenue.objects.filter(
+            Q(year__gt=from_date.year)
+            | Q(year=from_date.year, quarter__gte=from_quarter),
+            Q(year__lt=to_date.year)
+            | Q(year=to_date.year, quarter__lte=to_quarter),
+        )
+        institution_type = self.request.GET.get('institution_type')
+        if institution_type:
+            rows = rows.filter(institution_type=institution_type)
+        transaction_type = self.request.GET.get('transaction_type')
+        if transaction_type:
+            rows = rows.filter(transaction_type=transaction_type)
+        return {'results': _format(list(
+            rows.order_by('year', 'quarter').values('year', 'quarter').annotate(
+                **{field: Sum(field) for field in ROLLUP_FIELDS.values()})
+        ))}
+
+
+class ReportJson(FilteredJsonView):
+    """
+    The royalties reports summarized by ``TransactionList``, with the same
+    filters.
+    """
+
+    def get_data(self):
+        from_date, to_date = self.transaction_date_range[:2]
+        data = Transaction.objects.get_royalties_report_bundle(
+            from_date=from_date,
+            to_date=to_date,
+            institution_type=self.request.GET.get('institution_type'),
+            transaction_type=self.request.GET.get('transaction_type'))
+        data['from_date'] = from_date
+        data['to_date'] = to_date
+        return _format(data)
+
+
+class RevenueSeriesJson(FilteredJsonView):
+    """
+    Revenue by the week, month, quarter or year it was fulfilled in
+    (``granularity``), with the filters of ``TransactionList``.
+    """
+
+    def get_data(self):
+        return {
+            'granularity': self.get_series_granularity(),
+            'results': _format(self.get_revenue_series()),
+        }
+
+
+class TransactionListJson(FilteredJsonView):
+    """
+    The transactions fulfilled in the filtered period, a page at a time
+    in the order of ``TransactionList``. ``next`` and ``previous`` link to
+    the neighbouring pages.
+    """
+    keyset_ordering = ['-date', 'customer_id', 'pk']
+    max_page_size = 1000
+    page_size = 100
+
+    def get_data(self):
+        try:
+            page_size = min(
+                int(self.request.GET.get('page_size', self.page_size)),
+                self.max_page_size)
+        except ValueError:
+            page_size = self.page_size
+        queryset = self.get_filtered_queryset(
+            Transaction.objects.all()
+        ).values(*[lookup for key, lookup in TRANSACTION_FIELDS])
+        paginator = KeysetPaginator(
+            queryset, max(page_size, 1), self.keyset_ordering)
+        try:
+            page = paginator.page(
+                after=self.request.GET.get('after'),
+                before=self.request.GET.get('before'))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor.')
+
+        return {
+            'results': [
+                {
+                    key: format_value(row[lookup], key.endswith('_pct'))
+                    for key, lookup in TRANSACTION_FIELDS
+                }
+                for row in page
+            ],
+            'next': self._page_url(after=page.next_cursor)
+                if page.has_next() else None,
+            'previous': self._page_url(before=page.previous_cursor)
+                if page.has_previous() else None,
+        }
+
+    def _page_url(self, **params):
+        query = self.request.GET.copy()
+        for name in ['after', 'before']:
+            query.pop(name, None)
+        query.update(params)
+        return self.request.build_absolute_uri(
+            '?{}'.format(query.urlencode()))
+
+
+class VendorListJson(JsonView):
+    """Vendors and their transaction stats."""
+
+    def get_data(self):
+        return {'results': [
+            {
+                'id': vendor.pk,
+                'name': vendor.name,
+                'transaction_count': vendor.transaction_count,
+                'tx_count': vendor.tx_count,
+                'reaction_count': vendor.reaction_count,
+                'total_revenue': format_value(vendor.total_revenue),
+            }
+            for vendor in Vendor.objects.with_revenue_stats()
+        ]}
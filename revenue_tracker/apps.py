@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class RevenueTrackerConfig(AppConfig):
     name = 'revenue_tracker'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,74 @@
+"""
+Run the independent queries behind a page concurrently.
+
+Django 2 has no async views, so the report pages hand their independent
+computations to a shared thread pool instead. Each worker thread has its
+own database connections (Django keeps them per thread), which are
+recycled like a request's once each computation finishes. That closes
+them after every computation unless ``CONN_MAX_AGE`` is set, and opening
+a connection per computation can cost more than running them
+concurrently saves, so set ``CONN_MAX_AGE`` (e.g., to 60) when
+``ROYALTY_REPORT_THREADS`` is above 1.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from .instrumentation import get_current_timings, recording
+from .routers import reading_from_replica, use_replica
+
+
+REPORT_THREADS = getattr(settings, 'ROYALTY_REPORT_THREADS', 4)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=REPORT_THREADS,
+                thread_name_prefix='revenue-report')
+    return _executor
+
+
+def _call(function, timings, replica):
+    close_old_connections()
+    try:
+        with recording(timings), use_replica(replica):
+            return function()
+    finally:
+        close_old_connections()
+
+
+def run_concurrently(**functions):
+    """
+    Call each keyword argument and return a dict of their results by
+    name, running them in the thread pool when there is more than one.
+
+    Inside a transaction the functions run one after another in the
+    calling thread, since other connections could not see its changes.
+    Otherwise they read from the replica if the calling thread does (see
+    ``routers``).
+    The same happens when ``ROYALTY_REPORT_THREADS`` is below 2.
+    """
+    serial = (
+        len(functions) < 2
+        or REPORT_THREADS < 2
+        or any(connection.in_atomic_block for connection in connections.all())
+    )
+    if serial:
+        return {name: function() for name, function in functions.items()}
+
+    executor = _get_executor()
+    timings = get_current_timings()
+    replica = reading_from_replica()
+    futures = {
+        name: executor.submit(_call, function, timings, replica)
+        for name, function in functions.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
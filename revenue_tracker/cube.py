@@ -0,0 +1,457 @@
+"""
+An in-memory cube of the transactions for slicing royalties ad hoc.
+
+The cube holds the report columns of every transaction as compact NumPy
+arrays: dates as int32 days since 1970, money as int64 cents and codes
+for the transaction type, customer, vendor and institution type. It
+answers the same summaries as ``RoyaltiesManager.get_royalties_report``,
+in the same format, for any filters and grouped by any of ``DIMENSIONS``,
+without querying the database:
+
+    cube = get_cube()
+    cube.report(from_date=..., institution_type='Academic')
+    cube.report(group_by=['vendor', 'quarter'], transaction_type='kit')
+
+Requires NumPy (``pip install numpy``).
+"""
+import datetime
+import threading
+from decimal import Decimal
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .models import CustomerStats, Transaction
+from .models.transactions import TRANSACTION_TYPE_CHOICES, _make_report
+from .versioning import get_version
+
+
+EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+# Stored for missing dates. Being the smallest int32, it is before any date.
+NO_DATE = -2 ** 31
+
+# Lower bounds of the discount bands, as a fraction of the gross price.
+DISCOUNT_BANDS = [0, 0.1, 0.2, 0.3, 0.5]
+
+# The fields loaded for each transaction, in column order.
+FIELDS = [
+    'pk',
+    'updated',
+    'transaction_type',
+    'customer_id',
+    'vendor_id',
+    'customer__institution__institution_type',
+    'date_fulfilled',
+    'date_paid',
+    'number_of_reactions',
+    'total_price',
+    'ip_related_price',
+    'base_ip_related_price_per_reaction',
+]
+
+
+def _days(date):
+    return NO_DATE if date is None else date.toordinal() - EPOCH
+
+
+def _cents(amount):
+    return int((Decimal(amount) * 100).to_integral_value())
+
+
+def _from_cents(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def _discount_band_labels():
+    labels = ['<{:.0%}'.format(DISCOUNT_BANDS[0])]
+    for low, high in zip(DISCOUNT_BANDS, DISCOUNT_BANDS[1:]):
+        labels.append('{:.0%}-{:.0%}'.format(low, high))
+    labels.append('{:.0%}+'.format(DISCOUNT_BANDS[-1]))
+    return labels
+
+
+class Categories:
+    """The values of a categorical column, by code. Code 0 is None."""
+
+    def __init__(self, values=()):
+        self.values = [None]
+        self.codes = {None: 0}
+        for value in values:
+            self.code(value)
+
+    def code(self, value):
+        """Return the code of ``value``, adding it if it is new."""
+        try:
+            return self.codes[value]
+        except KeyError:
+            self.codes[value] = len(self.values)
+            self.values.append(value)
+            return self.codes[value]
+
+
+class RoyaltyCube:
+    """
+    The report columns of every transaction, loaded with ``load()`` and
+    kept current with ``refresh()``.
+    """
+
+    # What reports can be grouped by; each has a ``_group_<name>`` method.
+    DIMENSIONS = [
+        'customer',
+        'discount_band',
+        'institution_type',
+        'month',
+        'quarter',
+        'transaction_type',
+        'vendor',
+        'year',
+    ]
+
+    # How far before the latest change already loaded to look for more
+    # changes on refresh, to catch changes committed out of order.
+    REFRESH_OVERLAP = datetime.timedelta(minutes=5)
+
+    def __init__(self):
+        if numpy is None:
+            raise ImportError('The royalty cube requires NumPy.')
+        self.transaction_types = Categories(
+            key for key, label in TRANSACTION_TYPE_CHOICES)
+        self.customers = Categories()
+        self.vendors = Categories()
+        self.institution_types = Categories()
+        self.watermark = None
+        self.version = None
+        self.columns, _ = self._to_columns([])
+        self.repeat_customers = set()
+
+    def __len__(self):
+        return len(self.columns['pk'])
+
+    def load(self):
+        """Load every transaction."""
+        self.version = get_version('reports')
+        rows = Transaction.objects.order_by('pk').values_list(*FIELDS)
+        self.columns, self.watermark = self._to_columns(
+            rows.iterator(chunk_size=5000))
+        self._load_repeat_customers()
+        return self
+
+    def refresh(self):
+        """
+        Reload the transactions changed since the last load or refresh,
+        and drop deleted ones.
+        """
+        if self.watermark is None:
+            return self.load()
+        self.version = get_version('reports')
+        changed, latest = self._to_columns(Transaction.objects.filter(
+            updated__gte=self.watermark - self.REFRESH_OVERLAP
+        ).order_by('pk').values_list(*FIELDS))
+
+        keep = ~numpy.isin(self.columns['pk'], changed['pk'])
+        columns = {
+            name: numpy.concatenate([column[keep], changed[name]])
+            for name, column in self.columns.items()
+        }
+        # Every transaction added since is among the changes, so any
+        # surplus rows are deleted transactions.
+        if len(columns['pk']) != Transaction.objects.count():
+            keep = numpy.isin(columns['pk'], numpy.fromiter(
+                Transaction.objects.values_list('pk', flat=True),
+                dtype=numpy.int64))
+            columns = {
+                name: column[keep] for name, column in columns.items()}
+        order = numpy.argsort(columns['pk'], kind='stable')
+        self.columns = {
+            name: column[order] for name, column in columns.items()}
+        if latest is not None:
+            self.watermark = max(self.watermark, latest)
+        self._load_repeat_customers()
+        return self
+
+    def _to_columns(self, rows):
+        """
+        Return the columns of the ``FIELDS`` of ``rows`` and the latest
+        time one of them was updated.
+        """
+        values = {name: [] for name in [
+            'pk', 'transaction_type', 'customer', 'vendor',
+            'institution_type', 'date_fulfilled', 'date_paid',
+            'number_of_reactions', 'total_price', 'ip_related_price',
+            'base_price']}
+        latest = None
+        for (pk, updated, transaction_type, customer_id, vendor_id,
+                institution_type, date_fulfilled, date_paid,
+                number_of_reactions, total_price, ip_related_price,
+                base_price) in rows:
+            values['pk'].append(pk)
+            if latest is None or updated > latest:
+                latest = updated
+            values['transaction_type'].append(
+                self.transaction_types.code(transaction_type))
+            values['customer'].append(self.customers.code(customer_id))
+            values['vendor'].append(self.vendors.code(vendor_id))
+            values['institution_type'].append(
+                self.institution_types.code(institution_type))
+            values['date_fulfilled'].append(_days(date_fulfilled))
+            values['date_paid'].append(_days(date_paid))
+            values['number_of_reactions'].append(number_of_reactions)
+            values['total_price'].append(_cents(total_price))
+            values['ip_related_price'].append(_cents(ip_related_price))
+            values['base_price'].append(_cents(base_price))
+
+        dtypes = {
+            'pk': numpy.int64,
+            'transaction_type': numpy.int8,
+            'customer': numpy.int32,
+            'vendor': numpy.int32,
+            'institution_type': numpy.int16,
+            'date_fulfilled': numpy.int32,
+            'date_paid': numpy.int32,
+            'number_of_reactions': numpy.int32,
+            'total_price': numpy.int64,
+            'ip_related_price': numpy.int64,
+            'base_price': numpy.int64,
+        }
+        columns = {
+            name: numpy.array(column, dtype=dtypes[name])
+            for name, column in values.items()
+        }
+        return columns, latest
+
+    def _load_repeat_customers(self):
+        self.repeat_customers = set(CustomerStats.objects.filter(
+            transaction_type='', date_count__gt=1,
+        ).values_list('customer', flat=True))
+
+    def filter(self, from_date=None, to_date=None, in_progress_only=False,
+               customer_id=None, include_in_progress=False,
+               outstanding=False, institution_type=None,
+               transaction_type=None, vendor_id=None):
+        """
+        Return the indexes of the transactions matching the filters of
+        ``RoyaltiesManager.get_report_queryset``, or of a vendor.
+        """
+        c = self.columns
+        fulfilled = c['date_fulfilled'] != NO_DATE
+        mask = numpy.ones(len(self), dtype=bool)
+        if in_progress_only:
+            mask = ~fulfilled
+        elif outstanding:
+            mask = fulfilled & (c['date_paid'] == NO_DATE)
+        else:
+            if from_date is not None:
+                mask &= c['date_fulfilled'] >= _days(_to_date(from_date))
+            if to_date is not None:
+                mask &= fulfilled & (
+                    c['date_fulfilled'] <= _days(_to_date(to_date)))
+        if include_in_progress and (
+                in_progress_only or outstanding
+                or from_date is not None or to_date is not None):
+            mask |= ~fulfilled
+
+        for name, categories, value in [
+                ('institution_type', self.institution_types, institution_type),
+                ('transaction_type', self.transaction_types, transaction_type),
+                ('customer', self.customers, customer_id),
+                ('vendor', self.vendors, vendor_id)]:
+            if value:
+                mask &= c[name] == categories.codes.get(_to_key(value), -1)
+        return numpy.flatnonzero(mask)
+
+    def report(self, group_by=None, **filters):
+        """
+        Summarize the transactions matching ``filters`` (see ``filter()``)
+        like ``get_royalties_report``. With ``group_by``, one of
+        ``DIMENSIONS`` or a list of them, return a report for each group
+        instead, keyed by the dimension's value or a tuple of them.
+        """
+        rows = self.filter(**filters)
+        if group_by is None:
+            return self._make_reports(
+                rows, numpy.zeros(len(rows), dtype=numpy.int64), 1)[0]
+
+        dimensions = [group_by] if isinstance(group_by, str) else group_by
+        codes = []
+        decoders = []
+        for dimension in dimensions:
+            if dimension not in self.DIMENSIONS:
+                raise ValueError('Unknown dimension {!r}.'.format(dimension))
+            dimension_codes, decode = getattr(self, '_group_' + dimension)()
+            codes.append(dimension_codes[rows])
+            decoders.append(decode)
+        if not len(rows):
+            return {}
+
+        groups, inverse = numpy.unique(
+            numpy.stack(codes), axis=1, return_inverse=True)
+        reports = self._make_reports(
+            rows, inverse.reshape(-1), groups.shape[1])
+        keys = [
+            tuple(decode(code) for decode, code in zip(decoders, group))
+            for group in groups.T
+        ]
+        return {
+            key if len(key) > 1 else key[0]: report
+            for key, report in zip(keys, reports)
+        }
+
+    def get_royalties_report(self, **kwargs):
+        """The equivalent of ``RoyaltiesManager.get_royalties_report``."""
+        return self.report(**kwargs)
+
+    def _make_reports(self, rows, groups, group_count):
+        """
+        Return the report of each of ``group_count`` groups, given the
+        group of each of ``rows``.
+        """
+        parts = [{'by_type': {}, 'customers': {}} for _ in range(group_count)]
+        if len(rows):
+            self._collect_parts(rows, groups, parts)
+        return [_make_report([part], self.repeat_customers) for part in parts]
+
+    def _collect_parts(self, rows, groups, parts):
+        # Sort the rows by group and transaction type, and sum each run
+        # of rows in one pass per column.
+        c = self.columns
+        type_count = len(self.transaction_types.values)
+        keys, inverse = numpy.unique(
+            groups * type_count + c['transaction_type'][rows],
+            return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = numpy.argsort(inverse, kind='stable')
+        starts = numpy.searchsorted(inverse[order], numpy.arange(len(keys)))
+        ordered = rows[order]
+        reactions = c['number_of_reactions'][ordered].astype(numpy.int64)
+        sums = {
+            'sum_total_price': numpy.add.reduceat(
+                c['total_price'][ordered], starts),
+            'sum_ip_related_price': numpy.add.reduceat(
+                c['ip_related_price'][ordered], starts),
+            'sum_ip_related_gross_price': numpy.add.reduceat(
+                reactions * c['base_price'][ordered], starts),
+            'sum_number_of_reactions': numpy.add.reduceat(reactions, starts),
+            'transaction_count': numpy.diff(numpy.append(starts, len(rows))),
+        }
+
+        key_parts = []
+        for index, key in enumerate(keys):
+            group, type_code = divmod(int(key), type_count)
+            transaction_type = self.transaction_types.values[type_code]
+            key_parts.append((parts[group], transaction_type))
+            parts[group]['by_type'][transaction_type] = {
+                'transaction_type': transaction_type,
+                'sum_total_price': _from_cents(sums['sum_total_price'][index]),
+                'sum_ip_related_price': _from_cents(
+                    sums['sum_ip_related_price'][index]),
+                'sum_ip_related_gross_price': _from_cents(
+                    sums['sum_ip_related_gross_price'][index]),
+                'sum_number_of_reactions': int(
+                    sums['sum_number_of_reactions'][index]),
+                'transaction_count': int(sums['transaction_count'][index]),
+            }
+
+        customers = numpy.unique(
+            numpy.stack([inverse, c['customer'][rows]]), axis=1)
+        for index, code in customers[:, customers[1] != 0].T:
+            part, transaction_type = key_parts[index]
+            part['customers'].setdefault(transaction_type, set()).add(
+                self.customers.values[code])
+
+    # Grouping dimensions: each returns a code per row and a function that
+    # decodes a code to the group's key.
+
+    def _group_customer(self):
+        return self.columns['customer'], self.customers.values.__getitem__
+
+    def _group_vendor(self):
+        return self.columns['vendor'], self.vendors.values.__getitem__
+
+    def _group_institution_type(self):
+        return (self.columns['institution_type'],
+                self.institution_types.values.__getitem__)
+
+    def _group_transaction_type(self):
+        return (self.columns['transaction_type'],
+                self.transaction_types.values.__getitem__)
+
+    def _fulfilled_dates(self):
+        days = self.columns['date_fulfilled']
+        return numpy.where(days == NO_DATE, 0, days).astype('datetime64[D]')
+
+    def _group_year(self):
+        years = self._fulfilled_dates().astype('datetime64[Y]').astype(
+            numpy.int64) + 1970
+        years[self.columns['date_fulfilled'] == NO_DATE] = 0
+        return years, lambda year: int(year) or None
+
+    def _group_quarter(self):
+        months = self._fulfilled_dates().astype('datetime64[M]').astype(
+            numpy.int64)
+        quarters = months // 3 + 1
+        quarters[self.columns['date_fulfilled'] == NO_DATE] = 0
+
+        def decode(quarter):
+            if not quarter:
+                return None
+            return (1970 + (int(quarter) - 1) // 4,
+                    'Q{}'.format((int(quarter) - 1) % 4 + 1))
+        return quarters, decode
+
+    def _group_month(self):
+        months = self._fulfilled_dates().astype('datetime64[M]').astype(
+            numpy.int64) + 1
+        months[self.columns['date_fulfilled'] == NO_DATE] = 0
+
+        def decode(month):
+            if not month:
+                return None
+            return datetime.date(
+                1970 + (int(month) - 1) // 12, (int(month) - 1) % 12 + 1, 1)
+        return months, decode
+
+    def _group_discount_band(self):
+        c = self.columns
+        gross = c['number_of_reactions'].astype(numpy.int64) * c['base_price']
+        priced = gross > 0
+        discount = numpy.zeros(len(self))
+        discount[priced] = (
+            (gross[priced] - c['ip_related_price'][priced]) / gross[priced])
+        bands = numpy.digitize(discount, DISCOUNT_BANDS) + 1
+        bands[~priced] = 0
+        labels = [None] + _discount_band_labels()
+        return bands, lambda band: labels[int(band)]
+
+
+def _to_date(value):
+    if isinstance(value, str):
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    return value
+
+
+def _to_key(value):
+    # Customer and vendor ids may come from a query string.
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return value
+
+
+_cube = None
+_cube_lock = threading.Lock()
+
+
+def get_cube():
+    """
+    Return the process-wide cube, loading it on first use and refreshing
+    it when the data behind the reports has changed since.
+    """
+    global _cube
+    with _cube_lock:
+        if _cube is None:
+            _cube = RoyaltyCube().load()
+        elif _cube.version != get_version('reports'):
+            _cube.refresh()
+        return _cube
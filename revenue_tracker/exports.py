@@ -0,0 +1,109 @@
+import tempfile
+from decimal import Decimal
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+# (heading, value) pairs for the columns of a transaction export, where the
+# value is a ``values_list`` lookup on ``Transaction``.
+TRANSACTION_COLUMNS = [
+    ('ID', 'pk'),
+    ('Transaction Type', 'transaction_type'),
+    ('Date Ordered', 'date'),
+    ('Date Samples Arrived', 'date_samples_arrived'),
+    ('Date Fulfilled', 'date_fulfilled'),
+    ('Date Paid', 'date_paid'),
+    ('Customer', 'customer__code'),
+    ('Institution', 'customer__institution__name'),
+    ('Institution Type', 'customer__institution__institution_type'),
+    ('Vendor', 'vendor__name'),
+    ('Size', 'number_of_reactions'),
+    ('Quote', 'quote__number'),
+    ('Order', 'order__number'),
+    ('Invoice', 'invoice__number'),
+    ('Total Revenue', 'total_price'),
+    ('IP-Related (Net)', 'ip_related_price'),
+    ('Base IP-Related Price / Reaction', 'base_ip_related_price_per_reaction'),
+    ('IP-Related (Gross)', 'ip_related_gross_price_amount'),
+    ('IP-Related Discount', 'ip_related_discount_amount'),
+    ('IP-Related Discount %', 'ip_related_discount_ratio'),
+    ('Royalties Owed', 'royalties_owed_amount'),
+    ('Description', 'description'),
+    ('Notes', 'notes'),
+]
+
+# (heading, key) pairs for the columns of a royalties report export.
+REPORT_COLUMNS = [
+    ('Transaction Type', 'transaction_type'),
+    ('Customers', 'customer_count'),
+    ('Repeat Customers', 'repeat_customer_count'),
+    ('Repeat Customer %', 'repeat_customer_pct'),
+    ('Reactions', 'sum_number_of_reactions'),
+    ('Total Revenue', 'sum_total_price'),
+    ('Average Revenue / Reaction', 'average_total_price_per_reaction'),
+    ('IP-Related (Net)', 'sum_ip_related_price'),
+    ('IP-Related (Gross)', 'sum_ip_related_gross_price'),
+    ('IP-Related Discount', 'sum_ip_related_discount'),
+    ('IP-Related Discount %', 'sum_ip_related_discount_pct'),
+    ('Royalties Owed', 'sum_royalties_owed'),
+]
+
+
+def format_value(value, ratio=False):
+    """Round ratios to four decimal places and other numbers to cents."""
+    if isinstance(value, (Decimal, float)):
+        places = 4 if ratio else 2
+        if isinstance(value, Decimal):
+            return value.quantize(Decimal(10) ** -places)
+        return round(value, places)
+    return value
+
+
+def transaction_rows(queryset, chunk_size=2000):
+    """
+    Yield a heading row and then one row per transaction, reading the
+    transactions from the database ``chunk_size`` at a time.
+    """
+    headings = [heading for heading, lookup in TRANSACTION_COLUMNS]
+    ratios = [heading.endswith('%') for heading in headings]
+    yield headings
+    for row in queryset.order_by('-date', 'pk').values_list(
+            *[lookup for heading, lookup in TRANSACTION_COLUMNS]
+    ).iterator(chunk_size=chunk_size):
+        yield [
+            format_value(value, ratio) for value, ratio in zip(row, ratios)]
+
+
+def report_rows(report):
+    """
+    Yield a heading row, a row per transaction type and a row for all
+    transactions of a royalties report.
+    """
+    yield [heading for heading, key in REPORT_COLUMNS]
+    if 'by_type' not in report:
+        return
+    for subreport in report['by_type'] + [dict(report, transaction_type='all')]:
+        yield [
+            format_value(subreport.get(key), heading.endswith('%'))
+            for heading, key in REPORT_COLUMNS
+        ]
+
+
+def write_xlsx(sheets):
+    """
+    Write ``(title, rows)`` pairs to the sheets of a new workbook in
+    write-only mode, which keeps memory use flat, and return it as an open
+    temporary file.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    for title, rows in sheets:
+        worksheet = workbook.create_sheet(title=title)
+        for row in rows:
+            worksheet.append(row)
+    f = tempfile.TemporaryFile()
+    workbook.save(f)
+    f.seek(0)
+    return f
@@ -0,0 +1,165 @@
+"""
+Opt-in per-request instrumentation of the revenue tracker.
+
+With ``InstrumentationMiddleware`` installed, every request records its
+number of queries, the time spent running them, and the time spent in
+each royalties report and in each panel template. The totals are logged
+as one JSON line per request to the ``revenue_tracker.instrumentation``
+logger: at DEBUG level, or at WARNING level when the request took longer
+than ``ROYALTY_SLOW_REQUEST_THRESHOLD`` seconds (default: 1). The
+``instrumentation`` context processor exposes the timings of the current
+request to templates as ``revenue_instrumentation`` in debug mode.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_THRESHOLD = getattr(
+    settings, 'ROYALTY_SLOW_REQUEST_THRESHOLD', 1)
+
+_local = threading.local()
+
+
+class RequestTimings:
+    """
+    The queries of a request and the time spent in its named sections,
+    which may be recorded from several threads.
+    """
+
+    def __init__(self):
+        self.query_count = 0
+        self.sql_time = 0
+        self.sections = OrderedDict()
+        self._lock = threading.Lock()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """Count and time a query; see ``connection.execute_wrapper()``."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.query_count += 1
+                self.sql_time += elapsed
+
+    def add_section(self, name, elapsed):
+        with self._lock:
+            calls, total = self.sections.get(name, (0, 0))
+            self.sections[name] = (calls + 1, total + elapsed)
+
+    def as_dict(self):
+        """Return the timings in milliseconds, for logging or display."""
+        with self._lock:
+            return {
+                'queries': self.query_count,
+                'sql_ms': round(self.sql_time * 1000, 1),
+                'sections': [
+                    {'name': name, 'calls': calls,
+                        'ms': round(total * 1000, 1)}
+                    for name, (calls, total) in self.sections.items()
+                ],
+            }
+
+
+def get_current_timings():
+    """Return the ``RequestTimings`` being recorded in this thread, if any."""
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def recording(timings):
+    """
+    Record the queries run and the sections timed in this thread into
+    ``timings`` (nothing, if it is None).
+    """
+    if timings is None:
+        yield
+        return
+    previous = get_current_timings()
+    _local.timings = timings
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(timings.execute_wrapper))
+            yield
+    finally:
+        _local.timings = previous
+
+
+@contextmanager
+def timed(name):
+    """Add the time spent in the block to the section ``name``."""
+    timings = get_current_timings()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_section(name, time.perf_counter() - start)
+
+
+class InstrumentationMiddleware:
+    """Record and log the timings of every request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = request.revenue_instrumentation = RequestTimings()
+        start = time.perf_counter()
+        with recording(timings):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self._stream(
+                response.streaming_content, request, response, start)
+        else:
+            self._log(request, response, time.perf_counter() - start)
+        return response
+
+    def _stream(self, content, request, response, start):
+        # Streamed rows are rendered, and their queries run, as the
+        # response is sent.
+        try:
+            with recording(request.revenue_instrumentation):
+                yield from content
+        finally:
+            self._log(request, response, time.perf_counter() - start)
+
+    def _log(self, request, response, elapsed):
+        data = OrderedDict([
+            ('method', request.method),
+            ('path', request.get_full_path()),
+            ('status', response.status_code),
+            ('ms', round(elapsed * 1000, 1)),
+        ])
+        data.update(request.revenue_instrumentation.as_dict())
+        level = (
+            logging.WARNING if elapsed > SLOW_REQUEST_THRESHOLD
+            else logging.DEBUG)
+        logger.log(level, json.dumps(data), extra={'instrumentation': data})
+
+
+def instrumentation(request):
+    """
+    A context processor that adds the timings of the current request, so
+    far, as ``revenue_instrumentation`` when ``DEBUG`` is on and the
+    request comes from one of the ``INTERNAL_IPS``.
+    """
+    timings = getattr(request, 'revenue_instrumentation', None)
+    if (timings is None or not settings.DEBUG
+            or request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS):
+        return {}
+    return {'revenue_instrumentation': timings}
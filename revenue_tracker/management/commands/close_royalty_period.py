@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from revenue_tracker.models import RoyaltySnapshot
+from revenue_tracker.models.reports import QUARTERS
+
+
+class Command(BaseCommand):
+    help = (
+        'Close a year or quarter, freezing its royalties report, or list '
+        'the closed periods and whether they were edited since.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'year',
+            nargs='?',
+            type=int,
+            help='Year to close. Without it, list the closed periods.',
+        )
+        parser.add_argument(
+            'quarter',
+            choices=sorted(QUARTERS),
+            nargs='?',
+            help='Quarter of the year to close, e.g. Q1 (default: the '
+                 'whole year).',
+        )
+
+    def handle(self, *args, **options):
+        if options['year'] is None:
+            for snapshot in RoyaltySnapshot.objects.all():
+                self.stdout.write('{}: closed {}{}'.format(
+                    snapshot, snapshot.closed,
+                    ', edited {}'.format(snapshot.edited)
+                    if snapshot.edited else ''))
+            return
+
+        try:
+            snapshot = RoyaltySnapshot.objects.close(
+                options['year'], options['quarter'])
+        except ValueError as e:
+            raise CommandError(e)
+        report = snapshot.get_report()
+        self.stdout.write(self.style.SUCCESS(
+            'Closed {} with {} in royalties owed.'.format(
+                snapshot, round(report.get('sum_royalties_owed', 0), 2))))
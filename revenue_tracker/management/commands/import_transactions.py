@@ -0,0 +1,78 @@
+import csv
+import json
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from revenue_tracker.models import Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Import transactions from a CSV, JSON or JSON Lines file. Columns '
+        'are Transaction field names; customers are given by code and '
+        'vendors by name.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help="File to import, or '-' to read from standard input.",
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'json', 'jsonl'],
+            help='Input format (default: guessed from the file extension).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            default=500,
+            type=int,
+            help='Number of rows per database batch (default: 500).',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate the rows without creating any transactions.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format']
+        if input_format is None:
+            extension = os.path.splitext(path)[1].lstrip('.').lower()
+            if extension not in ['csv', 'json', 'jsonl']:
+                raise CommandError(
+                    'Cannot guess the format of {!r}; use --format.'.format(
+                        path))
+            input_format = extension
+
+        if path == '-':
+            result = self.import_rows(sys.stdin, input_format, options)
+        else:
+            with open(path, newline='') as f:
+                result = self.import_rows(f, input_format, options)
+
+        for row_number, message in result['errors']:
+            self.stderr.write('Row {}: {}'.format(row_number, message))
+
+        if options['dry_run']:
+            summary = '{} transactions would be imported; {} rows have errors.'
+        else:
+            summary = 'Imported {} transactions; {} rows have errors.'
+        self.stdout.write(self.style.SUCCESS(
+            summary.format(result['created'], len(result['errors']))))
+
+    def import_rows(self, f, input_format, options):
+        if input_format == 'csv':
+            rows = csv.DictReader(f)
+        elif input_format == 'jsonl':
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = json.load(f)
+        return Transaction.objects.bulk_import(
+            rows,
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
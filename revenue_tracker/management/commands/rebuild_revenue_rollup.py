@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from revenue_tracker.models import QuarterlyRevenue
+
+
+class Command(BaseCommand):
+    help = 'Recompute the quarterly revenue rollup from the transactions.'
+
+    def handle(self, *args, **options):
+        QuarterlyRevenue.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            'Rebuilt {} quarterly revenue rows.'.format(
+                QuarterlyRevenue.objects.count())))
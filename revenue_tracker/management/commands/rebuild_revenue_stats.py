@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from revenue_tracker.models import CustomerStats, VendorStats
+
+
+class Command(BaseCommand):
+    help = (
+        'Check the customer and vendor lifetime stats against the '
+        'transactions and recompute them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report stats that are out of date, exiting with an '
+                 'error if there are any.',
+        )
+
+    def handle(self, *args, **options):
+        stale = 0
+        for model in [CustomerStats, VendorStats]:
+            keys = model.objects.verify()
+            for owner_id, transaction_type in keys:
+                self.stderr.write('{} {} ({}) is out of date.'.format(
+                    model._meta.verbose_name, owner_id,
+                    transaction_type or 'all'))
+            stale += len(keys)
+
+            if not options['check']:
+                model.objects.rebuild()
+                self.stdout.write(self.style.SUCCESS(
+                    'Rebuilt {} {} rows.'.format(
+                        model.objects.count(),
+                        model._meta.verbose_name_plural)))
+
+        if options['check'] and stale:
+            raise CommandError('{} stats rows are out of date.'.format(stale))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from revenue_tracker.report_cache import (
+    get_report_cache_stats, invalidate_reports, reset_report_cache_stats,
+)
+
+
+class Command(BaseCommand):
+    help = 'Show the hit and miss counts of the royalties report cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counts after showing them.',
+        )
+        parser.add_argument(
+            '--invalidate',
+            action='store_true',
+            help='Mark every cached report as stale.',
+        )
+
+    def handle(self, *args, **options):
+        stats = get_report_cache_stats()
+        lookups = stats['hits'] + stats['misses']
+        self.stdout.write('Hits: {}'.format(stats['hits']))
+        self.stdout.write('Misses: {}'.format(stats['misses']))
+        if lookups:
+            self.stdout.write('Hit rate: {:.1%}'.format(
+                stats['hits'] / lookups))
+
+        if options['reset']:
+            reset_report_cache_stats()
+            self.stdout.write(self.style.SUCCESS('Reset the counts.'))
+        if options['invalidate']:
+            invalidate_reports()
+            self.stdout.write(self.style.SUCCESS(
+                'Invalidated the cached reports.'))
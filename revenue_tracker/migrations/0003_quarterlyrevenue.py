@@ -0,0 +1,74 @@
+# Generated by Django 2.1.3 on 2026-10-18 09:00
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, ExtractQuarter, ExtractYear
+
+
+def populate_quarterly_revenue(apps, schema_editor):
+    QuarterlyRevenue = apps.get_model('revenue_tracker', 'QuarterlyRevenue')
+    Transaction = apps.get_model('revenue_tracker', 'Transaction')
+    sums = Transaction.objects.filter(
+        date_fulfilled__isnull=False
+    ).annotate(
+        year=ExtractYear('date_fulfilled'),
+        quarter=ExtractQuarter('date_fulfilled'),
+        institution_type=Coalesce(
+            'customer__institution__institution_type', Value('')),
+    ).order_by().values(
+        'year', 'quarter', 'transaction_type', 'institution_type'
+    ).annotate(
+        sum_total_price=Sum('total_price'),
+        sum_ip_related_price=Sum('ip_related_price'),
+        sum_ip_related_gross_price=Sum(
+            F('number_of_reactions') * F('base_ip_related_price_per_reaction'),
+            output_field=models.DecimalField(decimal_places=2, max_digits=14)),
+        sum_number_of_reactions=Sum('number_of_reactions'),
+        transaction_count=Count('pk'),
+    )
+    QuarterlyRevenue.objects.bulk_create([
+        QuarterlyRevenue(
+            year=row['year'],
+            quarter=row['quarter'],
+            transaction_type=row['transaction_type'],
+            institution_type=row['institution_type'],
+            total_price=row['sum_total_price'],
+            ip_related_price=row['sum_ip_related_price'],
+            ip_related_gross_price=row['sum_ip_related_gross_price'],
+            number_of_reactions=row['sum_number_of_reactions'],
+            number_of_transactions=row['transaction_count'],
+        )
+        for row in sums
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue_tracker', '0002_project_transaction_m2m'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuarterlyRevenue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('quarter', models.PositiveSmallIntegerField()),
+                ('transaction_type', models.CharField(choices=[('kit', 'Kit Sale'), ('service', 'Service Contract'), ('other', 'Other')], max_length=7)),
+                ('institution_type', models.CharField(blank=True, max_length=255)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('ip_related_price', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('ip_related_gross_price', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('number_of_reactions', models.PositiveIntegerField()),
+                ('number_of_transactions', models.PositiveIntegerField()),
+            ],
+            options={
+                'verbose_name_plural': 'quarterly revenue',
+                'ordering': ['year', 'quarter', 'transaction_type', 'institution_type'],
+                'unique_together': {('year', 'quarter', 'transaction_type', 'institution_type')},
+            },
+        ),
+        migrations.RunPython(
+            populate_quarterly_revenue, migrations.RunPython.noop),
+    ]
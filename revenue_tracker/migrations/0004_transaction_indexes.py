@@ -0,0 +1,73 @@
+# Generated by Django 2.1.3 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+# Django 2.1 cannot declare partial indexes on a model, so they are created
+# with SQL on the databases that support them. Each matches the ordering
+# of the list page it serves, so the page reads it in order without
+# sorting.
+PARTIAL_INDEXES = [
+    # Pending transactions, in the default Transaction ordering.
+    (
+        'revenue_tx_unfulfilled_idx',
+        '("date" DESC, "customer_id")',
+        '"date_fulfilled" IS NULL',
+    ),
+    # Outstanding invoices: fulfilled but not yet paid, in the keyset
+    # ordering of OutstandingInvoicesList.
+    (
+        'revenue_tx_outstanding_idx',
+        '("date_fulfilled", "customer_id", "id")',
+        '"date_fulfilled" IS NOT NULL AND "date_paid" IS NULL',
+    ),
+]
+
+PARTIAL_INDEX_VENDORS = ['postgresql', 'sqlite']
+
+
+def create_partial_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in PARTIAL_INDEX_VENDORS:
+        return
+    for name, columns, condition in PARTIAL_INDEXES:
+        schema_editor.execute(
+            'CREATE INDEX "{}" ON "revenue_tracker_transaction" {} '
+            'WHERE {}'.format(name, columns, condition))
+
+
+def drop_partial_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in PARTIAL_INDEX_VENDORS:
+        return
+    for name, columns, condition in PARTIAL_INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS "{}"'.format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue_tracker', '0003_quarterlyrevenue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='baseprice',
+            index=models.Index(fields=['transaction_type', 'start_date'], name='revenue_bp_type_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['date_fulfilled', 'transaction_type'], name='revenue_tx_fulfilled_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['transaction_type', 'date_fulfilled'], name='revenue_tx_type_fulfilled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['customer', 'date'], name='revenue_tx_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-date', 'customer'], name='revenue_tx_date_customer_idx'),
+        ),
+        migrations.RunPython(create_partial_indexes, drop_partial_indexes),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 2.1.3 on 2026-10-18 11:00
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+import django.db.models.deletion
+
+
+def populate_lifetime_stats(apps, schema_editor):
+    Transaction = apps.get_model('revenue_tracker', 'Transaction')
+    for model_name, owner in [
+            ('CustomerStats', 'customer'), ('VendorStats', 'vendor')]:
+        Stats = apps.get_model('revenue_tracker', model_name)
+        transactions = Transaction.objects.filter(
+            **{owner + '__isnull': False}).order_by()
+        aggregates = {
+            'first_date': Min('date'),
+            'last_date': Max('date'),
+            'date_count': Count('date', distinct=True),
+            'transaction_count': Count('pk'),
+            'reaction_count': Sum('number_of_reactions'),
+            'total_revenue': Sum('total_price'),
+        }
+        rows = list(transactions.values(
+            owner, 'transaction_type').annotate(**aggregates))
+        rows += list(transactions.values(owner).annotate(**aggregates))
+        Stats.objects.bulk_create([
+            Stats(**{
+                owner + '_id': row.pop(owner),
+                'transaction_type': row.pop('transaction_type', ''),
+                **row,
+            })
+            for row in rows
+        ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue_tracker', '0004_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_type', models.CharField(blank=True, choices=[('kit', 'Kit Sale'), ('service', 'Service Contract'), ('other', 'Other')], max_length=7)),
+                ('first_date', models.DateField()),
+                ('last_date', models.DateField()),
+                ('date_count', models.PositiveIntegerField()),
+                ('transaction_count', models.PositiveIntegerField()),
+                ('reaction_count', models.PositiveIntegerField()),
+                ('total_revenue', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_stats', to='revenue_tracker.Customer')),
+            ],
+            options={
+                'verbose_name_plural': 'customer stats',
+                'unique_together': {('customer', 'transaction_type')},
+            },
+        ),
+        migrations.CreateModel(
+            name='VendorStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_type', models.CharField(blank=True, choices=[('kit', 'Kit Sale'), ('service', 'Service Contract'), ('other', 'Other')], max_length=7)),
+                ('first_date', models.DateField()),
+                ('last_date', models.DateField()),
+                ('date_count', models.PositiveIntegerField()),
+                ('transaction_count', models.PositiveIntegerField()),
+                ('reaction_count', models.PositiveIntegerField()),
+                ('total_revenue', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_stats', to='revenue_tracker.Vendor')),
+            ],
+            options={
+                'verbose_name_plural': 'vendor stats',
+                'unique_together': {('vendor', 'transaction_type')},
+            },
+        ),
+        migrations.RunPython(populate_lifetime_stats, migrations.RunPython.noop),
+    ]
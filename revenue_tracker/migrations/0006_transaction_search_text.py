@@ -0,0 +1,79 @@
+# Generated by Django 2.1.3 on 2026-10-18 12:00
+
+from django.db import DatabaseError, migrations, models, transaction
+from django.db.models import Case, Value, When
+
+
+CUSTOMER_SEARCH_FIELDS = ['code', 'name', 'institution__name', 'contact__name']
+VENDOR_SEARCH_FIELDS = ['name', 'contact__name']
+
+
+# Transactions read and updated at a time, with two query parameters each
+# for the update (within SQLite's default limit of 999).
+BATCH_SIZE = 400
+
+
+def populate_search_text(apps, schema_editor):
+    Transaction = apps.get_model('revenue_tracker', 'Transaction')
+    rows = Transaction.objects.order_by('pk').values_list(
+        'pk', 'description', 'notes',
+        *['customer__' + name for name in CUSTOMER_SEARCH_FIELDS],
+        *['vendor__' + name for name in VENDOR_SEARCH_FIELDS])
+    last_pk = None
+    while True:
+        batch = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+        batch = list(batch[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        Transaction.objects.filter(
+            pk__gte=batch[0][0], pk__lte=last_pk,
+        ).update(search_text=Case(
+            *[
+                When(pk=pk, then=Value('\n'.join(
+                    str(value).lower() for value in values if value)))
+                for pk, *values in batch
+            ],
+            default=Value(''),
+            output_field=models.TextField(),
+        ))
+
+
+# On PostgreSQL, a trigram index lets searches for any part of the text use
+# an index rather than scanning the table. It needs the pg_trgm extension,
+# which is skipped (with the index) if it cannot be installed.
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError:
+        return
+    schema_editor.execute(
+        'CREATE INDEX "revenue_tx_search_trgm_idx" '
+        'ON "revenue_tracker_transaction" '
+        'USING gin ("search_text" gin_trgm_ops)')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS "revenue_tx_search_trgm_idx"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue_tracker', '0005_lifetime_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='search_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(populate_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.1.3 on 2026-10-18 13:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue_tracker', '0006_transaction_search_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
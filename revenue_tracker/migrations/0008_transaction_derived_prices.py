@@ -0,0 +1,96 @@
+# Generated by Django 2.1.3 on 2026-10-18 14:00
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import (
+    Case, ExpressionWrapper, F, Func, Q, Value, When,
+)
+from django.db.models.functions import Cast
+
+
+class RoundCents(Func):
+    function = 'ROUND'
+    template = '%(function)s(%(expressions)s, 2)'
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='%(function)s(CAST(%(expressions)s AS numeric), 2)',
+            **extra_context)
+
+
+def populate_derived_prices(apps, schema_editor):
+    Transaction = apps.get_model('revenue_tracker', 'Transaction')
+    money = models.DecimalField(decimal_places=2, max_digits=14)
+    unpriced = Q(base_ip_related_price_per_reaction=0)
+    gross_price = RoundCents(
+        F('number_of_reactions') * F('base_ip_related_price_per_reaction'),
+        output_field=money)
+    discount = RoundCents(
+        gross_price - F('ip_related_price'), output_field=money)
+    Transaction.objects.update(
+        price_per_sample_amount=Case(
+            When(number_of_reactions=0, then=None),
+            default=RoundCents(
+                Cast('total_price', models.FloatField())
+                / F('number_of_reactions'),
+                output_field=money),
+            output_field=money),
+        ip_related_gross_price_amount=Case(
+            When(unpriced | Q(number_of_reactions=0), then=None),
+            default=gross_price,
+            output_field=money),
+        ip_related_discount_amount=Case(
+            When(unpriced, then=None),
+            default=discount,
+            output_field=money),
+        ip_related_discount_ratio=Case(
+            When(unpriced | Q(number_of_reactions=0), then=None),
+            default=ExpressionWrapper(
+                discount / Cast(gross_price, models.FloatField()),
+                output_field=models.FloatField()),
+            output_field=models.FloatField()),
+        royalties_owed_amount=RoundCents(
+            F('ip_related_price') * Value(
+                Decimal(str(getattr(settings, 'ROYALTY_PERCENTAGE', 0))),
+                output_field=models.DecimalField()),
+            output_field=money),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue_tracker', '0007_transaction_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='ip_related_discount_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='ip_related_discount_ratio',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='ip_related_gross_price_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='price_per_sample_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='royalties_owed_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=14, null=True),
+        ),
+        migrations.RunPython(populate_derived_prices, migrations.RunPython.noop),
+    ]
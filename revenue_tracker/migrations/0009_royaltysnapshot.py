@@ -0,0 +1,31 @@
+# Generated by Django 2.1.3 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue_tracker', '0008_transaction_derived_prices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoyaltySnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('quarter', models.PositiveSmallIntegerField(blank=True, help_text='Blank for the whole year.', null=True)),
+                ('report', models.TextField(editable=False)),
+                ('closed', models.DateTimeField(auto_now_add=True)),
+                ('edited', models.DateTimeField(blank=True, editable=False, help_text='When transactions fulfilled in the period last changed after it was closed.', null=True)),
+            ],
+            options={
+                'ordering': ['year', 'quarter'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='royaltysnapshot',
+            unique_together={('year', 'quarter')},
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.1.3 on 2026-10-18 16:00
+
+from django.db import migrations
+
+
+# The partial indexes of migration 0004, created again: on SQLite, adding
+# fields in later migrations rebuilt the table without them, and the
+# outstanding invoices index now matches that list's ordering.
+PARTIAL_INDEXES = [
+    (
+        'revenue_tx_unfulfilled_idx',
+        '("date" DESC, "customer_id")',
+        '"date_fulfilled" IS NULL',
+    ),
+    (
+        'revenue_tx_outstanding_idx',
+        '("date_fulfilled", "customer_id", "id")',
+        '"date_fulfilled" IS NOT NULL AND "date_paid" IS NULL',
+    ),
+]
+
+PARTIAL_INDEX_VENDORS = ['postgresql', 'sqlite']
+
+
+def recreate_partial_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in PARTIAL_INDEX_VENDORS:
+        return
+    for name, columns, condition in PARTIAL_INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS "{}"'.format(name))
+        schema_editor.execute(
+            'CREATE INDEX "{}" ON "revenue_tracker_transaction" {} '
+            'WHERE {}'.format(name, columns, condition))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue_tracker', '0009_royaltysnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            recreate_partial_indexes, migrations.RunPython.noop),
+    ]
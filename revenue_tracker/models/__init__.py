@@ -1,2 +1,4 @@
 from .people import Customer, Vendor
 from .transactions import BasePrice, Invoice, Order, Quote, Transaction
+from .reports import QuarterlyRevenue, RoyaltySnapshot
+from .stats import CustomerStats, VendorStats
@@ -1,12 +1,76 @@
 from django.db import models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
 
 from customer_tracker.models import Customer as CustomerBase
 
 
-class Customer(CustomerBase):
-
-    class Meta:
-        proxy = True
+# The lifetime stats field behind each of the stats properties.
+STAT_FIELDS = {
+    'reaction_count': 'reaction_count',
+    'total_revenue': 'total_revenue',
+    'transaction_count': 'transaction_count',
+    'tx_count': 'date_count',
+}
+
+
+class RevenueStatsQuerySet(models.QuerySet):
+
+    def _lifetime_stat(self, name):
+        stats = self.model.revenue_stats.rel.related_model
+        field = stats._meta.get_field(name)
+        # Zero rather than NULL without transactions, so that those sort
+        # alike on every database.
+        return Coalesce(
+            Subquery(
+                stats.objects.filter(
+                    **{stats.owner_field: OuterRef('pk'), 'transaction_type': ''}
+                ).values(name)[:1],
+                output_field=field),
+            Value(0),
+            output_field=field)
+
+    def with_revenue_stats(self):
+        """
+        Annotate the values behind ``tx_count``, ``transaction_count``,
+        ``reaction_count`` and ``total_revenue``, which are zero for those
+        without transactions, so they do not need a query per customer or
+        vendor.
+
+        Each value is a correlated subquery reading the customer's or
+        vendor's lifetime stats row rather than a join, so the values stay
+        correct when the queryset is later filtered across transactions
+        (e.g., by the admin search).
+        """
+        return self.annotate(
+            annotated_tx_count=self._lifetime_stat('date_count'),
+            annotated_transaction_count=self._lifetime_stat(
+                'transaction_count'),
+            annotated_reaction_count=self._lifetime_stat('reaction_count'),
+            annotated_total_revenue=self._lifetime_stat('total_revenue'),
+        )
+
+
+class RevenueStatsMixin:
+    """
+    Transaction statistics shared by customers and vendors, read from
+    their lifetime stats. Values annotated by
+    ``RevenueStatsQuerySet.with_revenue_stats`` are used when present;
+    otherwise the stats row is queried once.
+    """
+
+    @cached_property
+    def _lifetime_stats(self):
+        return self.revenue_stats.filter(transaction_type='').first()
+
+    def _stat(self, name):
+        if hasattr(self, 'annotated_' + name):
+            return getattr(self, 'annotated_' + name) or 0
+        stats = self._lifetime_stats
+        if stats is None:
+            return 0
+        return getattr(stats, STAT_FIELDS[name])
 
     @property
     def is_repeat_customer(self):
@@ -17,24 +81,36 @@ class Customer(CustomerBase):
 
     @property
     def reaction_count(self):
-        return sum(
-            sum(self.transactions.values_list('number_of_reactions'), ()))
+        return self._stat('reaction_count')
 
     @property
     def total_revenue(self):
-        return sum(
-            sum(self.transactions.values_list('total_price'), ()))
+        return self._stat('total_revenue')
+
+    @property
+    def transaction_count(self):
+        return self._stat('transaction_count')
 
     @property
     def tx_count(self):
-        return len(set(self.transactions.values_list('date')))
+        return self._stat('tx_count')
+
+
+class Customer(RevenueStatsMixin, CustomerBase):
+
+    class Meta:
+        proxy = True
+
+    objects = RevenueStatsQuerySet.as_manager()
 
 
-class Vendor(models.Model):
+class Vendor(RevenueStatsMixin, models.Model):
 
     class Meta:
         ordering = ['name']
 
+    objects = RevenueStatsQuerySet.as_manager()
+
     name = models.CharField(
         max_length=255,
         unique=True,
@@ -61,24 +137,3 @@ class Vendor(models.Model):
     @property
     def contact_name(self):
         return self.contact.name
-
-    @property
-    def is_repeat_customer(self):
-        if self.tx_count > 1:
-            return True
-        else:
-            return False
-
-    @property
-    def reaction_count(self):
-        return sum(
-            sum(self.transactions.values_list('number_of_reactions'), ()))
-
-    @property
-    def total_revenue(self):
-        return sum(
-            sum(self.transactions.values_list('total_price'), ()))
-
-    @property
-    def tx_count(self):
-        return len(set(self.transactions.values_list('date')))
@@ -0,0 +1,396 @@
+import datetime
+import json
+import logging
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import IntegrityError, models, transaction
+from django.db.models import Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, ExtractQuarter, ExtractYear
+from django.utils import timezone
+
+from ..versioning import bump_version, get_version
+from .transactions import TRANSACTION_TYPE_CHOICES, Transaction, _report_sums
+
+
+logger = logging.getLogger(__name__)
+
+QUARTERS = {
+    'Q1': ['01-01', '03-31'],
+    'Q2': ['04-01', '06-30'],
+    'Q3': ['07-01', '09-30'],
+    'Q4': ['10-01', '12-31'],
+}
+
+
+def get_period_dates(year, quarter=None):
+    """Return the first and last dates of a year or of one of its quarters."""
+    if quarter:
+        period = QUARTERS[quarter]
+    else:
+        period = ['01-01', '12-31']
+    return [
+        datetime.datetime.strptime(
+            '{}-{}'.format(year, day), '%Y-%m-%d').date()
+        for day in period
+    ]
+
+
+def get_period(from_date, to_date):
+    """
+    Return the year and quarter (``None`` for a whole year) spanning
+    exactly ``from_date`` to ``to_date``, or ``None`` if they span
+    anything else.
+    """
+    date_field = models.DateField()
+    from_date = date_field.to_python(from_date)
+    to_date = date_field.to_python(to_date)
+    if from_date is None or to_date is None or from_date.year != to_date.year:
+        return None
+    for quarter in [None] + list(QUARTERS):
+        if [from_date, to_date] == get_period_dates(from_date.year, quarter):
+            return from_date.year, quarter
+    return None
+
+
+# Map the sums in a royalties report to the rollup columns holding them.
+ROLLUP_FIELDS = {
+    'sum_total_price': 'total_price',
+    'sum_ip_related_price': 'ip_related_price',
+    'sum_ip_related_gross_price': 'ip_related_gross_price',
+    'sum_number_of_reactions': 'number_of_reactions',
+    'transaction_count': 'number_of_transactions',
+}
+
+
+# How many times ``QuarterlyRevenueQuerySet.rebuild`` sums the rows again
+# when a concurrent rebuild inserts the same rows first.
+REBUILD_ATTEMPTS = 3
+
+
+class QuarterlyRevenueQuerySet(models.QuerySet):
+
+    def available_quarters(self):
+        """Return the set of (year, 'Qn') pairs with fulfilled transactions."""
+        return {
+            (year, 'Q{}'.format(quarter))
+            for year, quarter in self.values_list('year', 'quarter').distinct()
+        }
+
+    def rebuild(self, year=None, quarter=None, transaction_type=None):
+        """
+        Recompute the rollup rows from the fulfilled transactions, either
+        all of them or just those of a year, quarter and/or transaction
+        type.
+        """
+        rows = self.all()
+        transactions = Transaction.objects.filter(date_fulfilled__isnull=False)
+        if year:
+            rows = rows.filter(year=year)
+            transactions = transactions.filter(
+                date_fulfilled__range=get_period_dates(year, quarter))
+            if quarter:
+                rows = rows.filter(quarter=int(quarter[1]))
+        if transaction_type:
+            rows = rows.filter(transaction_type=transaction_type)
+            transactions = transactions.filter(
+                transaction_type=transaction_type)
+
+        sums = transactions.annotate(
+            year=ExtractYear('date_fulfilled'),
+            quarter=ExtractQuarter('date_fulfilled'),
+            institution_type=Coalesce(
+                'customer__institution__institution_type', Value('')),
+        ).order_by().values(
+            'year', 'quarter', 'transaction_type', 'institution_type'
+        ).annotate(**_report_sums())
+
+        for attempt in range(REBUILD_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    # Concurrent rebuilds of the same rows take turns, and
+                    # each sums (afresh, hence ``all()``) the changes
+                    # committed before its turn.
+                    list(rows.select_for_update().values_list('pk'))
+                    rows.delete()
+                    self.bulk_create([
+                        self.model(
+                            year=row['year'],
+                            quarter=row['quarter'],
+                            transaction_type=row['transaction_type'],
+                            institution_type=row['institution_type'],
+                            **{field: row[key]
+                                for key, field in ROLLUP_FIELDS.items()}
+                        )
+                        for row in sums.all()
+                    ])
+                break
+            except IntegrityError:
+                # A concurrent rebuild inserted rows that did not exist
+                # yet, so there was nothing to lock; sum again.
+                if attempt == REBUILD_ATTEMPTS - 1:
+                    raise
+        # Again on commit, in case another process read the old rows.
+        bump_version('quarterly_revenue')
+        transaction.on_commit(lambda: bump_version('quarterly_revenue'))
+
+    def rebuild_for(self, transactions):
+        """
+        Recompute the rollup rows of the quarters and transaction types of
+        the fulfilled transactions in the ``transactions`` queryset.
+        """
+        buckets = transactions.filter(
+            date_fulfilled__isnull=False,
+        ).annotate(
+            year=ExtractYear('date_fulfilled'),
+            quarter=ExtractQuarter('date_fulfilled'),
+        ).order_by().values_list('year', 'quarter', 'transaction_type')
+        for year, quarter, transaction_type in set(buckets):
+            self.rebuild(
+                year=year, quarter='Q{}'.format(quarter),
+                transaction_type=transaction_type)
+
+    def report_sums(self):
+        """
+        Return the royalties report sums per transaction type, in the same
+        shape as the grouped query in ``RoyaltiesManager``.
+        """
+        return self.order_by().values('transaction_type').annotate(**{
+            key: Sum(field) for key, field in ROLLUP_FIELDS.items()})
+
+
+class QuarterlyRevenue(models.Model):
+    """
+    Revenue from fulfilled transactions summed by the quarter they were
+    fulfilled in, transaction type and institution type.
+
+    Rows are kept up to date when transactions are saved or deleted and
+    when base prices change; ``manage.py rebuild_revenue_rollup``
+    recomputes them from scratch.
+    """
+
+    class Meta:
+        ordering = ['year', 'quarter', 'transaction_type', 'institution_type']
+        unique_together = [
+            'year', 'quarter', 'transaction_type', 'institution_type']
+        verbose_name_plural = 'quarterly revenue'
+
+    objects = QuarterlyRevenueQuerySet.as_manager()
+
+    year = models.PositiveSmallIntegerField()
+    quarter = models.PositiveSmallIntegerField()
+    transaction_type = models.CharField(
+        choices=TRANSACTION_TYPE_CHOICES,
+        max_length=7,
+    )
+    institution_type = models.CharField(
+        blank=True,
+        max_length=255,
+    )
+    total_price = models.DecimalField(
+        decimal_places=2,
+        max_digits=14,
+    )
+    ip_related_price = models.DecimalField(
+        decimal_places=2,
+        max_digits=14,
+    )
+    ip_related_gross_price = models.DecimalField(
+        decimal_places=2,
+        max_digits=14,
+    )
+    number_of_reactions = models.PositiveIntegerField()
+    number_of_transactions = models.PositiveIntegerField()
+
+    def __str__(self):
+        return '{} Q{} ({}, {})'.format(
+            self.year, self.quarter, self.transaction_type,
+            self.institution_type or '-')
+
+
+def _encode_report(value):
+    # JSON has no decimals; tag them to read them back unchanged.
+    if isinstance(value, Decimal):
+        return {'decimal': str(value)}
+    if isinstance(value, dict):
+        return {key: _encode_report(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_encode_report(item) for item in value]
+    return value
+
+
+def _decode_report(value):
+    if isinstance(value, dict):
+        if list(value) == ['decimal']:
+            return Decimal(value['decimal'])
+        return {key: _decode_report(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode_report(item) for item in value]
+    return value
+
+
+class RoyaltySnapshotQuerySet(models.QuerySet):
+
+    def for_period(self, year, quarter=None):
+        """Return the snapshot of a year or of one of its quarters, if any."""
+        return self.filter(
+            year=year, quarter=int(quarter[1]) if quarter else None)
+
+    def close(self, year, quarter=None):
+        """
+        Freeze the royalties report of a year or one of its quarters (e.g.,
+        ``'Q1'``), which must be over and not already closed, and return
+        its snapshot.
+        """
+        from_date, to_date = get_period_dates(year, quarter)
+        label = ' '.join(str(part) for part in [year, quarter] if part)
+        if to_date >= datetime.date.today():
+            raise ValueError('{} is not over yet.'.format(label))
+        with transaction.atomic():
+            if self.for_period(year, quarter).exists():
+                raise ValueError('{} is already closed.'.format(label))
+            report = Transaction.objects.get_period_report(year, quarter)
+            return self.create(
+                year=year,
+                quarter=int(quarter[1]) if quarter else None,
+                report=json.dumps(_encode_report(report)),
+            )
+
+    def get_report(self, year, quarter=None):
+        """
+        Return the frozen report of a closed year or quarter, or ``None``
+        if it is not closed, in one query.
+        """
+        report = self.for_period(year, quarter).values_list(
+            'report', flat=True).first()
+        if report is None:
+            return None
+        return _decode_report(json.loads(report))
+
+    def flag_edits(self, periods):
+        """
+        Mark the snapshots of the closed years and quarters covering any of
+        the ``(year, 'Qn')`` pairs in ``periods`` as edited since they were
+        closed, and return how many were.
+        """
+        condition = Q()
+        for year, quarter in periods:
+            condition |= Q(year=year, quarter=int(quarter[1]))
+            condition |= Q(year=year, quarter=None)
+        if not condition:
+            return 0
+        flagged = self.filter(condition).update(edited=timezone.now())
+        if flagged:
+            logger.warning(
+                'Transactions fulfilled in closed periods changed: %s',
+                ', '.join(str(snapshot) for snapshot in self.filter(condition)))
+        return flagged
+
+
+class RoyaltySnapshot(models.Model):
+    """
+    The royalties report of a year or quarter as it was when the period
+    was closed (e.g., once reported to the licensor), read in place of
+    the transactions by the reports over exactly that period.
+
+    Changes to the transactions of a closed period leave its snapshot as
+    it is, but set ``edited``.
+    """
+
+    class Meta:
+        ordering = ['year', 'quarter']
+        unique_together = ['year', 'quarter']
+
+    objects = RoyaltySnapshotQuerySet.as_manager()
+
+    year = models.PositiveSmallIntegerField()
+    quarter = models.PositiveSmallIntegerField(
+        blank=True,
+        help_text='Blank for the whole year.',
+        null=True,
+    )
+    # The report dict as JSON, with decimals tagged.
+    report = models.TextField(
+        editable=False,
+    )
+    closed = models.DateTimeField(
+        auto_now_add=True,
+    )
+    edited = models.DateTimeField(
+        blank=True,
+        editable=False,
+        help_text='When transactions fulfilled in the period last changed '
+            'after it was closed.',
+        null=True,
+    )
+
+    def __str__(self):
+        if self.quarter is None:
+            return str(self.year)
+        return '{} Q{}'.format(self.year, self.quarter)
+
+    def get_report(self):
+        return _decode_report(json.loads(self.report))
+
+
+FULFILLED_DATE_RANGE_KEY = 'revenue_tracker:fulfilled_date_range'
+
+# A range cached from data that changed as it was read is only corrected
+# once this many seconds have passed.
+FULFILLED_DATE_RANGE_TIMEOUT = 300
+
+
+def get_fulfilled_date_range():
+    """
+    Return the first and last dates on which transactions were fulfilled
+    (both ``None`` if none have been), kept in the cache until
+    ``update_fulfilled_date_range`` finds a change that may move them.
+    """
+    date_range = cache.get(FULFILLED_DATE_RANGE_KEY)
+    if date_range is None:
+        dates = Transaction.objects.aggregate(
+            first=Min('date_fulfilled'), last=Max('date_fulfilled'))
+        date_range = (dates['first'], dates['last'])
+        cache.set(
+            FULFILLED_DATE_RANGE_KEY, date_range, FULFILLED_DATE_RANGE_TIMEOUT)
+    return date_range
+
+
+def update_fulfilled_date_range(old_date=None, new_date=None):
+    """
+    Forget the cached fulfilled date range if a transaction whose date
+    fulfilled changed from ``old_date`` to ``new_date`` may have moved it.
+    Call it once the change is committed, so that the range is not read
+    again from the data before the change.
+    """
+    date_range = cache.get(FULFILLED_DATE_RANGE_KEY)
+    if date_range is None or old_date == new_date:
+        return
+    first, last = date_range
+    if old_date is not None and old_date in date_range:
+        # The range may shrink.
+        forget_fulfilled_date_range()
+    elif new_date is not None and (
+            first is None or not first <= new_date <= last):
+        forget_fulfilled_date_range()
+
+
+def forget_fulfilled_date_range():
+    """Recompute the fulfilled date range when it is next needed."""
+    cache.delete(FULFILLED_DATE_RANGE_KEY)
+
+
+_available_quarters = None
+
+
+def get_available_quarters():
+    """
+    Return ``QuarterlyRevenue.objects.available_quarters()``, rebuilding the
+    process-local copy only when the rollup has changed.
+    """
+    global _available_quarters
+    version = get_version('quarterly_revenue')
+    if _available_quarters is None or _available_quarters[0] != version:
+        _available_quarters = (
+            version, QuarterlyRevenue.objects.available_quarters())
+    return _available_quarters[1]
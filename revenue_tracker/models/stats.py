@@ -0,0 +1,149 @@
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Count, Max, Min, Sum
+
+from .people import Customer, Vendor
+from .transactions import TRANSACTION_TYPE_CHOICES, Transaction
+
+
+# Aggregates over a customer's or vendor's transactions, by stats field.
+LIFETIME_STATS = {
+    'first_date': Min('date'),
+    'last_date': Max('date'),
+    'date_count': Count('date', distinct=True),
+    'transaction_count': Count('pk'),
+    'reaction_count': Sum('number_of_reactions'),
+    'total_revenue': Sum('total_price'),
+}
+
+
+class LifetimeStatsQuerySet(models.QuerySet):
+
+    def compute(self, owner_ids=None):
+        """
+        Return unsaved stats rows computed from the transactions of every
+        customer (or vendor), or just of those in ``owner_ids``: one per
+        transaction type and one for all types.
+        """
+        owner = self.model.owner_field
+        transactions = Transaction.objects.filter(
+            **{owner + '__isnull': False})
+        if owner_ids is not None:
+            transactions = transactions.filter(**{owner + '__in': owner_ids})
+
+        by_type = transactions.order_by().values(
+            owner, 'transaction_type').annotate(**LIFETIME_STATS)
+        all_types = transactions.order_by().values(owner).annotate(
+            **LIFETIME_STATS)
+        return [
+            self.model(**{
+                owner + '_id': row.pop(owner),
+                'transaction_type': row.pop('transaction_type', ''),
+                **row,
+            })
+            for row in list(by_type) + list(all_types)
+        ]
+
+    def rebuild(self, owner_ids=None, batch_size=500):
+        """
+        Recompute the stats rows of every customer (or vendor), or just of
+        those in ``owner_ids``, ``batch_size`` at a time.
+        """
+        if owner_ids is None:
+            with transaction.atomic():
+                self.all().delete()
+                self.bulk_create(self.compute())
+            return
+        owner_ids = sorted({pk for pk in owner_ids if pk is not None})
+        for start in range(0, len(owner_ids), batch_size):
+            batch = owner_ids[start:start + batch_size]
+            with transaction.atomic():
+                self.filter(**{self.model.owner_field + '__in': batch}).delete()
+                self.bulk_create(self.compute(batch))
+
+    def verify(self):
+        """
+        Compare the stats rows with ones computed from scratch and return
+        the ``(owner_id, transaction_type)`` keys of those that differ.
+        """
+        def key(row):
+            return (getattr(row, self.model.owner_field + '_id'),
+                row.transaction_type)
+
+        stored = {key(row): row.stats() for row in self.all()}
+        expected = {key(row): row.stats() for row in self.compute()}
+        return sorted(
+            key for key in set(stored) | set(expected)
+            if stored.get(key) != expected.get(key))
+
+
+class LifetimeStats(models.Model):
+    """
+    The lifetime transaction stats of a customer or vendor, for one
+    transaction type or, with a blank ``transaction_type``, for all.
+
+    Rows are kept up to date when transactions are saved or deleted;
+    ``manage.py rebuild_revenue_stats`` checks and recomputes them.
+    """
+
+    class Meta:
+        abstract = True
+
+    objects = LifetimeStatsQuerySet.as_manager()
+
+    transaction_type = models.CharField(
+        blank=True,
+        choices=TRANSACTION_TYPE_CHOICES,
+        max_length=7,
+    )
+    first_date = models.DateField()
+    last_date = models.DateField()
+    date_count = models.PositiveIntegerField()
+    transaction_count = models.PositiveIntegerField()
+    reaction_count = models.PositiveIntegerField()
+    total_revenue = models.DecimalField(
+        decimal_places=2,
+        max_digits=14,
+    )
+
+    def stats(self):
+        """Return the stats as a tuple, with the revenue rounded to cents."""
+        return tuple(
+            Decimal(self.total_revenue).quantize(Decimal('0.01'))
+            if name == 'total_revenue' else getattr(self, name)
+            for name in LIFETIME_STATS)
+
+
+class CustomerStats(LifetimeStats):
+    owner_field = 'customer'
+
+    class Meta:
+        unique_together = ['customer', 'transaction_type']
+        verbose_name_plural = 'customer stats'
+
+    customer = models.ForeignKey(
+        Customer,
+        on_delete=models.CASCADE,
+        related_name='revenue_stats',
+    )
+
+    def __str__(self):
+        return '{} ({})'.format(self.customer_id, self.transaction_type or 'all')
+
+
+class VendorStats(LifetimeStats):
+    owner_field = 'vendor'
+
+    class Meta:
+        unique_together = ['vendor', 'transaction_type']
+        verbose_name_plural = 'vendor stats'
+
+    vendor = models.ForeignKey(
+        Vendor,
+        on_delete=models.CASCADE,
+        related_name='revenue_stats',
+    )
+
+    def __str__(self):
+        return '{} ({})'.format(self.vendor_id, self.transaction_type or 'all')
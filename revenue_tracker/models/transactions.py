@@ -1,14 +1,31 @@
-import os
+import bisect
 import datetime
+import os
+import threading
+from decimal import ROUND_HALF_UP, Decimal
 
 from django.conf import settings
-from django.db import models
-from django.db.models import Case, Count, F, ExpressionWrapper, Sum, When
+from django.core.exceptions import ValidationError
+from django.db import connections, models, router, transaction
+from django.db.models import (
+    Case, Count, ExpressionWrapper, F, Func, OuterRef, Q, Subquery, Sum,
+    Value, When,
+)
+from django.db.models.functions import (
+    Cast, Coalesce, ExtractQuarter, ExtractYear, TruncMonth, TruncQuarter,
+    TruncWeek, TruncYear,
+)
+from django.utils import timezone
 
 from djmoney.models.fields import MoneyField
+from djmoney.money import Money
 from ngs_project_tracker.models import Project
 
-from ..models import Customer
+from ..instrumentation import timed
+from ..models import Customer, Vendor
+from ..report_cache import cached_report, invalidate_reports
+from ..routers import use_replica
+from ..versioning import get_version
 
 
 ROYALTY_PERCENTAGE = getattr(settings, 'ROYALTY_PERCENTAGE', 0)
@@ -20,18 +37,56 @@ TRANSACTION_TYPE_CHOICES = [
     ('other', 'Other')
 ]
 
+# Transaction fields accepted by RoyaltiesManager.bulk_import, along with
+# 'customer' (by code) and 'vendor' (by name).
+IMPORT_FIELDS = [
+    'transaction_type',
+    'number_of_reactions',
+    'total_price',
+    'ip_related_price',
+    'date',
+    'date_samples_arrived',
+    'date_fulfilled',
+    'date_paid',
+    'description',
+    'notes',
+]
+
+# The fields of a transaction's customer and vendor, besides its own
+# description and notes, that are copied to its search text. The first
+# of each is the one bulk_import looks them up by.
+CUSTOMER_SEARCH_FIELDS = ['code', 'name', 'institution__name', 'contact__name']
+VENDOR_SEARCH_FIELDS = ['name', 'contact__name']
+
+# The fields of a transaction its search text is built from, besides those
+# of its customer and vendor.
+SEARCH_TEXT_FIELDS = ['customer_id', 'vendor_id', 'description', 'notes']
+
+
+def build_search_text(*values):
+    """Return the search text of a transaction from its search fields."""
+    return '\n'.join(str(value).lower() for value in values if value)
+
 
 class BasePriceQuerySet(models.QuerySet):
 
     def delete(self, *args, **kwargs):
-        for obj in self:
-            obj.delete()
-        super(BasePriceQuerySet, self).delete(*args, **kwargs)
+        price_periods = list(self.values_list('transaction_type', 'start_date'))
+        with transaction.atomic():
+            result = super(BasePriceQuerySet, self).delete(*args, **kwargs)
+            reprice_transactions(price_periods)
+        return result
 
 
 class BasePrice(models.Model):
 
     class Meta:
+        indexes = [
+            models.Index(
+                fields=['transaction_type', 'start_date'],
+                name='revenue_bp_type_start_idx',
+            ),
+        ]
         ordering = ['start_date', 'transaction_type']
         unique_together = ['start_date', 'transaction_type']
 
@@ -53,56 +108,189 @@ class BasePrice(models.Model):
             self.start_date, self.transaction_type, self.price_per_reaction)
 
     def delete(self, *args, **kwargs):
-        start_date = self.start_date
-        transaction_type = self.transaction_type
-
-        sorted_price_periods = BasePrice.objects.filter(
-            transaction_type=transaction_type
-        ).annotate(
-            relevance=models.Case(
-                models.When(start_date__gt=start_date, then=1),
-                models.When(start_date__lt=start_date, then=2),
-                output_field=models.IntegerField(),
-            )
-        ).order_by('relevance', 'start_date')
-        previous_price_period = sorted_price_periods.filter(relevance=2).last()
-        next_price_period = sorted_price_periods.filter(relevance=1).first()
-
-
-        if next_price_period:
-            end_date = next_price_period.start_date - datetime.timedelta(days=1)
-        else:
-            end_date = datetime.date.today()
-
-        if previous_price_period:
-            Transaction.objects.filter(
-                transaction_type=transaction_type,
-                date__gte=previous_price_period.start_date,
-                date__lte=end_date,
-            ).update(base_ip_related_price_per_reaction=previous_price_period.price_per_reaction)
-        else:
-            Transaction.objects.filter(
-                transaction_type=transaction_type,
-                date__lte=end_date,
-            ).update(base_ip_related_price_per_reaction=0)
-
-        super().delete(*args, **kwargs)
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            reprice_transactions([(self.transaction_type, self.start_date)])
+        return result
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        start_date = self.start_date
-        next_price_period = BasePrice.objects.filter(
-            transaction_type=self.transaction_type, start_date__gt=start_date
-        ).order_by('start_date').first()
-        if next_price_period:
-            end_date = next_price_period.start_date - datetime.timedelta(days=1)
-        else:
-            end_date = datetime.date.today()
-        Transaction.objects.filter(
-            transaction_type=self.transaction_type,
-            date__gte=start_date,
-            date__lte=end_date,
-        ).update(base_ip_related_price_per_reaction=self.price_per_reaction)
+        price_periods = [(self.transaction_type, self.start_date)]
+        if self.pk is not None:
+            # Moving a period also reprices the dates it used to cover.
+            price_periods.extend(BasePrice.objects.filter(
+                pk=self.pk).values_list('transaction_type', 'start_date'))
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            reprice_transactions(price_periods)
+
+
+def _amount(value):
+    """Return the amount of a ``Money`` value or of a plain number."""
+    return value.amount if isinstance(value, Money) else Decimal(value)
+
+
+def round_cents(amount):
+    """Round an amount to cents, halves away from zero, as SQL's ROUND does."""
+    return amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+class RoundCents(Func):
+    """Round a number to cents in SQL, as ``round_cents()`` does."""
+    function = 'ROUND'
+    template = '%(function)s(%(expressions)s, 2)'
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        # PostgreSQL only rounds numerics to a number of places.
+        return self.as_sql(
+            compiler, connection,
+            template='%(function)s(CAST(%(expressions)s AS numeric), 2)',
+            **extra_context)
+
+
+def derived_price_expressions(base_price=None):
+    """
+    Return the SQL expressions computing the derived price columns of a
+    transaction from its prices, for ``update()``; see
+    ``Transaction.set_derived_prices()``.
+
+    With ``base_price``, an expression for a new base price per reaction,
+    compute them from it, so that they can be set in the same UPDATE as
+    the base price (whose SET expressions see the old one).
+    """
+    money = models.DecimalField(decimal_places=2, max_digits=14)
+    if base_price is None:
+        base_price = F('base_ip_related_price_per_reaction')
+    # NULL without a base price, as are the columns computed from it.
+    gross_price = RoundCents(
+        F('number_of_reactions')
+        * Func(base_price, Value(0), function='NULLIF', output_field=money),
+        output_field=money)
+    discount = RoundCents(
+        gross_price - F('ip_related_price'), output_field=money)
+    return {
+        'price_per_sample_amount': Case(
+            When(number_of_reactions=0, then=None),
+            default=RoundCents(
+                Cast('total_price', models.FloatField())
+                / F('number_of_reactions'),
+                output_field=money),
+            output_field=money),
+        'ip_related_gross_price_amount': Case(
+            When(number_of_reactions=0, then=None),
+            default=gross_price,
+            output_field=money),
+        'ip_related_discount_amount': discount,
+        'ip_related_discount_ratio': Case(
+            When(number_of_reactions=0, then=None),
+            default=ExpressionWrapper(
+                discount / Cast(gross_price, models.FloatField()),
+                output_field=models.FloatField()),
+            output_field=models.FloatField()),
+        'royalties_owed_amount': RoundCents(
+            F('ip_related_price') * Value(
+                Decimal(str(ROYALTY_PERCENTAGE)),
+                output_field=models.DecimalField()),
+            output_field=money),
+    }
+
+
+def reprice_transactions(price_periods):
+    """
+    Recompute the base price per reaction of every transaction affected by
+    changes to the given ``(transaction_type, start_date)`` price periods.
+
+    The transactions of a type dated from its earliest changed period up
+    to today whose price changes are updated, along with their derived
+    prices, with a single UPDATE, looking up the period in effect on each
+    date with a correlated subquery. The quarterly revenue rollup of the
+    quarters they were fulfilled in is rebuilt in the same database
+    transaction, and closed periods among them are flagged.
+    """
+    from .reports import QuarterlyRevenue, RoyaltySnapshot
+
+    earliest = {}
+    for transaction_type, start_date in price_periods:
+        if (transaction_type not in earliest
+                or start_date < earliest[transaction_type]):
+            earliest[transaction_type] = start_date
+    if not earliest:
+        return
+
+    affected = Q()
+    for transaction_type, start_date in earliest.items():
+        affected |= Q(transaction_type=transaction_type, date__gte=start_date)
+    price_in_effect = BasePrice.objects.filter(
+        transaction_type=OuterRef('transaction_type'),
+        start_date__lte=OuterRef('date'),
+    ).order_by('-start_date').values('price_per_reaction')[:1]
+
+    new_price = Coalesce(
+        Subquery(price_in_effect),
+        Value(0),
+        output_field=models.DecimalField(decimal_places=2, max_digits=5),
+    )
+
+    repriced = Transaction.objects.filter(
+        affected, date__lte=datetime.date.today(),
+    ).exclude(base_ip_related_price_per_reaction=new_price)
+    with transaction.atomic():
+        periods = set(repriced.filter(
+            date_fulfilled__isnull=False,
+        ).annotate(
+            year=ExtractYear('date_fulfilled'),
+            quarter=ExtractQuarter('date_fulfilled'),
+        ).order_by().values_list(
+            'year', 'quarter', 'transaction_type').distinct())
+        updated = repriced.update(
+            base_ip_related_price_per_reaction=new_price,
+            updated=timezone.now(),
+            **derived_price_expressions(new_price)
+        )
+        if not updated:
+            return
+        RoyaltySnapshot.objects.flag_edits({
+            (year, 'Q{}'.format(quarter)) for year, quarter, _ in periods})
+        for year, quarter, transaction_type in periods:
+            QuarterlyRevenue.objects.rebuild(
+                year=year, quarter='Q{}'.format(quarter),
+                transaction_type=transaction_type)
+    invalidate_reports()
+
+
+_local = threading.local()
+
+
+def _get_queued_price_periods():
+    """
+    Return the price periods waiting for a transaction to commit in this
+    thread, by database alias.
+    """
+    if not hasattr(_local, 'queued_price_periods'):
+        _local.queued_price_periods = {}
+    return _local.queued_price_periods
+
+
+def reprice_transactions_on_commit(price_periods):
+    """
+    Like ``reprice_transactions``, but when called inside an atomic block,
+    defer the repricing until the outermost transaction commits and do it
+    once for all the price periods queued in the meantime.
+    """
+    connection = connections[router.db_for_write(BasePrice)]
+    if not connection.in_atomic_block:
+        reprice_transactions(price_periods)
+        return
+    _get_queued_price_periods().setdefault(
+        connection.alias, set()).update(price_periods)
+
+    # Every call queues its own callback, the first of which reprices all
+    # the periods: a rollback drops the callbacks but not the queue, and
+    # the periods it leaves are repriced harmlessly with the next ones.
+    def reprice():
+        periods = _get_queued_price_periods().pop(connection.alias, None)
+        if periods:
+            reprice_transactions(periods)
+    transaction.on_commit(reprice, using=connection.alias)
 
 
 def get_base_price_per_period(transaction_type):
@@ -120,6 +308,51 @@ def get_base_price_per_period(transaction_type):
     return base_prices
 
 
+class PricePeriodIndex:
+    """
+    The base price periods of one transaction type, sorted by start date
+    for bisection.
+    """
+
+    def __init__(self, base_prices):
+        base_prices = sorted(base_prices)
+        self.start_dates = [start_date for start_date, price in base_prices]
+        self.prices = [price for start_date, price in base_prices]
+
+    def get_price(self, date):
+        """
+        Return the base price per reaction in effect on ``date``, or
+        ``None`` if no period covers it. As in ``get_base_price_per_period``,
+        the latest period ends today.
+        """
+        if date > datetime.date.today():
+            return None
+        index = bisect.bisect_right(self.start_dates, date)
+        if index == 0:
+            return None
+        return self.prices[index - 1]
+
+
+_price_period_indexes = {}
+
+
+def get_price_period_index(transaction_type):
+    """
+    Return the ``PricePeriodIndex`` for a transaction type, rebuilding the
+    process-local copy only when base prices have changed. Checking that
+    takes a cache lookup of the 'base_prices' version stamp, but no query.
+    """
+    version = get_version('base_prices')
+    cached = _price_period_indexes.get(transaction_type)
+    if cached is None or cached[0] != version:
+        cached = (version, PricePeriodIndex(
+            BasePrice.objects.filter(
+                transaction_type=transaction_type
+            ).values_list('start_date', 'price_per_reaction')))
+        _price_period_indexes[transaction_type] = cached
+    return cached[1]
+
+
 def transaction_doc_path(instance, filename):
     return '{}/{}'.format(instance.doc_type, filename)
 
@@ -162,215 +395,624 @@ class Invoice(TransactionDocument):
         return 'invoices'
 
 
+def _report_sums():
+    """Aggregates shared by the royalties report queries."""
+    return {
+        'sum_total_price': Sum('total_price'),
+        'sum_ip_related_price': Sum('ip_related_price'),
+        # Null where there is no base price or there are no reactions,
+        # which add nothing to the sum.
+        'sum_ip_related_gross_price': Coalesce(
+            Sum('ip_related_gross_price_amount'), Value(0),
+            output_field=models.DecimalField(decimal_places=2, max_digits=14)),
+        'sum_number_of_reactions': Sum('number_of_reactions'),
+        'transaction_count': Count('pk'),
+    }
+
+
+def _complete_report(report):
+    """Derive averages, discounts and royalties from a report's sums."""
+    report['sum_ip_related_discount'] = (
+        report['sum_ip_related_gross_price'] - report['sum_ip_related_price'])
+    if report['sum_number_of_reactions'] > 0:
+        report['average_total_price_per_reaction'] = (
+            report['sum_total_price'] / report['sum_number_of_reactions'])
+    else:
+        report['average_total_price_per_reaction'] = None
+    try:
+        report['sum_ip_related_discount_pct'] = (
+            report['sum_ip_related_discount']
+            / report['sum_ip_related_gross_price'])
+    except ArithmeticError:
+        report['sum_ip_related_discount_pct'] = 0
+    report['sum_royalties_owed'] = (
+        float(report['sum_ip_related_price']) * ROYALTY_PERCENTAGE)
+    return report
+
+
+def _complete_customer_counts(report, customers, repeat_customers):
+    report['customer_count'] = len(customers)
+    report['repeat_customer_count'] = len(customers & repeat_customers)
+    try:
+        report['repeat_customer_pct'] = (
+            report['repeat_customer_count'] / report['customer_count'])
+    except ZeroDivisionError:
+        report['repeat_customer_pct'] = 0
+    return report
+
+
+def _make_report(parts, repeat_customers):
+    """
+    Build a report dict from one or more disjoint parts collected by
+    ``RoyaltiesManager.collect_report_data``.
+    """
+    sum_keys = list(_report_sums())
+    sums_by_type = {}
+    customers_by_type = {}
+    for part in parts:
+        for t_type, sums in part['by_type'].items():
+            if t_type in sums_by_type:
+                for key in sum_keys:
+                    sums_by_type[t_type][key] += sums[key]
+            else:
+                sums_by_type[t_type] = dict(sums)
+        for t_type, customers in part['customers'].items():
+            customers_by_type.setdefault(t_type, set()).update(customers)
+
+    if not sums_by_type:
+        return {'total': 0, 'total_per_month': 0}
+
+    by_type = list(sums_by_type.values())
+
+    report = {}
+    for key in sum_keys:
+        report[key] = sum(subreport[key] for subreport in by_type)
+    _complete_report(report)
+    _complete_customer_counts(
+        report, set().union(*customers_by_type.values()), repeat_customers)
+    del report['transaction_count']
+
+    for subreport in by_type:
+        _complete_report(subreport)
+        _complete_customer_counts(
+            subreport,
+            customers_by_type.get(subreport['transaction_type'], set()),
+            repeat_customers)
+        del subreport['transaction_count']
+
+    report['by_type'] = sorted(
+        by_type, key=lambda x: int(-1 * x['sum_total_price']))
+
+    return report
+
+
+# Functions truncating a date to the first day of its period, for
+# ``RoyaltiesManager.get_revenue_series``. Weeks start on Monday.
+SERIES_TRUNCATIONS = {
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+    'year': TruncYear,
+}
+
+SERIES_MONTHS = {'month': 1, 'quarter': 3, 'year': 12}
+
+
+def _truncate_date(date, granularity):
+    """Return the first day of the period of ``date``."""
+    if granularity == 'week':
+        return date - datetime.timedelta(days=date.weekday())
+    months = SERIES_MONTHS[granularity]
+    return date.replace(
+        month=(date.month - 1) // months * months + 1, day=1)
+
+
+def _next_period(date, granularity):
+    """Return the first day of the period after the one starting on ``date``."""
+    if granularity == 'week':
+        return date + datetime.timedelta(days=7)
+    month = date.month - 1 + SERIES_MONTHS[granularity]
+    return date.replace(year=date.year + month // 12, month=month % 12 + 1)
+
+
+def _series_sums(sums):
+    sums['sum_royalties_owed'] = (
+        float(sums['sum_ip_related_price']) * ROYALTY_PERCENTAGE)
+    return sums
+
+
 class RoyaltiesManager(models.Manager):
     # Adapted from:
     # https://github.com/barmassimo/Expense-Tracker/blob/master/src/expenses/models.py
 
-    def get_period_report(self, year, quarter=None, **kwargs):
-
-        quarters = {
-            'Q1': ['01-01', '03-31'],
-            'Q2': ['04-01', '06-30'],
-            'Q3': ['07-01', '09-30'],
-            'Q4': ['10-01', '12-31'],
-        }
+    def for_display(self):
+        """
+        Return transactions with the related objects shown in the
+        transaction panels (including the customer stats behind the
+        repeat-customer icon) loaded up front.
+        """
+        return self.select_related(
+            'vendor', 'quote', 'order', 'invoice',
+        ).prefetch_related(
+            'projects',
+            models.Prefetch(
+                'customer',
+                queryset=Customer.objects.select_related(
+                    'institution').with_revenue_stats()),
+        )
 
+    def get_period_report(self, year, quarter=None, **kwargs):
+        """
+        Return the royalties report for transactions fulfilled in a year
+        or one of its quarters (e.g., ``'Q1'``).
+
+        Unless other filters are given, the report of a closed period is
+        read from its ``RoyaltySnapshot``, and otherwise the sums are read
+        from the ``QuarterlyRevenue`` rollup rather than from the
+        transactions.
+        """
+        from .reports import QuarterlyRevenue, get_period_dates
+
+        from_date, to_date = get_period_dates(year, quarter)
+        snapshot = self.get_closed_period_report(from_date, to_date, **kwargs)
+        if snapshot is not None:
+            return snapshot
+        transactions = self.get_report_queryset(
+            from_date=from_date, to_date=to_date, **kwargs)
+
+        if set(kwargs) - {'institution_type', 'transaction_type'}:
+            data, repeat_customers = self.collect_report_data(transactions)
+            return _make_report(data.values(), repeat_customers)
+
+        rollup = QuarterlyRevenue.objects.filter(year=year)
         if quarter:
-            period = quarters[quarter]
-        else:
-            period = ['01-01', '12-31']
+            rollup = rollup.filter(quarter=int(quarter[1]))
+        if kwargs.get('institution_type'):
+            rollup = rollup.filter(institution_type=kwargs['institution_type'])
+        if kwargs.get('transaction_type'):
+            rollup = rollup.filter(transaction_type=kwargs['transaction_type'])
 
-        return self.get_royalties_report(
-            from_date='{}-{}'.format(year, period[0]),
-            to_date='{}-{}'.format(year, period[1]),
-            **kwargs)
+        data, repeat_customers = self.collect_report_data(
+            transactions, sums=rollup.report_sums())
+        return _make_report(data.values(), repeat_customers)
 
-    def get_royalties_report(
+    def get_report_queryset(
         self, from_date=None, to_date=None, in_progress_only=False,
         customer_id=None, include_in_progress=False, outstanding=False,
         institution_type=None, transaction_type=None):
-
+        """
+        Return the transactions covered by a royalties report with the
+        given filters.
+        """
         type_kwargs = {}
-        c_type_kwargs = {}
-        c_kwargs = {}
-        t_kwargs = {}
-
         if institution_type:
             type_kwargs['customer__institution__institution_type'] = institution_type
-            c_type_kwargs['institution__institution_type'] = institution_type
         if transaction_type:
             type_kwargs['transaction_type'] = transaction_type
-            c_type_kwargs['transactions__transaction_type'] = transaction_type
+        if customer_id:
+            type_kwargs['customer_id'] = customer_id
 
         if in_progress_only:
-                t_kwargs['date_fulfilled'] = None
-                c_kwargs['transactions__date_fulfilled'] = None
+            period = Q(date_fulfilled=None)
         elif outstanding:
-            t_kwargs['date_fulfilled__isnull'] = False
-            t_kwargs['date_paid__isnull'] = True
-            c_kwargs['transactions__date_fulfilled__isnull'] = False
-            c_kwargs['transactions__date_paid__isnull'] = True
+            period = Q(date_fulfilled__isnull=False, date_paid__isnull=True)
         else:
+            period = Q()
             if from_date is not None:
-                t_kwargs['date_fulfilled__gte'] = from_date
-                c_kwargs['transactions__date_fulfilled__gte'] = from_date
+                period &= Q(date_fulfilled__gte=from_date)
             if to_date is not None:
-                t_kwargs['date_fulfilled__lte'] = to_date
-                c_kwargs['transactions__date_fulfilled__lte'] = to_date
+                period &= Q(date_fulfilled__lte=to_date)
+
+        if include_in_progress and period:
+            period |= Q(date_fulfilled__isnull=True)
+
+        return self.filter(period, **type_kwargs)
+
+    def collect_report_data(self, transactions, sums=None, **partition):
+        """
+        Run the three report queries over ``transactions``: one grouped by
+        transaction type for the sums, one for the customers of each
+        transaction type, and one reading which of those are repeat
+        customers from their lifetime stats.
+
+        ``sums`` replaces the first query with precomputed rows of the
+        same shape. An optional keyword argument names an expression to
+        split the transactions by. Returns the sums and customer ids for
+        each value of that expression, plus the set of repeat customers.
+        """
+        from .stats import CustomerStats
+
+        group_by = ['transaction_type']
+        if partition:
+            transactions = transactions.annotate(**partition)
+            group_by += list(partition)
+
+        data = {}
+
+        def get_part(row):
+            key = tuple(row.pop(name) for name in group_by[1:])
+            return data.setdefault(key, {'by_type': {}, 'customers': {}})
+
+        if sums is None:
+            sums = transactions.order_by().values(*group_by).annotate(
+                **_report_sums())
+        for row in sums:
+            get_part(row)['by_type'][row['transaction_type']] = row
+
+        report_customers = transactions.filter(customer__isnull=False)
+        for row in report_customers.order_by().values(
+                *group_by, 'customer').distinct():
+            get_part(row)['customers'].setdefault(
+                row['transaction_type'], set()).add(row['customer'])
+
+        # A customer is a repeat customer if they have transactions on
+        # more than one date, whether or not those fall in the report, as
+        # counted in their lifetime stats.
+        repeat_customers = set(CustomerStats.objects.filter(
+            customer__in=report_customers.order_by().values('customer'),
+            transaction_type='',
+            date_count__gt=1,
+        ).values_list('customer', flat=True))
+
+        return data, repeat_customers
+
+    def get_royalties_report(self, **kwargs):
+        """
+        Summarize the transactions matching the filters accepted by
+        ``get_report_queryset``, overall and by transaction type.
+
+        Reports are cached until the data they cover changes. Reports over
+        exactly a closed year or quarter are read from its snapshot.
+        """
+        def compute():
+            snapshot = self.get_closed_period_report(**kwargs)
+            if snapshot is not None:
+                return snapshot
+            data, repeat_customers = self.collect_report_data(
+                self.get_report_queryset(**kwargs))
+            return _make_report(data.values(), repeat_customers)
+        return self._cached_report('royalties_report', kwargs, compute)
+
+    def get_revenue_series(self, granularity='month', **kwargs):
+        """
+        Return the revenue of the transactions matching the filters
+        accepted by ``get_report_queryset`` by the week, month, quarter or
+        year they were fulfilled in, from a single grouped query.
+
+        The result has a dict per period, in order and without gaps from
+        the first period to the last (those of ``from_date`` and
+        ``to_date`` when given), holding the first ``date`` of the period,
+        its sums and royalties, and the same per transaction type in
+        ``by_type``. Series are cached like the reports of
+        ``get_royalties_report``.
+        """
+        if granularity not in SERIES_TRUNCATIONS:
+            raise ValueError('Unknown granularity {!r}.'.format(granularity))
+
+        def compute():
+            rows = self.get_report_queryset(**kwargs).filter(
+                date_fulfilled__isnull=False
+            ).annotate(
+                period=SERIES_TRUNCATIONS[granularity]('date_fulfilled'),
+            ).order_by().values('period', 'transaction_type').annotate(
+                **_report_sums())
+
+            by_period = {}
+            transaction_types = set()
+            for row in rows:
+                by_period.setdefault(row.pop('period'), {})[
+                    row['transaction_type']] = _series_sums(row)
+                transaction_types.add(row['transaction_type'])
+
+            date_field = models.DateField()
+            first = date_field.to_python(kwargs.get('from_date')) or min(
+                by_period, default=None)
+            last = date_field.to_python(kwargs.get('to_date')) or max(
+                by_period, default=None)
+            if first is None or last is None:
+                return []
+
+            empty = _series_sums({key: 0 for key in _report_sums()})
+            series = []
+            period = _truncate_date(first, granularity)
+            while period <= last:
+                sums_by_type = by_period.get(period, {})
+                by_type = [
+                    sums_by_type.get(
+                        transaction_type,
+                        dict(empty, transaction_type=transaction_type))
+                    for transaction_type, label in TRANSACTION_TYPE_CHOICES
+                    if transaction_type in transaction_types
+                ]
+                point = {'date': period, 'by_type': by_type}
+                for key in empty:
+                    point[key] = sum(sums[key] for sums in by_type)
+                series.append(point)
+                period = _next_period(period, granularity)
+            return series
+        return self._cached_report(
+            'revenue_series', dict(kwargs, granularity=granularity), compute)
+
+    def get_royalties_report_bundle(
+        self, from_date=None, to_date=None, customer_id=None,
+        institution_type=None, transaction_type=None):
+        """
+        Return the reports for transactions fulfilled in the date range
+        (``report``), for transactions not yet fulfilled
+        (``report_unfulfilled``) and for both (``report_including_unfulfilled``)
+        from a single pass over the matching transactions. Bundles are
+        cached like the reports of ``get_royalties_report``.
+
+        So that the three reports agree, ``report`` is computed from the
+        transactions even over a closed year or quarter; ``closed_period``
+        then holds when it was ``closed`` and last ``edited`` (``None``
+        otherwise), since the report differs from the frozen one once the
+        period has been edited.
+        """
+        from .reports import RoyaltySnapshot
+
+        kwargs = {
+            'from_date': from_date,
+            'to_date': to_date,
+            'customer_id': customer_id,
+            'institution_type': institution_type,
+            'transaction_type': transaction_type,
+        }
 
-        cid_c_kwargs = {}
-        cid_t_kwargs = {}
-        if customer_id:
-            cid_t_kwargs['customer_id'] = customer_id
-            cid_c_kwargs['id'] = customer_id
-
-        transactions_by_date = Transaction.objects.filter(
-            **t_kwargs, **cid_t_kwargs, **type_kwargs)
-
-        if include_in_progress:
-            in_progress = Transaction.objects.filter(
-                date_fulfilled__isnull=True, **cid_t_kwargs, **type_kwargs)
-            transactions_by_date = transactions_by_date | in_progress
-
-        aggregate_data = transactions_by_date.annotate(
-            ip_related_gross_price = ExpressionWrapper(
-                F('number_of_reactions') * F('base_ip_related_price_per_reaction'),
-                output_field=MoneyField(
-                    decimal_places=2, default_currency='USD', max_digits=8)),
-            ip_related_discount = ExpressionWrapper(
-                F('number_of_reactions') * F('base_ip_related_price_per_reaction') - F('ip_related_price'),
-                output_field=MoneyField(
-                    decimal_places=2, default_currency='USD', max_digits=8)),
-        ).aggregate(
-            Sum('total_price'),
-            Sum('number_of_reactions'),
-            Sum('ip_related_price'),
-            Count('pk'),
-            Sum('ip_related_gross_price'),
-            Sum('ip_related_discount'),
+        def compute():
+            data, repeat_customers = self.collect_report_data(
+                self.get_report_queryset(include_in_progress=True, **kwargs),
+                in_progress=Case(
+                    When(date_fulfilled__isnull=True, then=Value(True)),
+                    default=Value(False),
+                    output_field=models.BooleanField()))
+            empty = {'by_type': {}, 'customers': {}}
+            fulfilled = data.get((False,), empty)
+            in_progress = data.get((True,), empty)
+            closed_period = None
+            period = self._get_closed_period(**kwargs)
+            if period is not None:
+                closed_period = RoyaltySnapshot.objects.for_period(
+                    *period).values('closed', 'edited').first()
+            return {
+                'closed_period': closed_period,
+                'report': _make_report([fulfilled], repeat_customers),
+                'report_unfulfilled': _make_report(
+                    [in_progress], repeat_customers),
+                'report_including_unfulfilled': _make_report(
+                    [fulfilled, in_progress], repeat_customers),
+            }
+        return self._cached_report('royalties_report_bundle', kwargs, compute)
+
+    def get_closed_period_report(self, from_date=None, to_date=None, **filters):
+        """
+        Return the frozen report of the closed year or quarter spanning
+        exactly ``from_date`` to ``to_date``, or ``None`` if there is none
+        or other filters are given.
+        """
+        from .reports import RoyaltySnapshot
+
+        period = self._get_closed_period(from_date, to_date, **filters)
+        if period is None:
+            return None
+        return RoyaltySnapshot.objects.get_report(*period)
+
+    def _get_closed_period(self, from_date=None, to_date=None, **filters):
+        """
+        Return the year and quarter that a report with these filters could
+        read from a snapshot, or ``None``.
+        """
+        from .reports import get_period
+
+        # Related managers filter the transactions further.
+        if any(filters.values()) or self is not self.model._default_manager:
+            return None
+        return get_period(from_date, to_date)
+
+    def _cached_report(self, name, kwargs, compute):
+        # Related managers filter the transactions further, which the
+        # cache key would not cover.
+        with timed(name), use_replica():
+            if self is not self.model._default_manager:
+                return compute()
+            return cached_report(name, kwargs, compute)
+
+    def update_search_text(self, transactions=None, batch_size=500):
+        """
+        Recompute the search text of every transaction, or of those in the
+        ``transactions`` queryset, ``batch_size`` at a time, e.g. after
+        their customer or vendor changed. Return the number updated.
+        """
+        if transactions is None:
+            transactions = self.all()
+        rows = transactions.order_by('pk').values_list(
+            'pk', 'search_text', 'description', 'notes',
+            *['customer__' + name for name in CUSTOMER_SEARCH_FIELDS],
+            *['vendor__' + name for name in VENDOR_SEARCH_FIELDS])
+        updated = 0
+        last_pk = None
+        while True:
+            batch = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+            batch = list(batch[:batch_size])
+            if not batch:
+                return updated
+            with transaction.atomic():
+                for pk, search_text, *values in batch:
+                    text = build_search_text(*values)
+                    if text != search_text:
+                        self.filter(pk=pk).update(search_text=text)
+                        updated += 1
+            last_pk = batch[-1][0]
+
+    def update_derived_prices(self, transactions=None):
+        """
+        Recompute the derived price columns of every transaction, or of
+        those in the ``transactions`` queryset, in one UPDATE, e.g. after
+        changing ``ROYALTY_PERCENTAGE``. Return the number updated.
+        """
+        if transactions is None:
+            transactions = self.all()
+        return transactions.update(**derived_price_expressions())
+
+    def bulk_import(self, rows, batch_size=500, dry_run=False):
+        """
+        Create transactions from an iterable of dicts keyed by field name,
+        with ``customer`` given by code and ``vendor`` by name.
+
+        Rows are processed in batches of ``batch_size``: customers and
+        vendors are resolved with one query per batch, base prices come
+        from the price-period index, and valid rows are inserted with one
+        ``bulk_create``. Each batch is committed together with the updates
+        of the rollup, the lifetime stats and the closed periods it
+        affects. Invalid rows are skipped and reported rather than
+        aborting the import. With ``dry_run``, nothing is written.
+
+        Returns a dict with the number of transactions ``created`` (or
+        that would be created) and a list of ``(row_number, message)``
+        ``errors``, numbering rows from 1.
+        """
+        result = {'created': 0, 'errors': []}
+        batch = []
+        for row_number, row in enumerate(rows, 1):
+            batch.append((row_number, row))
+            if len(batch) == batch_size:
+                self._import_batch(batch, result, dry_run)
+                batch = []
+        if batch:
+            self._import_batch(batch, result, dry_run)
+        return result
+
+    def _import_batch(self, batch, result, dry_run):
+        from .reports import (
+            QuarterlyRevenue, RoyaltySnapshot, forget_fulfilled_date_range,
         )
+        from .stats import CustomerStats, VendorStats
 
-        if (aggregate_data['pk__count'] == 0):
-            return {'total': 0, 'total_per_month': 0}
-
-        report = {}
+        customer_search = {
+            values[0]: values[1:]
+            for values in Customer.objects.filter(
+                code__in={row.get('customer') for _, row in batch}
+            ).values_list('pk', *CUSTOMER_SEARCH_FIELDS)
+        }
+        vendor_search = {
+            values[0]: values[1:]
+            for values in Vendor.objects.filter(
+                name__in={row.get('vendor') for _, row in batch}
+            ).values_list('pk', *VENDOR_SEARCH_FIELDS)
+        }
+        customers = {
+            values[0]: pk for pk, values in customer_search.items()}
+        vendors = {values[0]: pk for pk, values in vendor_search.items()}
 
-        report['sum_total_price'] = aggregate_data['total_price__sum']
-        report['sum_ip_related_price'] = aggregate_data['ip_related_price__sum']
-        report['sum_number_of_reactions'] = aggregate_data['number_of_reactions__sum']
-        if aggregate_data['number_of_reactions__sum'] > 0:
-            report['average_total_price_per_reaction'] = (
-                aggregate_data['total_price__sum']
-                / aggregate_data['number_of_reactions__sum']
+        transactions = []
+        price_indexes = {}
+        for row_number, row in batch:
+            try:
+                transactions.append(self._build_imported_transaction(
+                    row, customers, vendors, price_indexes))
+            except ValidationError as e:
+                result['errors'].append((row_number, '; '.join(e.messages)))
+
+        for t in transactions:
+            t.search_text = build_search_text(
+                t.description, t.notes,
+                *customer_search.get(t.customer_id, ()),
+                *vendor_search.get(t.vendor_id, ()))
+        result['created'] += len(transactions)
+        if dry_run or not transactions:
+            return
+
+        periods = {
+            (
+                t.date_fulfilled.year,
+                'Q{}'.format((t.date_fulfilled.month - 1) // 3 + 1),
+                t.transaction_type,
             )
-        else:
-            report['average_total_price_per_reaction'] = None
-        report['sum_ip_related_price'] = aggregate_data['ip_related_price__sum']
-        report['sum_ip_related_gross_price'] = aggregate_data['ip_related_gross_price__sum']
-        report['sum_ip_related_discount'] = aggregate_data['ip_related_discount__sum']
-        try:
-            report['sum_ip_related_discount_pct'] = (
-                aggregate_data['ip_related_discount__sum']
-                / aggregate_data['ip_related_gross_price__sum'])
-        except:
-            report['sum_ip_related_discount_pct'] = 0
-        report['sum_royalties_owed'] = float(aggregate_data['ip_related_price__sum']) * ROYALTY_PERCENTAGE
-
-        customers_annotated = Customer.objects.annotate(
-            c_tx_count=Count('transactions__date', distinct=True)
-        )
-        customers = customers_annotated.filter(
-            c_tx_count__gt=0, **c_kwargs, **cid_c_kwargs, **c_type_kwargs)
-
-        if include_in_progress:
-            in_progress = Customer.objects.annotate(
-                c_tx_count=Count('transactions__date', distinct=True)
-            ).filter(
-                transactions__date_fulfilled__isnull=True,
-                c_tx_count__gt=0, **cid_c_kwargs)
-            customers = customers | in_progress
-
-        customers = customers.distinct()
-        repeat_customers = customers.filter(c_tx_count__gt=1)
-
-        report['customer_count'] = customers.count()
-        report['repeat_customer_count'] = repeat_customers.count()
-        try:
-            repeat_customer_pct = repeat_customers.count() / customers.count()
-        except ZeroDivisionError:
-            repeat_customer_pct = 0
-        report['repeat_customer_pct'] = repeat_customer_pct
-
-        by_type = transactions_by_date.values('transaction_type').annotate(
-            sum_total_price=Sum('total_price'),
-            sum_ip_related_price=Sum('ip_related_price'),
-            sum_ip_related_gross_price=ExpressionWrapper(
-                Sum(F('number_of_reactions') * F('base_ip_related_price_per_reaction')),
-                output_field=MoneyField(
-                    decimal_places=2, default_currency='USD', max_digits=8)),
-            sum_ip_related_discount = ExpressionWrapper(
-                Sum(
-                    F('number_of_reactions')
-                    * F('base_ip_related_price_per_reaction')
-                    - F('ip_related_price')),
-                output_field=MoneyField(
-                    decimal_places=2, default_currency='USD', max_digits=8)),
-            sum_number_of_reactions=Sum('number_of_reactions'),
-            sum_ip_related_discount_pct = Case(When(sum_number_of_reactions=0, then=None),
-                default=ExpressionWrapper(
-                    float(1)
-                    * (Sum(
-                        F('number_of_reactions')
-                        * F('base_ip_related_price_per_reaction')
-                        - F('ip_related_price')))
-                    / (Sum(
-                        F('number_of_reactions')
-                        * F('base_ip_related_price_per_reaction'))),
-                    output_field=models.FloatField())),
-            average_total_price_per_reaction=Case(When(sum_number_of_reactions=0, then=None),
-                default=ExpressionWrapper(
-                    1.0 * Sum('total_price') / Sum('number_of_reactions'),
-                    output_field=MoneyField(
-                        decimal_places=2, default_currency='USD', max_digits=8))),
-            sum_royalties_owed=ExpressionWrapper(
-                Sum('ip_related_price') * ROYALTY_PERCENTAGE,output_field=MoneyField(
-                    decimal_places=2, default_currency='USD', max_digits=8)),
-        ).order_by('transaction_type')
-        by_type = sorted(
-            by_type, key=lambda x: int(-1 * x['sum_total_price']))
-
-        for subreport in by_type:
-            t_type = subreport['transaction_type']
-            customers_by_type = customers.filter(
-                transactions__transaction_type=t_type, **c_kwargs,
-                **cid_c_kwargs)
-
-            if include_in_progress:
-                in_progress = Customer.objects.annotate(
-                    c_tx_count=Count('transactions__date', distinct=True)
-                ).filter(
-                    transactions__transaction_type=t_type,
-                    transactions__date_fulfilled__isnull=True, **cid_c_kwargs)
-                customers_by_type = customers_by_type.distinct() | in_progress.distinct()
-
-            repeat_customers_by_type = customers_by_type.filter(c_tx_count__gt=1)
-
-            subreport['customer_count'] = customers_by_type.count()
-            subreport['repeat_customer_count'] = repeat_customers_by_type.count()
+            for t in transactions if t.date_fulfilled is not None
+        }
+        with transaction.atomic():
+            self.bulk_create(transactions)
+            RoyaltySnapshot.objects.flag_edits(
+                {(year, quarter) for year, quarter, _ in periods})
+            for year, quarter, transaction_type in periods:
+                QuarterlyRevenue.objects.rebuild(
+                    year=year, quarter=quarter,
+                    transaction_type=transaction_type)
+            CustomerStats.objects.rebuild(
+                {t.customer_id for t in transactions})
+            VendorStats.objects.rebuild({t.vendor_id for t in transactions})
+            transaction.on_commit(invalidate_reports)
+            transaction.on_commit(forget_fulfilled_date_range)
+
+    def _build_imported_transaction(
+            self, row, customers, vendors, price_indexes):
+        values = {}
+        errors = []
+        for name in IMPORT_FIELDS:
+            field = self.model._meta.get_field(name)
+            value = row.get(name)
+            if value in (None, '') and field.blank:
+                value = None if field.null else field.get_default()
             try:
-                repeat_customer_pct = repeat_customers_by_type.count() / customers_by_type.count()
-            except ZeroDivisionError:
-                repeat_customer_pct = 0
-            subreport['repeat_customer_pct'] = repeat_customer_pct
-
-        report['by_type'] = by_type
-
-        return report
+                if isinstance(field, MoneyField) and value is not None:
+                    # MoneyField validators expect Money rather than a number.
+                    value = Money(
+                        field.to_python(value), field.default_currency)
+                values[name] = field.clean(value, None)
+            except ValidationError as e:
+                errors.extend(
+                    '{}: {}'.format(name, message) for message in e.messages)
+
+        for name, lookup in [('customer', customers), ('vendor', vendors)]:
+            if row.get(name):
+                try:
+                    values[name + '_id'] = lookup[row[name]]
+                except KeyError:
+                    errors.append('{}: {!r} does not exist'.format(
+                        name, row[name]))
+        if errors:
+            raise ValidationError(errors)
+
+        imported = self.model(**values)
+        # Resolve the index once per transaction type and batch.
+        if imported.transaction_type not in price_indexes:
+            price_indexes[imported.transaction_type] = get_price_period_index(
+                imported.transaction_type)
+        price = price_indexes[imported.transaction_type].get_price(
+            imported.date)
+        # Without a period in effect, store no base price, as repricing
+        # does.
+        imported.base_ip_related_price_per_reaction = (
+            Decimal('0.00') if price is None else price)
+        imported.set_derived_prices()
+        return imported
 
 
 class Transaction(models.Model):
 
     class Meta:
+        # Partial indexes on unfulfilled and outstanding transactions are
+        # created by migrations 0004 and 0010 where the database supports
+        # them. On SQLite, migrations that rebuild the table drop them, so
+        # such migrations must create them again.
+        indexes = [
+            models.Index(
+                fields=['date_fulfilled', 'transaction_type'],
+                name='revenue_tx_fulfilled_type_idx',
+            ),
+            models.Index(
+                fields=['transaction_type', 'date_fulfilled'],
+                name='revenue_tx_type_fulfilled_idx',
+            ),
+            models.Index(
+                fields=['customer', 'date'],
+                name='revenue_tx_customer_date_idx',
+            ),
+            models.Index(
+                fields=['-date', 'customer'],
+                name='revenue_tx_date_customer_idx',
+            ),
+        ]
         ordering = ['-date', 'customer']
 
     projects = models.ManyToManyField(
@@ -460,6 +1102,53 @@ class Transaction(models.Model):
     notes = models.TextField(
         blank=True,
     )
+    # Lowercased text of the fields searched in the admin, including those
+    # of the customer and vendor, so searches need no joins.
+    search_text = models.TextField(
+        blank=True,
+        editable=False,
+    )
+    # Derived from the prices above, and kept up to date on save and by
+    # repricing, so they can be sorted, filtered and summed in SQL. Null
+    # where the transaction panels show '-' (e.g., without a base price).
+    price_per_sample_amount = models.DecimalField(
+        blank=True,
+        decimal_places=2,
+        editable=False,
+        max_digits=14,
+        null=True,
+    )
+    ip_related_gross_price_amount = models.DecimalField(
+        blank=True,
+        decimal_places=2,
+        editable=False,
+        max_digits=14,
+        null=True,
+    )
+    ip_related_discount_amount = models.DecimalField(
+        blank=True,
+        decimal_places=2,
+        editable=False,
+        max_digits=14,
+        null=True,
+    )
+    ip_related_discount_ratio = models.FloatField(
+        blank=True,
+        editable=False,
+        null=True,
+    )
+    royalties_owed_amount = models.DecimalField(
+        blank=True,
+        decimal_places=2,
+        editable=False,
+        max_digits=14,
+        null=True,
+    )
+    # When anything shown in the transaction's panel row last changed,
+    # including its customer, vendor, documents and projects.
+    updated = models.DateTimeField(
+        auto_now=True,
+    )
 
     objects = RoyaltiesManager()
 
@@ -469,46 +1158,111 @@ class Transaction(models.Model):
             self.number_of_reactions)
 
     def save(self, *args, **kwargs):
-        for base_price_data in get_base_price_per_period(self.transaction_type):
-            start_date = base_price_data[0]
-            end_date = base_price_data[1]
-            price = base_price_data[2]
-            if start_date <= self.date <= end_date:
-                self.base_ip_related_price_per_reaction = price
-                break
+        price = get_price_period_index(self.transaction_type).get_price(
+            self.date)
+        if price is not None:
+            self.base_ip_related_price_per_reaction = price
+        self.set_derived_prices()
+        search_state = [getattr(self, name) for name in SEARCH_TEXT_FIELDS]
+        if search_state != getattr(self, '_search_state', None):
+            self.search_text = self.get_search_text()
         super().save(*args, **kwargs)
+        self._search_state = search_state
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Changes to the customer or vendor update the search text of
+        # their transactions (see ``signals``), so save() only needs to
+        # rebuild it when these fields change.
+        loaded = dict(zip(field_names, values))
+        instance._search_state = [
+            loaded.get(name) for name in SEARCH_TEXT_FIELDS]
+        return instance
+
+    def set_derived_prices(self):
+        """
+        Recompute the derived price columns from the prices, as
+        ``derived_price_expressions()`` does in SQL.
+        """
+        reactions = self.number_of_reactions
+        total_price = _amount(self.total_price)
+        ip_related_price = _amount(self.ip_related_price)
+        base_price = _amount(self.base_ip_related_price_per_reaction)
+
+        self.price_per_sample_amount = None
+        self.ip_related_gross_price_amount = None
+        self.ip_related_discount_amount = None
+        self.ip_related_discount_ratio = None
+        if reactions:
+            self.price_per_sample_amount = round_cents(
+                total_price / reactions)
+        if base_price != 0:
+            gross_price = round_cents(base_price * reactions)
+            self.ip_related_discount_amount = round_cents(
+                gross_price - ip_related_price)
+            if reactions:
+                self.ip_related_gross_price_amount = gross_price
+                # Divided in floating point, as in SQL.
+                self.ip_related_discount_ratio = (
+                    float(self.ip_related_discount_amount)
+                    / float(gross_price))
+        self.royalties_owed_amount = round_cents(
+            ip_related_price * Decimal(str(ROYALTY_PERCENTAGE)))
+
+    def get_search_text(self):
+        """Return the search text of the transaction as it is now."""
+        customer = vendor = ()
+        if self.customer_id is not None:
+            customer = Customer.objects.filter(
+                pk=self.customer_id
+            ).values_list(*CUSTOMER_SEARCH_FIELDS).first() or ()
+        if self.vendor_id is not None:
+            vendor = Vendor.objects.filter(
+                pk=self.vendor_id
+            ).values_list(*VENDOR_SEARCH_FIELDS).first() or ()
+        return build_search_text(
+            self.description, self.notes, *customer, *vendor)
 
     @property
     def ip_related_discount(self):
-        if self.base_ip_related_price_per_reaction == 0:
+        if self.ip_related_discount_amount is None:
             return '-'
-        else:
-            return (self.base_ip_related_price_per_reaction
-                * self.number_of_reactions
-                - self.ip_related_price)
+        return Money(
+            self.ip_related_discount_amount, self.ip_related_price_currency)
 
     @property
     def ip_related_discount_pct(self):
-        if self.base_ip_related_price_per_reaction == 0:
+        if self.ip_related_discount_ratio is None:
             return '-'
-        elif self.number_of_reactions == 0:
-            return '-'
-        else:
-            try:
-                return (self.ip_related_discount
-                    / (self.ip_related_price + self.ip_related_discount))
-            except:
-                return '-'
+        return self.ip_related_discount_ratio
 
     @property
     def ip_related_gross_price(self):
-        if self.base_ip_related_price_per_reaction == 0:
+        if self.ip_related_gross_price_amount is None:
             return '-'
-        elif self.number_of_reactions == 0:
-            return '-'
-        else:
-            return (self.base_ip_related_price_per_reaction
-                * self.number_of_reactions)
+        return Money(
+            self.ip_related_gross_price_amount, self.ip_related_price_currency)
+
+    @property
+    def fragment_version(self):
+        """
+        Return a stamp of what the transaction panels show of the
+        transaction, for keying its cached row: when it last changed, its
+        customer's lifetime stats (for the repeat-customer tooltip), and
+        today's date while the row shows how long it has been outstanding
+        or prepaid.
+        """
+        version = [self.updated.isoformat()]
+        if self.customer is not None:
+            version += [
+                self.customer.tx_count,
+                self.customer.reaction_count,
+                self.customer.total_revenue,
+            ]
+        if self.is_outstanding or self.is_prepaid:
+            version.append(datetime.date.today().isoformat())
+        return ':'.join(str(part) for part in version)
 
     @property
     def is_outstanding(self):
@@ -526,11 +1280,10 @@ class Transaction(models.Model):
 
     @property
     def royalties_owed(self):
-        return self.ip_related_price * ROYALTY_PERCENTAGE
+        return Money(self.royalties_owed_amount, self.ip_related_price_currency)
 
     @property
     def price_per_sample(self):
-        if self.number_of_reactions == 0:
-            return "-"
-        else:
-            return self.total_price / self.number_of_reactions
+        if self.price_per_sample_amount is None:
+            return '-'
+        return Money(self.price_per_sample_amount, self.total_price_currency)
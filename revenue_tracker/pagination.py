@@ -0,0 +1,172 @@
+import base64
+import binascii
+import functools
+import json
+import operator
+
+from django.db.models import F, Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    """A page of rows plus the cursors to the pages on either side of it."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by seeking past the last row of the previous page
+    instead of counting and skipping rows with OFFSET, so every page costs
+    the same however deep it is.
+
+    ``ordering`` lists field names (prefixed with '-' for descending order)
+    ending in one that is unique, such as 'pk'. Nulls sort last in either
+    direction. Cursors encode the ordering values of a row, which may be a
+    model instance or, for a ``values()`` queryset that includes the
+    ordering fields, a dict.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = []
+        for name in ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            if name == 'pk':
+                field = queryset.model._meta.pk
+            else:
+                field = queryset.model._meta.get_field(name)
+            self.ordering.append((name, descending, field))
+
+    def page(self, after=None, before=None):
+        """
+        Return the page of rows following the ``after`` cursor, or
+        preceding the ``before`` cursor, or else the first page.
+        """
+        if before:
+            rows = list(self.queryset.filter(
+                self._seek(self.decode(before), forward=False)
+            ).order_by(*self._order_by(forward=False))[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            queryset = self.queryset.order_by(*self._order_by(forward=True))
+            if after:
+                queryset = queryset.filter(
+                    self._seek(self.decode(after), forward=True))
+            rows = list(queryset[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = bool(after)
+
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode(rows[-1]) if rows and has_next else None,
+            previous_cursor=(
+                self.encode(rows[0]) if rows and has_previous else None),
+        )
+
+    def __iter__(self):
+        """Yield every row, one page-sized query at a time."""
+        page = self.page()
+        while True:
+            yield from page
+            if not page.has_next():
+                break
+            page = self.page(after=page.next_cursor)
+
+    def encode(self, obj):
+        values = [
+            self._value(obj, name, field) for name, descending, field
+            in self.ordering
+        ]
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(
+                cursor + '=' * (-len(cursor) % 4)).decode())
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise InvalidCursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise InvalidCursor(cursor)
+        try:
+            return [
+                None if value is None else field.to_python(value)
+                for (name, descending, field), value
+                in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise InvalidCursor(cursor)
+
+    def _value(self, obj, name, field):
+        if isinstance(obj, dict):
+            # A row of a values() queryset, keyed by the ordering names.
+            value = obj[name]
+            if value is None or isinstance(value, (int, str)):
+                return value
+            return str(value)
+        value = obj.pk if name == 'pk' else getattr(obj, field.attname)
+        if value is None or isinstance(value, (int, str)):
+            return value
+        return field.value_to_string(obj)
+
+    def _order_by(self, forward):
+        order_by = []
+        for name, descending, field in self.ordering:
+            expression = F(name)
+            if descending == forward:
+                order_by.append(expression.desc(
+                    nulls_last=forward, nulls_first=not forward))
+            else:
+                order_by.append(expression.asc(
+                    nulls_last=forward, nulls_first=not forward))
+        return order_by
+
+    def _seek(self, values, forward):
+        """
+        Return a filter for the rows after (or, if not ``forward``, before)
+        the row with the given ordering values.
+        """
+        conditions = []
+        equal = Q()
+        for (name, descending, field), value in zip(self.ordering, values):
+            if value is None:
+                # Nulls sort last, so only non-null values come before one.
+                if not forward:
+                    conditions.append(
+                        equal & Q(**{name + '__isnull': False}))
+                equal &= Q(**{name + '__isnull': True})
+                continue
+            lookup = 'lt' if descending == forward else 'gt'
+            beyond = Q(**{'{}__{}'.format(name, lookup): value})
+            if forward and field.null:
+                beyond |= Q(**{name + '__isnull': True})
+            conditions.append(equal & beyond)
+            equal &= Q(**{name: value})
+        return functools.reduce(operator.or_, conditions)
@@ -0,0 +1,81 @@
+"""
+A cache of royalties reports in Django's cache framework.
+
+Reports are keyed by their normalized filters and by the ``reports``
+version stamp. Signals bump the stamp whenever transactions, base prices,
+customers or institutions change, which makes every cached report stale at
+once; stale entries are left to expire.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .versioning import bump_version, get_version
+
+
+REPORT_CACHE_TIMEOUT = getattr(settings, 'ROYALTY_REPORT_CACHE_TIMEOUT', 3600)
+
+_STATS = ['hits', 'misses']
+
+
+def _stats_key(name):
+    return 'revenue_tracker:report_cache:{}'.format(name)
+
+
+def report_cache_key(name, kwargs):
+    """
+    Return the cache key of the report ``name`` with the filters
+    ``kwargs``. Filters that are not set, whether left out or passed as
+    None, False or '', share a key, as do dates and their ISO strings.
+    """
+    filters = sorted(
+        (key, str(value)) for key, value in kwargs.items()
+        if value not in (None, False, ''))
+    # Royalties depend on a setting as well as on the data.
+    digest = hashlib.md5(json.dumps(
+        [name, filters, getattr(settings, 'ROYALTY_PERCENTAGE', 0)]
+    ).encode()).hexdigest()
+    return 'revenue_tracker:report:{}:{}'.format(
+        get_version('reports'), digest)
+
+
+def cached_report(name, kwargs, compute):
+    """
+    Return the cached report ``name`` for ``kwargs``, calling ``compute``
+    to build and cache it on a miss.
+    """
+    key = report_cache_key(name, kwargs)
+    report = cache.get(key)
+    if report is None:
+        _count('misses')
+        report = compute()
+        cache.set(key, report, REPORT_CACHE_TIMEOUT)
+    else:
+        _count('hits')
+    return report
+
+
+def invalidate_reports():
+    """Mark every cached report as stale."""
+    bump_version('reports')
+
+
+def get_report_cache_stats():
+    """Return the report cache hit and miss counts."""
+    counts = cache.get_many([_stats_key(name) for name in _STATS])
+    return {name: counts.get(_stats_key(name), 0) for name in _STATS}
+
+
+def reset_report_cache_stats():
+    cache.delete_many([_stats_key(name) for name in _STATS])
+
+
+def _count(name):
+    # The counters are shared by every process using the cache.
+    if not cache.add(_stats_key(name), 1, None):
+        try:
+            cache.incr(_stats_key(name))
+        except ValueError:
+            pass
@@ -0,0 +1,163 @@
+"""
+Routing of the revenue tracker's read-only pages to a read replica.
+
+With ``ROYALTY_REPLICA_DATABASE`` set to the alias of a replica of the
+default database and ``ReplicaRouter`` in ``DATABASE_ROUTERS``, queries
+inside ``use_replica()`` blocks read from the replica. The list, detail,
+export and API views run in such a block (see ``read_from_replica``), as
+do royalties reports. Everything else, including every write and the
+admin, uses the default database, and so does a block:
+
+- for requests other than GET and HEAD, and for those of a browser that
+  made one in the last ``ROYALTY_REPLICA_STICKY_SECONDS`` (default: 10),
+  so users see their own changes (this needs ``ReplicaMiddleware``);
+- once something has been written in it, or inside a transaction;
+- when the report data changed in the last ``ROYALTY_REPLICA_STICKY_SECONDS``,
+  as the replica may not have caught up and reports read from it would be
+  cached as current.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.template.response import SimpleTemplateResponse
+
+from .versioning import get_version
+
+
+STICKY_COOKIE = 'revenue_tracker_primary'
+
+_local = threading.local()
+
+
+def get_replica_database():
+    """Return the alias of the replica, or ``None`` if there is none."""
+    return getattr(settings, 'ROYALTY_REPLICA_DATABASE', None)
+
+
+def get_sticky_seconds():
+    return getattr(settings, 'ROYALTY_REPLICA_STICKY_SECONDS', 10)
+
+
+def _writes():
+    return getattr(_local, 'writes', 0)
+
+
+def reading_from_replica():
+    """Return whether reads in this thread go to the replica right now."""
+    # The write count when the block began, or False for the default
+    # database.
+    block = getattr(_local, 'block', None)
+    return (
+        block is not None and block is not False and block == _writes()
+        and not connections[DEFAULT_DB_ALIAS].in_atomic_block)
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """
+    Read from the replica inside the block, if one is configured and
+    ``enabled``, unless an enclosing block reads from the default
+    database.
+    """
+    previous = getattr(_local, 'block', None)
+    if (previous is False or not enabled or get_replica_database() is None
+            or time.time() - get_version('reports') < get_sticky_seconds()):
+        _local.block = False
+    elif previous is None:
+        _local.block = _writes()
+    try:
+        yield
+    finally:
+        _local.block = previous
+
+
+def _can_read_from_replica(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and STICKY_COOKIE not in request.COOKIES)
+
+
+def _stream(content, enabled):
+    with use_replica(enabled):
+        yield from content
+
+
+def read_from_replica(view):
+    """
+    Decorate a view to read from the replica where it can, including
+    while its response is rendered or streamed.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        enabled = _can_read_from_replica(request)
+        with use_replica(enabled):
+            response = view(request, *args, **kwargs)
+            if isinstance(response, SimpleTemplateResponse):
+                response.render()
+        if response.streaming:
+            response.streaming_content = _stream(
+                response.streaming_content, enabled)
+        return response
+    return wrapper
+
+
+class ReplicaReadMixin:
+    """Make a class-based view read from the replica where it can."""
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return read_from_replica(super().as_view(**initkwargs))
+
+
+class ReplicaMiddleware:
+    """
+    Read from the default database throughout requests that may write
+    and, for ``ROYALTY_REPLICA_STICKY_SECONDS`` after them, throughout the
+    requests of the same browser, even in views that would read from the
+    replica.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if _can_read_from_replica(request):
+            response = self.get_response(request)
+        else:
+            with use_replica(False):
+                response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=get_sticky_seconds(),
+                httponly=True)
+        return response
+
+
+class ReplicaRouter:
+    """Send reads inside ``use_replica()`` blocks to the replica."""
+
+    def db_for_read(self, model, **hints):
+        if reading_from_replica():
+            return get_replica_database()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Later reads in the same block must see the write.
+        _local.writes = _writes() + 1
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, get_replica_database()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its tables from the default database.
+        if db == get_replica_database():
+            return False
+        return None
@@ -0,0 +1,307 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_init, post_save, pre_delete,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from customer_tracker.models import Contact, Customer, Institution
+from ngs_project_tracker.models import Project
+
+from .models import (
+    BasePrice, CustomerStats, Invoice, Order, QuarterlyRevenue, Quote,
+    RoyaltySnapshot, Transaction, Vendor, VendorStats,
+)
+from .models import people
+from .models.reports import (
+    forget_fulfilled_date_range, update_fulfilled_date_range,
+)
+from .models.transactions import reprice_transactions_on_commit
+from .report_cache import invalidate_reports
+from .versioning import bump_version
+
+
+# Models whose changes can alter a royalties report or an API response.
+REPORT_MODELS = {
+    BasePrice, Customer, Institution, RoyaltySnapshot, Transaction, Vendor,
+}
+
+# The transactions whose search text includes fields of an instance of each
+# model, by the lookups to that instance.
+SEARCH_TEXT_LOOKUPS = {
+    Contact: ['customer__contact', 'vendor__contact'],
+    Customer: ['customer'],
+    Institution: ['customer__institution'],
+    Vendor: ['vendor'],
+}
+
+# The transactions whose panel rows show fields of an instance of each
+# model, by the lookups to that instance.
+ROW_LOOKUPS = {
+    Customer: ['customer'],
+    Institution: ['customer__institution'],
+    Invoice: ['invoice'],
+    Order: ['order'],
+    Project: ['projects'],
+    Quote: ['quote'],
+    Vendor: ['vendor'],
+}
+
+# Models shown in the customer and vendor panels.
+CUSTOMER_PANEL_MODELS = {Contact, Customer, Institution, Vendor}
+
+
+def _related_transactions(instance, lookups):
+    condition = Q()
+    for lookup in lookups:
+        condition |= Q(**{lookup: instance.pk})
+    return Transaction.objects.filter(condition)
+
+
+def _rollup_period(transaction):
+    """Return the rollup bucket (year, quarter, type) of a transaction."""
+    if transaction.date_fulfilled is None:
+        return None
+    return (
+        transaction.date_fulfilled.year,
+        'Q{}'.format((transaction.date_fulfilled.month - 1) // 3 + 1),
+        transaction.transaction_type,
+    )
+
+
+def _rollup_state(transaction):
+    """
+    Return the rollup bucket of a transaction and the fields of it that
+    the sums of the bucket depend on.
+    """
+    return (
+        _rollup_period(transaction),
+        transaction.customer_id,
+        transaction.number_of_reactions,
+        transaction.total_price,
+        transaction.ip_related_price,
+        transaction.base_ip_related_price_per_reaction,
+    )
+
+
+def _snapshot_state(transaction):
+    """
+    Return the quarter (year, 'Qn') a transaction was fulfilled in and the
+    fields of it that the royalties report of that quarter depends on.
+    """
+    if transaction.date_fulfilled is None:
+        return None
+    return (
+        (transaction.date_fulfilled.year,
+            'Q{}'.format((transaction.date_fulfilled.month - 1) // 3 + 1)),
+        transaction.transaction_type,
+        transaction.customer_id,
+        transaction.number_of_reactions,
+        transaction.total_price,
+        transaction.ip_related_price,
+        transaction.base_ip_related_price_per_reaction,
+    )
+
+
+def _stats_state(transaction):
+    """Return the fields of a transaction its owners' stats depend on."""
+    return (
+        transaction.customer_id,
+        transaction.vendor_id,
+        transaction.transaction_type,
+        transaction.date,
+        transaction.number_of_reactions,
+        transaction.total_price,
+    )
+
+
+@receiver(post_init, sender=Transaction)
+def remember_saved_state(sender, instance, **kwargs):
+    instance._rollup_state = _rollup_state(instance)
+    instance._saved_date_fulfilled = instance.date_fulfilled
+    instance._stats_state = _stats_state(instance)
+    instance._snapshot_state = _snapshot_state(instance)
+
+
+@receiver(post_save, sender=Transaction)
+def update_lifetime_stats_on_save(sender, instance, created=False, **kwargs):
+    state = _stats_state(instance)
+    if created or state != instance._stats_state:
+        CustomerStats.objects.rebuild({instance._stats_state[0], state[0]})
+        VendorStats.objects.rebuild({instance._stats_state[1], state[1]})
+    instance._stats_state = state
+
+
+@receiver(post_delete, sender=Transaction)
+def update_lifetime_stats_on_delete(sender, instance, **kwargs):
+    CustomerStats.objects.rebuild({instance._stats_state[0]})
+    VendorStats.objects.rebuild({instance._stats_state[1]})
+
+
+# The range is adjusted once the change commits: adjusting it before would
+# let a reader cache it from the old data, and a rollback would leave it
+# adjusted.
+@receiver(post_save, sender=Transaction)
+def update_fulfilled_date_range_on_save(
+        sender, instance, using, raw=False, **kwargs):
+    if raw:
+        transaction.on_commit(forget_fulfilled_date_range, using=using)
+    else:
+        transaction.on_commit(partial(
+            update_fulfilled_date_range,
+            instance._saved_date_fulfilled, instance.date_fulfilled,
+        ), using=using)
+    instance._saved_date_fulfilled = instance.date_fulfilled
+
+
+@receiver(post_delete, sender=Transaction)
+def update_fulfilled_date_range_on_delete(sender, instance, using, **kwargs):
+    transaction.on_commit(partial(
+        update_fulfilled_date_range, instance._saved_date_fulfilled, None,
+    ), using=using)
+
+
+@receiver(post_save, sender=Transaction)
+def update_rollup_on_save(
+        sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    state = _rollup_state(instance)
+    if created or state != instance._rollup_state:
+        periods = {instance._rollup_state[0], state[0]} - {None}
+        for year, quarter, transaction_type in periods:
+            QuarterlyRevenue.objects.rebuild(
+                year=year, quarter=quarter,
+                transaction_type=transaction_type)
+    instance._rollup_state = state
+
+
+@receiver(post_delete, sender=Transaction)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    if instance._rollup_state[0] is not None:
+        year, quarter, transaction_type = instance._rollup_state[0]
+        QuarterlyRevenue.objects.rebuild(
+            year=year, quarter=quarter, transaction_type=transaction_type)
+
+
+# The rollup is keyed by the institution type of each transaction's
+# customer. Customers are saved through this app's proxy too.
+@receiver(post_init, sender=Customer)
+@receiver(post_init, sender=people.Customer)
+def remember_customer_institution(sender, instance, **kwargs):
+    instance._saved_institution_id = instance.institution_id
+
+
+@receiver(post_init, sender=Institution)
+def remember_institution_type(sender, instance, **kwargs):
+    instance._saved_institution_type = instance.institution_type
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=people.Customer)
+def update_rollup_on_customer_save(
+        sender, instance, created=False, raw=False, **kwargs):
+    if (not (created or raw) and
+            instance.institution_id != instance._saved_institution_id):
+        QuarterlyRevenue.objects.rebuild_for(
+            Transaction.objects.filter(customer=instance))
+    instance._saved_institution_id = instance.institution_id
+
+
+@receiver(post_save, sender=Institution)
+def update_rollup_on_institution_save(
+        sender, instance, created=False, raw=False, **kwargs):
+    if (not (created or raw) and
+            instance.institution_type != instance._saved_institution_type):
+        QuarterlyRevenue.objects.rebuild_for(
+            Transaction.objects.filter(customer__institution=instance))
+    instance._saved_institution_type = instance.institution_type
+
+
+@receiver(post_save, sender=Transaction)
+def flag_closed_period_edits_on_save(
+        sender, instance, created=False, **kwargs):
+    state = _snapshot_state(instance)
+    if created or state != instance._snapshot_state:
+        RoyaltySnapshot.objects.flag_edits({
+            saved[0] for saved in [instance._snapshot_state, state]
+            if saved is not None})
+    instance._snapshot_state = state
+
+
+@receiver(post_delete, sender=Transaction)
+def flag_closed_period_edits_on_delete(sender, instance, **kwargs):
+    if instance._snapshot_state is not None:
+        RoyaltySnapshot.objects.flag_edits({instance._snapshot_state[0]})
+
+
+@receiver(post_save, sender=BasePrice)
+@receiver(post_delete, sender=BasePrice)
+def invalidate_price_periods(sender, using, **kwargs):
+    # Bump now for this process, and again on commit in case another
+    # process rebuilt its index from the old prices in the meantime.
+    bump_version('base_prices')
+    transaction.on_commit(partial(bump_version, 'base_prices'), using=using)
+
+
+@receiver(post_save, sender=BasePrice)
+def reprice_loaded_price_period(sender, instance, raw=False, **kwargs):
+    # Fixture loads bypass BasePrice.save(); reprice once they commit.
+    if raw:
+        reprice_transactions_on_commit(
+            [(instance.transaction_type, instance.start_date)])
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_cached_reports(sender, using, **kwargs):
+    if sender._meta.concrete_model not in REPORT_MODELS:
+        return
+    # Invalidate now for this process, and again on commit in case another
+    # process cached a report from the old data in the meantime.
+    invalidate_reports()
+    transaction.on_commit(invalidate_reports, using=using)
+
+
+@receiver(post_save)
+def update_transaction_search_text(sender, instance, raw=False, **kwargs):
+    lookups = SEARCH_TEXT_LOOKUPS.get(sender._meta.concrete_model)
+    if lookups is None or raw:
+        return
+    Transaction.objects.update_search_text(
+        _related_transactions(instance, lookups))
+
+
+# Deletions are handled before they happen, while documents and projects
+# are still linked to their transactions.
+@receiver(post_save)
+@receiver(pre_delete)
+def touch_transaction_rows(sender, instance, **kwargs):
+    lookups = ROW_LOOKUPS.get(sender._meta.concrete_model)
+    if lookups is None:
+        return
+    _related_transactions(instance, lookups).update(updated=timezone.now())
+
+
+@receiver(m2m_changed, sender=Transaction.projects.through)
+def touch_transaction_rows_on_projects_change(
+        sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ['post_add', 'post_remove', 'pre_clear']:
+        return
+    if not reverse:
+        transactions = Transaction.objects.filter(pk=instance.pk)
+    elif action == 'pre_clear':
+        transactions = instance.transactions.all()
+    else:
+        transactions = Transaction.objects.filter(pk__in=pk_set)
+    transactions.update(updated=timezone.now())
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_customer_panels(sender, **kwargs):
+    if sender._meta.concrete_model in CUSTOMER_PANEL_MODELS:
+        bump_version('customers')
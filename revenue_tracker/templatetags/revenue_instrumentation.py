@@ -0,0 +1,44 @@
+from django import template
+
+from ..instrumentation import timed
+
+
+register = template.Library()
+
+
+class TimedNode(template.Node):
+
+    def __init__(self, name, labels, nodelist):
+        self.name = name
+        self.labels = labels
+        self.nodelist = nodelist
+
+    def render(self, context):
+        labels = [str(label.resolve(context)) for label in self.labels]
+        name = self.name
+        if any(labels):
+            name = '{} ({})'.format(name, ', '.join(filter(None, labels)))
+        with timed(name):
+            return self.nodelist.render(context)
+
+
+@register.tag('timed')
+def do_timed(parser, token):
+    """
+    Record the time spent rendering the block as a section of the request's
+    instrumentation, named by the first argument and labelled by the rest:
+
+        {% timed "transaction panel" panel_title %}...{% endtimed %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            '{} takes at least one argument.'.format(bits[0]))
+    name = bits[1]
+    if not (name[0] == name[-1] and name[0] in '"\''):
+        raise template.TemplateSyntaxError(
+            "{}'s first argument must be a quoted name.".format(bits[0]))
+    labels = [parser.compile_filter(bit) for bit in bits[2:]]
+    nodelist = parser.parse(('endtimed',))
+    parser.delete_first_token()
+    return TimedNode(name[1:-1], labels, nodelist)
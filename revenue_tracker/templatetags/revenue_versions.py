@@ -0,0 +1,14 @@
+from django import template
+
+from ..versioning import get_version
+
+
+register = template.Library()
+
+@register.simple_tag
+def version_stamp(name):
+    """
+    Return the current version stamp for ``name``, e.g. to key a cached
+    fragment: ``{% version_stamp "customers" as customers_version %}``.
+    """
+    return get_version(name)
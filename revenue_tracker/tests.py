@@ -1,3 +1,1608 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import itertools
+import json
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection, models, transaction
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    modify_settings, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ngs_project_tracker.models import Project
+
+from . import cube
+from .concurrency import run_concurrently
+from .models import (
+    BasePrice, Customer, CustomerStats, Invoice, Order, QuarterlyRevenue,
+    Quote, RoyaltySnapshot, Transaction, Vendor, VendorStats,
+)
+from .models.reports import (
+    forget_fulfilled_date_range, get_available_quarters,
+    get_fulfilled_date_range,
+)
+from .models.transactions import (
+    ROYALTY_PERCENTAGE, PricePeriodIndex, get_base_price_per_period,
+    get_price_period_index, reprice_transactions_on_commit)
+from .pagination import KeysetPaginator
+from .report_cache import get_report_cache_stats, reset_report_cache_stats
+from .routers import (
+    STICKY_COOKIE, ReplicaMiddleware, ReplicaRouter, read_from_replica,
+    use_replica)
+from .versioning import bump_version, get_version
+
+
+_serial = itertools.count()
+
+
+def create_object(model, **values):
+    """
+    Create an instance of ``model`` with ``values`` and made-up values for
+    its other required fields, so tests do not depend on the fields of
+    the models of ``customer_tracker`` and ``ngs_project_tracker``.
+    """
+    serial = next(_serial)
+    for field in model._meta.concrete_fields:
+        if (field.name in values or field.primary_key or field.null
+                or field.blank or field.has_default()):
+            continue
+        if field.choices:
+            values[field.name] = field.flatchoices[0][0]
+        elif isinstance(field, models.ForeignKey):
+            values[field.name] = create_object(field.related_model)
+        elif isinstance(field, models.EmailField):
+            values[field.name] = 'user{}@example.com'.format(serial)
+        elif isinstance(field, models.URLField):
+            values[field.name] = 'https://example.com/{}'.format(serial)
+        elif isinstance(field, models.FileField):
+            values[field.name] = '{}{}.pdf'.format(field.name, serial)
+        elif isinstance(field, (models.CharField, models.TextField)):
+            suffix = str(serial)
+            values[field.name] = field.name[
+                :max((field.max_length or 255) - len(suffix), 0)] + suffix
+        elif isinstance(field, models.DateTimeField):
+            values[field.name] = timezone.now()
+        elif isinstance(field, models.DateField):
+            values[field.name] = datetime.date(2018, 1, 1)
+        elif isinstance(field, models.BooleanField):
+            values[field.name] = False
+        else:
+            values[field.name] = serial % 100
+    return model.objects.create(**values)
+
+
+class TransactionPanelQueryCountTest(TestCase):
+    """
+    The transaction list pages must not issue queries per transaction row.
+    """
+    max_queries = 20
+
+    def setUp(self):
+        user = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        BasePrice.objects.create(
+            start_date=datetime.date(2018, 1, 1),
+            transaction_type='kit',
+            price_per_reaction=Decimal('10.00'),
+        )
+
+    def create_transactions(self, number, fulfilled=True):
+        # Each row has its own customer, vendor, documents and project, so
+        # that looking any of them up per row would add queries.
+        for day in range(number):
+            date = datetime.date(2018, 1, 1) + datetime.timedelta(days=day)
+            transaction = Transaction.objects.create(
+                transaction_type='kit',
+                customer=create_object(Customer),
+                vendor=create_object(Vendor),
+                quote=create_object(Quote),
+                order=create_object(Order),
+                invoice=create_object(Invoice),
+                number_of_reactions=4,
+                total_price=Decimal('100.00'),
+                ip_related_price=Decimal('80.00'),
+                date=date,
+                date_fulfilled=date if fulfilled else None,
+                date_paid=None,
+            )
+            transaction.projects.add(create_object(Project))
+
+    def count_queries(self, url):
+        # Saves forget the cached range on commit, which never comes here.
+        forget_fulfilled_date_range()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_query_count_is_bounded(self):
+        urls = [
+            reverse('revenue_tracker:transaction_list'),
+            reverse('revenue_tracker:pending_transactions_list'),
+            reverse('revenue_tracker:outstanding_invoices_list'),
+            reverse('admin:revenue_tracker_transaction_changelist'),
+        ]
+        self.create_transactions(1)
+        self.create_transactions(1, fulfilled=False)
+        few = [self.count_queries(url) for url in urls]
+
+        self.create_transactions(25)
+        self.create_transactions(25, fulfilled=False)
+        many = [self.count_queries(url) for url in urls]
+
+        self.assertEqual(few, many)
+        for url, count in zip(urls, many):
+            self.assertLessEqual(count, self.max_queries, url)
+
+    def test_admin_search(self):
+        self.create_transactions(3)
+        Transaction.objects.filter(date=datetime.date(2018, 1, 2)).update(
+            description='Rush order')
+        transaction = Transaction.objects.get(date=datetime.date(2018, 1, 3))
+        transaction.notes = 'Ordered by phone'
+        transaction.save()
+        url = reverse('admin:revenue_tracker_transaction_changelist')
+
+        Transaction.objects.update_search_text()
+        for search, expected in [
+                ('ORDER', 2), ('"rush order"', 1), ('phone order', 1),
+                ('missing', 0)]:
+            response = self.client.get(url, {'q': search})
+            self.assertEqual(
+                response.context['cl'].result_count, expected, search)
+
+
+    def test_search_text_is_rebuilt_only_when_needed(self):
+        customer = create_object(Customer)
+        Transaction.objects.create(
+            transaction_type='kit',
+            customer=customer,
+            number_of_reactions=4,
+            total_price=Decimal('100.00'),
+            ip_related_price=Decimal('80.00'),
+            date=datetime.date(2018, 1, 1),
+        )
+        transaction = Transaction.objects.get()
+        self.assertIn(customer.code.lower(), transaction.search_text)
+
+        transaction.total_price = Decimal('150.00')
+        with CaptureQueriesContext(connection) as context:
+            transaction.save()
+        self.assertFalse([
+            query for query in context
+            if Customer._meta.db_table in query['sql']])
+
+        transaction.notes = 'Ordered by phone'
+        transaction.save()
+        transaction.refresh_from_db()
+        self.assertIn('ordered by phone', transaction.search_text)
+        self.assertIn(customer.code.lower(), transaction.search_text)
+
+
+class KeysetPaginatorTest(TestCase):
+
+    def setUp(self):
+        BasePrice.objects.create(
+            start_date=datetime.date(2018, 1, 1),
+            transaction_type='kit',
+            price_per_reaction=Decimal('10.00'),
+        )
+        for day in range(10):
+            date = datetime.date(2018, 1, 1) + datetime.timedelta(days=day // 3)
+            Transaction.objects.create(
+                transaction_type='kit',
+                number_of_reactions=1,
+                total_price=Decimal('10.00'),
+                ip_related_price=Decimal('10.00'),
+                date=date,
+                date_fulfilled=date if day % 2 else None,
+            )
+        self.expected = sorted(
+            Transaction.objects.all(),
+            key=lambda t: (
+                -t.date.toordinal(), t.date_fulfilled is None,
+                t.date_fulfilled, t.pk))
+        self.paginator = KeysetPaginator(
+            Transaction.objects.all(), 3, ['-date', 'date_fulfilled', 'pk'])
+
+    def test_pages_forward_and_back(self):
+        pages = [self.paginator.page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.page(after=pages[-1].next_cursor))
+        self.assertEqual(
+            [t for page in pages for t in page], self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+        for previous, page in zip(pages, pages[1:]):
+            self.assertEqual(
+                self.paginator.page(before=page.previous_cursor).object_list,
+                previous.object_list)
+
+    def test_iterates_every_row(self):
+        self.assertEqual(list(self.paginator), self.expected)
+
+
+class ReportCacheTest(TestCase):
+
+    def setUp(self):
+        reset_report_cache_stats()
+        self.transaction = Transaction.objects.create(
+            transaction_type='kit',
+            number_of_reactions=4,
+            total_price=Decimal('100.00'),
+            ip_related_price=Decimal('80.00'),
+            base_ip_related_price_per_reaction=Decimal('0.00'),
+            date=datetime.date(2018, 1, 1),
+            date_fulfilled=datetime.date(2018, 1, 1),
+        )
+        self.kwargs = {
+            'from_date': datetime.date(2018, 1, 1),
+            'to_date': datetime.date(2018, 12, 31),
+        }
+
+    def test_repeated_reports_are_cached(self):
+        report = Transaction.objects.get_royalties_report(**self.kwargs)
+        with CaptureQueriesContext(connection) as context:
+            cached = Transaction.objects.get_royalties_report(
+                institution_type='', **self.kwargs)
+        self.assertEqual(len(context), 0)
+        self.assertEqual(cached, report)
+        self.assertEqual(get_report_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_changes_invalidate_reports(self):
+        Transaction.objects.get_royalties_report(**self.kwargs)
+        self.transaction.total_price = Decimal('150.00')
+        self.transaction.save()
+        report = Transaction.objects.get_royalties_report(**self.kwargs)
+        self.assertEqual(report['sum_total_price'], Decimal('150.00'))
+        self.assertEqual(get_report_cache_stats(), {'hits': 0, 'misses': 2})
+
+        BasePrice.objects.create(
+            start_date=datetime.date(2017, 1, 1),
+            transaction_type='kit',
+            price_per_reaction=Decimal('10.00'),
+        )
+        report = Transaction.objects.get_royalties_report(**self.kwargs)
+        self.assertEqual(
+            report['sum_ip_related_gross_price'], Decimal('40.00'))
+
+
+class RepeatCustomerTest(TestCase):
+
+    def create_transaction(self, customer, date):
+        return Transaction.objects.create(
+            transaction_type='kit',
+            customer=customer,
+            number_of_reactions=4,
+            total_price=Decimal('100.00'),
+            ip_related_price=Decimal('80.00'),
+            base_ip_related_price_per_reaction=Decimal('0.00'),
+            date=date,
+            date_fulfilled=date,
+        )
+
+    def test_repeat_customers_count_dates_outside_the_report(self):
+        repeat, once, same_day = [create_object(Customer) for _ in range(3)]
+        self.create_transaction(repeat, datetime.date(2017, 6, 1))
+        self.create_transaction(repeat, datetime.date(2018, 3, 1))
+        self.create_transaction(once, datetime.date(2018, 3, 1))
+        self.create_transaction(same_day, datetime.date(2018, 4, 1))
+        self.create_transaction(same_day, datetime.date(2018, 4, 1))
+
+        report = Transaction.objects.get_royalties_report(
+            from_date=datetime.date(2018, 1, 1),
+            to_date=datetime.date(2018, 12, 31))
+        self.assertEqual(report['customer_count'], 3)
+        self.assertEqual(report['repeat_customer_count'], 1)
+        self.assertEqual(report['by_type'][0]['repeat_customer_count'], 1)
+
+
+class RoyaltiesReportTest(TestCase):
+
+    def setUp(self):
+        for transaction_type, price in [('kit', '10.00'), ('service', '20.00')]:
+            BasePrice.objects.create(
+                start_date=datetime.date(2017, 1, 1),
+                transaction_type=transaction_type,
+                price_per_reaction=Decimal(price),
+            )
+        self.customers = [create_object(Customer) for _ in range(3)]
+        a, b, c = self.customers
+        for transaction_type, customer, reactions, total_price, \
+                ip_related_price, date, fulfilled in [
+                    ('kit', a, 4, '100.00', '30.00', (2018, 2, 1), True),
+                    ('kit', b, 2, '60.00', '20.00', (2018, 3, 1), True),
+                    ('service', a, 5, '300.00', '80.00', (2018, 5, 1), True),
+                    # No base price.
+                    ('other', c, 1, '10.00', '5.00', (2018, 6, 1), True),
+                    ('kit', b, 3, '90.00', '25.00', (2018, 7, 1), False),
+                    # Outside the report.
+                    ('kit', c, 1, '50.00', '10.00', (2017, 12, 1), True)]:
+            date = datetime.date(*date)
+            Transaction.objects.create(
+                transaction_type=transaction_type,
+                customer=customer,
+                number_of_reactions=reactions,
+                total_price=Decimal(total_price),
+                ip_related_price=Decimal(ip_related_price),
+                base_ip_related_price_per_reaction=Decimal('0.00'),
+                date=date,
+                date_fulfilled=date if fulfilled else None,
+            )
+        self.kwargs = {
+            'from_date': datetime.date(2018, 1, 1),
+            'to_date': datetime.date(2018, 12, 31),
+        }
+
+    def assertReport(self, report, expected):
+        self.assertEqual(
+            {key: report[key] for key in expected if key != 'by_type'},
+            {key: value for key, value in expected.items()
+                if key != 'by_type'})
+        self.assertEqual(
+            [subreport['transaction_type'] for subreport in report['by_type']],
+            [subreport['transaction_type'] for subreport in expected['by_type']])
+        for subreport, expected_subreport in zip(
+                report['by_type'], expected['by_type']):
+            self.assertEqual(
+                {key: subreport[key] for key in expected_subreport},
+                expected_subreport)
+
+    def get_expected(self, total_price, ip_related_price, gross_price,
+            reactions, customers, repeat_customers, **extra):
+        total_price, ip_related_price, gross_price = [
+            Decimal(value) for value in [
+                total_price, ip_related_price, gross_price]]
+        discount = gross_price - ip_related_price
+        return dict({
+            'sum_total_price': total_price,
+            'sum_ip_related_price': ip_related_price,
+            'sum_ip_related_gross_price': gross_price,
+            'sum_ip_related_discount': discount,
+            'sum_ip_related_discount_pct':
+                discount / gross_price if gross_price else 0,
+            'sum_number_of_reactions': reactions,
+            'average_total_price_per_reaction': total_price / reactions,
+            'sum_royalties_owed': float(ip_related_price) * ROYALTY_PERCENTAGE,
+            'customer_count': customers,
+            'repeat_customer_count': repeat_customers,
+        }, **extra)
+
+    def test_report_matches_hand_computed_sums(self):
+        # Every customer has transactions on two dates, if not all in the
+        # report.
+        kit = self.get_expected(
+            '160.00', '50.00', '60.00', 6, 2, 2, transaction_type='kit')
+        service = self.get_expected(
+            '300.00', '80.00', '100.00', 5, 1, 1, transaction_type='service')
+        other = self.get_expected(
+            '10.00', '5.00', '0.00', 1, 1, 1, transaction_type='other')
+        self.assertReport(
+            Transaction.objects.get_royalties_report(**self.kwargs),
+            self.get_expected(
+                '470.00', '135.00', '160.00', 12, 3, 3,
+                by_type=[service, kit, other]))
+
+        self.assertReport(
+            Transaction.objects.get_royalties_report(in_progress_only=True),
+            self.get_expected(
+                '90.00', '25.00', '30.00', 3, 1, 1,
+                by_type=[self.get_expected(
+                    '90.00', '25.00', '30.00', 3, 1, 1,
+                    transaction_type='kit')]))
+
+        kit = self.get_expected(
+            '250.00', '75.00', '90.00', 9, 2, 2, transaction_type='kit')
+        self.assertReport(
+            Transaction.objects.get_royalties_report(
+                include_in_progress=True, **self.kwargs),
+            self.get_expected(
+                '560.00', '160.00', '190.00', 15, 3, 3,
+                by_type=[service, kit, other]))
+
+    def test_types_match_reports_filtered_by_type(self):
+        report = Transaction.objects.get_royalties_report(**self.kwargs)
+        for subreport in report['by_type']:
+            filtered = Transaction.objects.get_royalties_report(
+                transaction_type=subreport['transaction_type'], **self.kwargs)
+            self.assertEqual(filtered['by_type'], [subreport])
+
+    def assertBundleAddsUp(self, bundle):
+        for key in [
+                'sum_total_price', 'sum_ip_related_price',
+                'sum_ip_related_gross_price', 'sum_number_of_reactions']:
+            self.assertEqual(
+                bundle['report'][key] + bundle['report_unfulfilled'][key],
+                bundle['report_including_unfulfilled'][key])
+
+    def test_bundle_reports_agree(self):
+        # One pass for the three reports, and a look for a closed period.
+        with self.assertNumQueries(4):
+            bundle = Transaction.objects.get_royalties_report_bundle(
+                **self.kwargs)
+        self.assertIsNone(bundle['closed_period'])
+        self.assertEqual(
+            bundle['report'],
+            Transaction.objects.get_royalties_report(**self.kwargs))
+        self.assertEqual(
+            bundle['report_unfulfilled'],
+            Transaction.objects.get_royalties_report(in_progress_only=True))
+        self.assertEqual(
+            bundle['report_including_unfulfilled'],
+            Transaction.objects.get_royalties_report(
+                include_in_progress=True, **self.kwargs))
+        self.assertBundleAddsUp(bundle)
+
+    def test_bundle_reports_agree_after_closed_period_changes(self):
+        RoyaltySnapshot.objects.close(2018)
+        closed_report = Transaction.objects.get_royalties_report(**self.kwargs)
+        transaction = Transaction.objects.get(transaction_type='service')
+        transaction.total_price = Decimal('400.00')
+        with self.assertLogs('revenue_tracker.models.reports', 'WARNING'):
+            transaction.save()
+
+        bundle = Transaction.objects.get_royalties_report_bundle(**self.kwargs)
+        self.assertIsNotNone(bundle['closed_period']['edited'])
+        self.assertEqual(
+            bundle['report']['sum_total_price'],
+            closed_report['sum_total_price'] + 100)
+        self.assertBundleAddsUp(bundle)
+
+    def test_query_count_does_not_depend_on_transaction_types(self):
+        # The sums by type, the customers by type and the repeat customers
+        # (with a range that is not a year or quarter, so that no closed
+        # period is looked up).
+        with self.assertNumQueries(3):
+            report = Transaction.objects.get_royalties_report(
+                from_date=datetime.date(2018, 1, 15),
+                to_date=datetime.date(2018, 12, 31))
+        self.assertEqual(len(report['by_type']), 3)
+
+
+class LifetimeStatsTest(TestCase):
+
+    def setUp(self):
+        self.customers = [create_object(Customer) for _ in range(2)]
+        self.vendors = [create_object(Vendor) for _ in range(2)]
+
+    def create_transaction(self, transaction_type, date, **values):
+        return Transaction.objects.create(**dict({
+            'transaction_type': transaction_type,
+            'customer': self.customers[0],
+            'vendor': self.vendors[0],
+            'number_of_reactions': 4,
+            'total_price': Decimal('100.00'),
+            'ip_related_price': Decimal('80.00'),
+            'base_ip_related_price_per_reaction': Decimal('0.00'),
+            'date': date,
+        }, **values))
+
+    def assertStatsMatchTransactions(self):
+        for model in [CustomerStats, VendorStats]:
+            def get_stats(rows):
+                return {
+                    (getattr(row, model.owner_field + '_id'),
+                        row.transaction_type): row.stats()
+                    for row in rows}
+            self.assertEqual(
+                get_stats(model.objects.all()),
+                get_stats(model.objects.compute()))
+            self.assertEqual(model.objects.verify(), [])
+
+    def test_stats_follow_transaction_changes(self):
+        a, b = self.customers
+        first = self.create_transaction('kit', datetime.date(2018, 1, 1))
+        self.assertStatsMatchTransactions()
+        second = self.create_transaction(
+            'service', datetime.date(2018, 2, 1), total_price=Decimal('50.00'))
+        self.assertStatsMatchTransactions()
+        stats = CustomerStats.objects.get(customer=a, transaction_type='')
+        self.assertEqual(
+            stats.stats(),
+            (datetime.date(2018, 1, 1), datetime.date(2018, 2, 1), 2, 2, 8,
+                Decimal('150.00')))
+
+        first.number_of_reactions = 6
+        first.date = datetime.date(2017, 12, 1)
+        first.save()
+        self.assertStatsMatchTransactions()
+
+        second.customer = b
+        second.vendor = self.vendors[1]
+        second.save()
+        self.assertStatsMatchTransactions()
+        self.assertEqual(
+            set(CustomerStats.objects.filter(customer=a).values_list(
+                'transaction_type', flat=True)),
+            {'', 'kit'})
+
+        first.delete()
+        self.assertStatsMatchTransactions()
+        self.assertFalse(CustomerStats.objects.filter(customer=a).exists())
+        self.assertFalse(VendorStats.objects.filter(
+            vendor=self.vendors[0]).exists())
+
+    def test_verify_and_rebuild_command(self):
+        self.create_transaction('kit', datetime.date(2018, 1, 1))
+        self.create_transaction('service', datetime.date(2018, 2, 1))
+        a = self.customers[0].pk
+        CustomerStats.objects.filter(transaction_type='').update(
+            total_revenue=0)
+        VendorStats.objects.filter(transaction_type='kit').delete()
+        self.assertEqual(CustomerStats.objects.verify(), [(a, '')])
+        self.assertEqual(
+            VendorStats.objects.verify(), [(self.vendors[0].pk, 'kit')])
+
+        stderr = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command(
+                'rebuild_revenue_stats', check=True, stdout=io.StringIO(),
+                stderr=stderr)
+        self.assertIn('(all) is out of date', stderr.getvalue())
+        self.assertEqual(len(CustomerStats.objects.verify()), 1)
+
+        stdout = io.StringIO()
+        call_command(
+            'rebuild_revenue_stats', stdout=stdout, stderr=io.StringIO())
+        self.assertIn('Rebuilt 3 customer stats rows.', stdout.getvalue())
+        self.assertStatsMatchTransactions()
+
+
+class RevenueStatsTest(TestCase):
+
+    def setUp(self):
+        self.customers = [create_object(Customer) for _ in range(3)]
+        self.vendors = [create_object(Vendor) for _ in range(3)]
+        a, b, c = self.customers
+        for customer, vendor, reactions, total_price, date in [
+                (a, self.vendors[0], 4, '100.00', (2018, 1, 1)),
+                (a, self.vendors[0], 2, '60.00', (2018, 2, 1)),
+                (a, self.vendors[1], 1, '500.00', (2018, 2, 1)),
+                (b, self.vendors[1], 8, '200.00', (2018, 3, 1))]:
+            Transaction.objects.create(
+                transaction_type='kit',
+                customer=customer,
+                vendor=vendor,
+                number_of_reactions=reactions,
+                total_price=Decimal(total_price),
+                ip_related_price=Decimal('10.00'),
+                base_ip_related_price_per_reaction=Decimal('0.00'),
+                date=datetime.date(*date),
+            )
+        user = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+
+    def get_stats(self, owners):
+        return [
+            (owner.pk, owner.tx_count, owner.transaction_count,
+                owner.reaction_count, owner.total_revenue)
+            for owner in owners]
+
+    def test_annotated_stats(self):
+        a, b, c = [customer.pk for customer in self.customers]
+        with self.assertNumQueries(1):
+            stats = self.get_stats(
+                Customer.objects.with_revenue_stats().order_by('pk'))
+        self.assertEqual(stats, [
+            (a, 2, 3, 7, Decimal('660.00')),
+            (b, 1, 1, 8, Decimal('200.00')),
+            (c, 0, 0, 0, 0),
+        ])
+        # The same as read from each one's stats.
+        self.assertEqual(
+            self.get_stats(Customer.objects.order_by('pk')), stats)
+
+    def get_changelist(self, model, column=None, descending=False):
+        model_admin = admin.site._registry[model]
+        query = {}
+        if column is not None:
+            index = list(model_admin.list_display).index(column) + 1
+            query['o'] = '-{}'.format(index) if descending else index
+        response = self.client.get(reverse(
+            'admin:revenue_tracker_{}_changelist'.format(
+                model._meta.model_name)), query)
+        self.assertEqual(response.status_code, 200)
+        return self.get_stats(response.context['cl'].result_list)
+
+    def test_changelist_columns_and_ordering(self):
+        a, b, c = [customer.pk for customer in self.customers]
+        # Customers without transactions are left out, as they always were.
+        self.assertEqual(
+            [row[0] for row in self.get_changelist(
+                Customer, 'total_revenue', descending=True)],
+            [a, b])
+        self.assertEqual(
+            [row[0] for row in self.get_changelist(Customer, 'reaction_count')],
+            [a, b])
+
+        x, y, z = [vendor.pk for vendor in self.vendors]
+        self.assertEqual(self.get_changelist(Vendor, 'total_revenue'), [
+            (z, 0, 0, 0, 0),
+            (x, 2, 2, 6, Decimal('160.00')),
+            (y, 2, 2, 9, Decimal('700.00')),
+        ])
+        self.assertEqual(
+            [row[0] for row in self.get_changelist(
+                Vendor, 'tx_count', descending=True)][-1],
+            z)
+
+
+class QuarterlyRevenueTest(TestCase):
+
+    def setUp(self):
+        self.transaction = Transaction.objects.create(
+            transaction_type='kit',
+            number_of_reactions=4,
+            total_price=Decimal('100.00'),
+            ip_related_price=Decimal('80.00'),
+            base_ip_related_price_per_reaction=Decimal('0.00'),
+            date=datetime.date(2018, 1, 1),
+            date_fulfilled=datetime.date(2018, 1, 1),
+        )
+
+    def test_only_changes_to_sums_rebuild(self):
+        table = QuarterlyRevenue._meta.db_table
+        self.transaction.notes = 'Shipped late'
+        with CaptureQueriesContext(connection) as context:
+            self.transaction.save()
+        self.assertFalse(
+            [query for query in context if table in query['sql']])
+
+        self.transaction.total_price = Decimal('150.00')
+        self.transaction.save()
+        self.transaction.date_fulfilled = datetime.date(2018, 4, 1)
+        self.transaction.save()
+        self.assertEqual(
+            list(QuarterlyRevenue.objects.values_list(
+                'year', 'quarter', 'total_price')),
+            [(2018, 2, Decimal('150.00'))])
+
+
+class RoyaltySnapshotTest(TestCase):
+
+    def setUp(self):
+        for date in [datetime.date(2018, 2, 1), datetime.date(2018, 5, 1)]:
+            Transaction.objects.create(
+                transaction_type='kit',
+                number_of_reactions=4,
+                total_price=Decimal('100.00'),
+                ip_related_price=Decimal('80.00'),
+                base_ip_related_price_per_reaction=Decimal('0.00'),
+                date=date,
+                date_fulfilled=date,
+            )
+
+    def test_closed_period_reports_are_frozen(self):
+        report = Transaction.objects.get_period_report(2018, 'Q1')
+        RoyaltySnapshot.objects.close(2018, 'Q1')
+
+        Transaction.objects.filter(
+            date_fulfilled=datetime.date(2018, 5, 1)
+        ).get().save()
+        self.assertIsNone(RoyaltySnapshot.objects.get().edited)
+
+        transaction = Transaction.objects.get(
+            date_fulfilled=datetime.date(2018, 2, 1))
+        transaction.total_price = Decimal('150.00')
+        with self.assertLogs('revenue_tracker.models.reports', 'WARNING'):
+            transaction.save()
+        self.assertIsNotNone(RoyaltySnapshot.objects.get().edited)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                Transaction.objects.get_period_report(2018, 'Q1'), report)
+        self.assertEqual(
+            Transaction.objects.get_royalties_report(
+                from_date='2018-01-01', to_date='2018-03-31'),
+            report)
+        self.assertEqual(
+            Transaction.objects.get_royalties_report(
+                from_date='2018-01-01', to_date='2018-03-31',
+                transaction_type='kit')['sum_total_price'],
+            Decimal('150.00'))
+
+    def test_close_checks_period(self):
+        RoyaltySnapshot.objects.close(2018)
+        with self.assertRaises(ValueError):
+            RoyaltySnapshot.objects.close(2018)
+        with self.assertRaises(ValueError):
+            RoyaltySnapshot.objects.close(datetime.date.today().year, 'Q4')
+
+
+class FragmentCacheTest(TestCase):
+
+    def setUp(self):
+        caches['template_fragments' if 'template_fragments' in settings.CACHES
+            else 'default'].clear()
+        user = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        self.transaction = Transaction.objects.create(
+            transaction_type='kit',
+            number_of_reactions=4,
+            total_price=Decimal('100.00'),
+            ip_related_price=Decimal('80.00'),
+            base_ip_related_price_per_reaction=Decimal('0.00'),
+            date=datetime.date(2018, 1, 1),
+            date_fulfilled=datetime.date(2018, 1, 1),
+            date_paid=datetime.date(2018, 2, 1),
+        )
+        self.url = reverse('revenue_tracker:transaction_list')
+
+    def test_rows_are_cached_until_saved(self):
+        self.assertContains(self.client.get(self.url), '4 rxns')
+
+        # Updates that bypass save() leave the cached row in place...
+        Transaction.objects.update(number_of_reactions=5)
+        self.assertContains(self.client.get(self.url), '4 rxns')
+
+        # ...until the transaction's stamp changes.
+        self.transaction.number_of_reactions = 6
+        self.transaction.save()
+        self.assertContains(self.client.get(self.url), '6 rxns')
+
+        BasePrice.objects.create(
+            start_date=datetime.date(2017, 1, 1),
+            transaction_type='kit',
+            price_per_reaction=Decimal('10.00'),
+        )
+        self.assertContains(self.client.get(self.url), '-US$20.00 (-33%)')
+
+
+class RunConcurrentlyTest(TransactionTestCase):
+
+    def setUp(self):
+        Transaction.objects.create(
+            transaction_type='kit',
+            number_of_reactions=4,
+            total_price=Decimal('100.00'),
+            ip_related_price=Decimal('80.00'),
+            base_ip_related_price_per_reaction=Decimal('0.00'),
+            date=datetime.date(2018, 1, 1),
+        )
+
+    def test_results_by_name(self):
+        results = run_concurrently(
+            count=Transaction.objects.count,
+            thread=lambda: threading.current_thread().name,
+            type=lambda: Transaction.objects.get().transaction_type,
+        )
+        self.assertEqual(results['count'], 1)
+        self.assertEqual(results['type'], 'kit')
+        self.assertTrue(results['thread'].startswith('revenue-report'))
+
+    def test_serial_in_transaction(self):
+        with transaction.atomic():
+            Transaction.objects.update(transaction_type='service')
+            results = run_concurrently(
+                thread=lambda: threading.current_thread().name,
+                type=lambda: Transaction.objects.get().transaction_type,
+            )
+        self.assertEqual(results['thread'], threading.current_thread().name)
+        self.assertEqual(results['type'], 'service')
+
+
+class PricePeriodIndexTest(TestCase):
+
+    def setUp(self):
+        self.today = datetime.date.today()
+        for start_date, price in [
+                (datetime.date(2017, 1, 1), '10.00'),
+                (datetime.date(2018, 7, 1), '12.00')]:
+            BasePrice.objects.create(
+                start_date=start_date,
+                transaction_type='kit',
+                price_per_reaction=Decimal(price),
+            )
+
+    def test_period_boundaries(self):
+        index = PricePeriodIndex([
+            (datetime.date(2018, 7, 1), Decimal('12.00')),
+            (datetime.date(2017, 1, 1), Decimal('10.00')),
+        ])
+        for date, price in [
+                (datetime.date(2016, 12, 31), None),
+                (datetime.date(2017, 1, 1), Decimal('10.00')),
+                (datetime.date(2018, 6, 30), Decimal('10.00')),
+                (datetime.date(2018, 7, 1), Decimal('12.00')),
+                (self.today, Decimal('12.00')),
+                # The latest period ends today.
+                (self.today + datetime.timedelta(days=1), None)]:
+            with self.subTest(date=date):
+                self.assertEqual(index.get_price(date), price)
+        self.assertIsNone(PricePeriodIndex([]).get_price(self.today))
+
+    def test_matches_price_periods(self):
+        index = get_price_period_index('kit')
+        periods = get_base_price_per_period('kit')
+        for date in [
+                datetime.date(2016, 12, 31), datetime.date(2017, 1, 1),
+                datetime.date(2018, 6, 30), datetime.date(2018, 7, 1),
+                self.today, self.today + datetime.timedelta(days=1)]:
+            with self.subTest(date=date):
+                self.assertEqual(
+                    index.get_price(date),
+                    next((price.amount for start_date, end_date, price
+                        in periods if start_date <= date <= end_date), None))
+
+    def test_future_transactions_keep_their_price(self):
+        future = self.today + datetime.timedelta(days=30)
+        transaction_ = Transaction.objects.create(
+            transaction_type='kit',
+            number_of_reactions=4,
+            total_price=Decimal('100.00'),
+            ip_related_price=Decimal('30.00'),
+            base_ip_related_price_per_reaction=Decimal('5.00'),
+            date=future,
+        )
+        BasePrice.objects.create(
+            start_date=datetime.date(2018, 1, 1),
+            transaction_type='kit',
+            price_per_reaction=Decimal('11.00'),
+        )
+        transaction_.refresh_from_db()
+        self.assertEqual(
+            transaction_.base_ip_related_price_per_reaction.amount,
+            Decimal('5.00'))
+        self.assertEqual(
+            transaction_.ip_related_gross_price_amount, Decimal('20.00'))
+
+
+class PricePeriodVersionTest(TransactionTestCase):
+
+    def test_bumped_again_on_commit(self):
+        # Other processes may have rebuilt their indexes from the old
+        # prices before the new ones were committed.
+        with transaction.atomic():
+            BasePrice.objects.create(
+                start_date=datetime.date(2018, 1, 1),
+                transaction_type='kit',
+                price_per_reaction=Decimal('10.00'),
+            )
+            version = get_version('base_prices')
+        self.assertNotEqual(get_version('base_prices'), version)
+
+    def test_repricing_waits_for_commit(self):
+        transaction_ = Transaction.objects.create(
+            transaction_type='kit',
+            number_of_reactions=4,
+            total_price=Decimal('100.00'),
+            ip_related_price=Decimal('80.00'),
+            base_ip_related_price_per_reaction=Decimal('0.00'),
+            date=datetime.date(2018, 3, 1),
+        )
+        period = ('kit', datetime.date(2018, 1, 1))
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                reprice_transactions_on_commit([period])
+                raise ValueError
+        with transaction.atomic():
+            # Bypasses BasePrice.save(), as fixture loading does.
+            BasePrice.objects.bulk_create([BasePrice(
+                start_date=datetime.date(2018, 1, 1),
+                transaction_type='kit',
+                price_per_reaction=Decimal('10.00'),
+            )])
+            reprice_transactions_on_commit([period])
+            reprice_transactions_on_commit([period])
+            transaction_.refresh_from_db()
+            self.assertEqual(
+                transaction_.base_ip_related_price_per_reaction.amount, 0)
+        transaction_.refresh_from_db()
+        self.assertEqual(
+            transaction_.base_ip_related_price_per_reaction.amount,
+            Decimal('10.00'))
+
+
+class RepricingTest(TestCase):
+
+    def setUp(self):
+        BasePrice.objects.create(
+            start_date=datetime.date(2017, 1, 1),
+            transaction_type='kit',
+            price_per_reaction=Decimal('10.00'),
+        )
+        for date in [
+                datetime.date(2017, 6, 1), datetime.date(2018, 2, 1),
+                datetime.date(2018, 5, 1)]:
+            Transaction.objects.create(
+                transaction_type='kit',
+                number_of_reactions=4,
+                total_price=Decimal('100.00'),
+                ip_related_price=Decimal('30.00'),
+                base_ip_related_price_per_reaction=Decimal('0.00'),
+                date=date,
+                date_fulfilled=date,
+            )
+
+    def get_updated(self):
+        return dict(Transaction.objects.values_list('date', 'updated'))
+
+    def reprice(self, start_date, price):
+        with CaptureQueriesContext(connection) as context:
+            BasePrice.objects.create(
+                start_date=start_date,
+                transaction_type='kit',
+                price_per_reaction=price,
+            )
+        # The statements and tables written to.
+        return [
+            query['sql'].split(' SET ')[0].split(' WHERE ')[0]
+            for query in context
+            if query['sql'].startswith(('UPDATE', 'DELETE'))]
+
+    def test_only_changed_prices_are_updated(self):
+        updated = self.get_updated()
+        rollup = list(QuarterlyRevenue.objects.values_list(
+            'year', 'quarter', 'ip_related_gross_price'))
+
+        update = 'UPDATE "{}"'.format(Transaction._meta.db_table)
+        flag = 'UPDATE "{}"'.format(RoyaltySnapshot._meta.db_table)
+        rebuild = 'DELETE FROM "{}"'.format(QuarterlyRevenue._meta.db_table)
+
+        # The same price as before changes nothing.
+        self.assertEqual(
+            self.reprice(datetime.date(2018, 1, 1), Decimal('10.00')),
+            [update])
+        self.assertEqual(self.get_updated(), updated)
+
+        # One UPDATE of the transactions, and the closed periods and rollup
+        # of the one quarter with a repriced transaction updated.
+        self.assertEqual(
+            self.reprice(datetime.date(2018, 4, 1), Decimal('20.00')),
+            [update, flag, rebuild])
+        changed = self.get_updated()
+        self.assertEqual(
+            [date for date in changed if changed[date] != updated[date]],
+            [datetime.date(2018, 5, 1)])
+        self.assertEqual(
+            list(Transaction.objects.order_by('date').values_list(
+                'base_ip_related_price_per_reaction',
+                'ip_related_gross_price_amount')),
+            [
+                (Decimal('10.00'), Decimal('40.00')),
+                (Decimal('10.00'), Decimal('40.00')),
+                (Decimal('20.00'), Decimal('80.00')),
+            ])
+        rollup[-1] = (2018, 2, Decimal('80.00'))
+        self.assertEqual(
+            list(QuarterlyRevenue.objects.values_list(
+                'year', 'quarter', 'ip_related_gross_price')),
+            rollup)
+
+
+@override_settings(
+    ROYALTY_REPLICA_DATABASE='replica', ROYALTY_REPLICA_STICKY_SECONDS=0)
+class ReplicaRouterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.view = ReplicaMiddleware(read_from_replica(
+            lambda request: HttpResponse(
+                self.router.db_for_read(Transaction))))
+
+    def test_reads_in_block(self):
+        self.assertIsNone(self.router.db_for_read(Transaction))
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Transaction), 'replica')
+            with use_replica(False):
+                self.assertIsNone(self.router.db_for_read(Transaction))
+                with use_replica():
+                    self.assertIsNone(self.router.db_for_read(Transaction))
+            self.assertEqual(self.router.db_for_read(Transaction), 'replica')
+            self.router.db_for_write(Transaction)
+            self.assertIsNone(self.router.db_for_read(Transaction))
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Transaction), 'replica')
+
+    @override_settings(ROYALTY_REPLICA_DATABASE=None)
+    def test_without_replica(self):
+        with use_replica():
+            self.assertIsNone(self.router.db_for_read(Transaction))
+
+    @override_settings(ROYALTY_REPLICA_STICKY_SECONDS=60)
+    def test_not_after_changes(self):
+        bump_version('reports')
+        with use_replica():
+            self.assertIsNone(self.router.db_for_read(Transaction))
+
+    def test_requests(self):
+        factory = RequestFactory()
+        response = self.view(factory.get('/'))
+        self.assertEqual(response.content, b'replica')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+        response = self.view(factory.post('/'))
+        self.assertEqual(response.content, b'None')
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+        request = factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        self.assertEqual(self.view(request).content, b'None')
+
+        # Views read from the default database unless they opt in.
+        view = ReplicaMiddleware(lambda request: HttpResponse(
+            self.router.db_for_read(Transaction)))
+        self.assertEqual(view(factory.get('/')).content, b'None')
+
+
+@modify_settings(MIDDLEWARE={
+    'append': 'revenue_tracker.instrumentation.InstrumentationMiddleware',
+})
+class InstrumentationTest(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        Transaction.objects.create(
+            transaction_type='kit',
+            number_of_reactions=4,
+            total_price=Decimal('100.00'),
+            ip_related_price=Decimal('80.00'),
+            base_ip_related_price_per_reaction=Decimal('0.00'),
+            date=datetime.date(2018, 1, 1),
+            date_fulfilled=datetime.date(2018, 1, 1),
+        )
+
+    def test_request_timings_are_logged(self):
+        url = reverse('revenue_tracker:transaction_list')
+        logger = 'revenue_tracker.instrumentation'
+        with self.assertLogs(logger, 'DEBUG') as logs:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        data = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(data['status'], 200)
+        self.assertEqual(data['queries'], len(context))
+        sections = [section['name'] for section in data['sections']]
+        self.assertIn('royalties_report_bundle', sections)
+        self.assertIn('summary panel (Completed)', sections)
+        self.assertIn('transaction panel (Pending)', sections)
+
+
+class JsonApiTest(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        self.transaction = Transaction.objects.create(
+            transaction_type='kit',
+            number_of_reactions=4,
+            total_price=Decimal('100.00'),
+            ip_related_price=Decimal('80.00'),
+            base_ip_related_price_per_reaction=Decimal('0.00'),
+            date=datetime.date(2018, 1, 1),
+            date_fulfilled=datetime.date(2018, 1, 1),
+        )
+
+    def test_conditional_get(self):
+        url = reverse('revenue_tracker:api_report') + '?year=2018'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['report']['sum_total_price'], '100.00')
+
+        response = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        self.transaction.total_price = Decimal('150.00')
+        self.transaction.save()
+        response = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['report']['sum_total_price'], '150.00')
+
+    def test_etag_covers_default_period(self):
+        url = reverse('revenue_tracker:api_report')
+        response = self.client.get(url)
+        self.assertEqual(response.json()['from_date'], '2018-01-01')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        # The same data, but a default period that has moved on.
+        period = (datetime.date(2018, 1, 1), datetime.date(2018, 3, 31))
+        with mock.patch(
+                'revenue_tracker.views.get_fulfilled_date_range',
+                return_value=period):
+            response = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['to_date'], '2018-03-31')
+
+    def test_endpoints(self):
+        for name in [
+                'api_customer_list', 'api_quarterly_series', 'api_report',
+                'api_transaction_list', 'api_vendor_list']:
+            response = self.client.get(reverse('revenue_tracker:' + name))
+            self.assertEqual(response.status_code, 200, name)
+        response = self.client.get(
+            reverse('revenue_tracker:api_transaction_list'))
+        self.assertEqual(
+            [row['id'] for row in response.json()['results']],
+            [self.transaction.pk])
+
+
+class FulfilledDateRangeTest(TransactionTestCase):
+
+    def setUp(self):
+        forget_fulfilled_date_range()
+        self.transactions = [
+            Transaction.objects.create(
+                transaction_type='kit',
+                number_of_reactions=1,
+                total_price=Decimal('10.00'),
+                ip_related_price=Decimal('10.00'),
+                base_ip_related_price_per_reaction=Decimal('0.00'),
+                date=date,
+                date_fulfilled=date,
+            )
+            for date in [
+                datetime.date(2018, 1, 1),
+                datetime.date(2018, 6, 1),
+                datetime.date(2018, 12, 1)]
+        ]
+
+    def assertDateRange(self, first, last):
+        self.assertEqual(get_fulfilled_date_range(), (first, last))
+        # The cached range must match the one computed from scratch.
+        forget_fulfilled_date_range()
+        self.assertEqual(get_fulfilled_date_range(), (first, last))
+
+    def test_range_follows_changes(self):
+        self.assertDateRange(
+            datetime.date(2018, 1, 1), datetime.date(2018, 12, 1))
+
+        self.transactions[1].date_fulfilled = datetime.date(2019, 1, 1)
+        self.transactions[1].save()
+        self.assertDateRange(
+            datetime.date(2018, 1, 1), datetime.date(2019, 1, 1))
+
+        self.transactions[0].date_fulfilled = None
+        self.transactions[0].save()
+        self.assertDateRange(
+            datetime.date(2018, 12, 1), datetime.date(2019, 1, 1))
+
+        self.transactions[1].delete()
+        self.assertDateRange(
+            datetime.date(2018, 12, 1), datetime.date(2018, 12, 1))
+
+    def test_rolled_back_changes_are_ignored(self):
+        get_fulfilled_date_range()
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                self.transactions[1].date_fulfilled = datetime.date(2019, 1, 1)
+                self.transactions[1].save()
+                raise ValueError
+        self.assertDateRange(
+            datetime.date(2018, 1, 1), datetime.date(2018, 12, 1))
+
+    def test_available_quarters_follow_commits(self):
+        self.assertNotIn((2019, 'Q1'), get_available_quarters())
+        with transaction.atomic():
+            self.transactions[1].date_fulfilled = datetime.date(2019, 1, 1)
+            self.transactions[1].save()
+            version = get_version('quarterly_revenue')
+        # Other processes may have read the quarters before the commit.
+        self.assertNotEqual(get_version('quarterly_revenue'), version)
+        self.assertIn((2019, 'Q1'), get_available_quarters())
+
+    def test_range_is_read_once_per_request(self):
+        user = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        get_fulfilled_date_range()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('revenue_tracker:transaction_list'))
+        self.assertFalse([
+            query for query in context
+            if 'MIN("revenue_tracker_transaction"."date_fulfilled")'
+            in query['sql']])
+
+
+class RevenueSeriesTest(TestCase):
+
+    def setUp(self):
+        for date, transaction_type in [
+                (datetime.date(2018, 1, 15), 'kit'),
+                (datetime.date(2018, 1, 20), 'service'),
+                (datetime.date(2018, 3, 31), 'kit')]:
+            Transaction.objects.create(
+                transaction_type=transaction_type,
+                number_of_reactions=2,
+                total_price=Decimal('100.00'),
+                ip_related_price=Decimal('80.00'),
+                base_ip_related_price_per_reaction=Decimal('0.00'),
+                date=date,
+                date_fulfilled=date,
+            )
+
+    def test_series_fills_gaps(self):
+        with CaptureQueriesContext(connection) as context:
+            series = Transaction.objects.get_revenue_series(
+                'month', to_date=datetime.date(2018, 4, 30))
+        self.assertEqual(len(context), 1)
+        self.assertEqual(
+            [(point['date'], point['sum_total_price'],
+                point['sum_number_of_reactions']) for point in series],
+            [
+                (datetime.date(2018, 1, 1), Decimal('200.00'), 4),
+                (datetime.date(2018, 2, 1), 0, 0),
+                (datetime.date(2018, 3, 1), Decimal('100.00'), 2),
+                (datetime.date(2018, 4, 1), 0, 0),
+            ])
+        self.assertEqual(
+            [(subreport['transaction_type'], subreport['transaction_count'])
+                for subreport in series[0]['by_type']],
+            [('kit', 1), ('service', 1)])
+
+    def test_series_granularities(self):
+        for granularity, length in [
+                ('week', 11), ('quarter', 1), ('year', 1)]:
+            series = Transaction.objects.get_revenue_series(granularity)
+            self.assertEqual(len(series), length, granularity)
+            self.assertEqual(
+                sum(point['transaction_count'] for point in series), 3)
+
+
+@skipIf(cube.numpy is None, 'NumPy is not installed.')
+class RoyaltyCubeTest(TestCase):
+
+    def setUp(self):
+        for date, transaction_type, date_fulfilled in [
+                (datetime.date(2018, 1, 15), 'kit', datetime.date(2018, 1, 20)),
+                (datetime.date(2018, 2, 1), 'service', datetime.date(2018, 5, 1)),
+                (datetime.date(2018, 6, 1), 'kit', None)]:
+            Transaction.objects.create(
+                transaction_type=transaction_type,
+                number_of_reactions=2,
+                total_price=Decimal('100.10'),
+                ip_related_price=Decimal('80.05'),
+                base_ip_related_price_per_reaction=Decimal('0.00'),
+                date=date,
+                date_fulfilled=date_fulfilled,
+            )
+        self.filters = [
+            {},
+            {'from_date': datetime.date(2018, 2, 1)},
+            {'to_date': '2018-03-31', 'include_in_progress': True},
+            {'in_progress_only': True},
+            {'transaction_type': 'service'},
+        ]
+
+    def assertMatchesReports(self, royalty_cube):
+        for filters in self.filters:
+            self.assertEqual(
+                royalty_cube.get_royalties_report(**filters),
+                Transaction.objects.get_royalties_report(**filters),
+                filters)
+
+    def test_reports_match_and_refresh(self):
+        royalty_cube = cube.RoyaltyCube().load()
+        self.assertMatchesReports(royalty_cube)
+
+        Transaction.objects.filter(transaction_type='service').update(
+            total_price=Decimal('20.00'), updated=timezone.now())
+        Transaction.objects.filter(date_fulfilled=None).delete()
+        Transaction.objects.create(
+            transaction_type='other',
+            number_of_reactions=1,
+            total_price=Decimal('10.00'),
+            ip_related_price=Decimal('10.00'),
+            base_ip_related_price_per_reaction=Decimal('0.00'),
+            date=datetime.date(2018, 3, 1),
+            date_fulfilled=datetime.date(2018, 3, 2),
+        )
+        with CaptureQueriesContext(connection) as context:
+            royalty_cube.refresh()
+        self.assertEqual(len(royalty_cube), 3)
+        self.assertMatchesReports(royalty_cube)
+        # The changed rows, the row count and the ids, and the repeat
+        # customers.
+        self.assertEqual(len(context), 4)
+
+    def test_group_by(self):
+        royalty_cube = cube.RoyaltyCube().load()
+        reports = royalty_cube.report(group_by=['transaction_type', 'quarter'])
+        self.assertEqual(
+            {key: report['sum_total_price'] for key, report in reports.items()},
+            {
+                ('kit', (2018, 'Q1')): Decimal('100.10'),
+                ('kit', None): Decimal('100.10'),
+                ('service', (2018, 'Q2')): Decimal('100.10'),
+            })
+        self.assertEqual(
+            reports[('kit', (2018, 'Q1'))],
+            Transaction.objects.get_royalties_report(
+                transaction_type='kit', from_date=datetime.date(2018, 1, 1),
+                to_date=datetime.date(2018, 3, 31)))
+
+
+class TransactionExportTest(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        BasePrice.objects.create(
+            start_date=datetime.date(2018, 1, 1),
+            transaction_type='kit',
+            price_per_reaction=Decimal('10.00'),
+        )
+        for date, reactions in [
+                (datetime.date(2017, 6, 1), 4),
+                (datetime.date(2018, 6, 1), 4),
+                (datetime.date(2018, 7, 1), 0)]:
+            Transaction.objects.create(
+                transaction_type='kit',
+                number_of_reactions=reactions,
+                total_price=Decimal('100.00'),
+                ip_related_price=Decimal('30.00'),
+                # Replaced on save when a base price is in effect.
+                base_ip_related_price_per_reaction=Decimal('0.00'),
+                date=date,
+                date_fulfilled=date,
+            )
+
+    def test_csv_has_computed_columns(self):
+        response = self.client.get(
+            reverse('revenue_tracker:transaction_export', args=['csv']),
+            {'from_date': '2017-01-01', 'to_date': '2018-12-31'})
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(io.StringIO(
+            b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), Transaction.objects.count())
+
+        columns = [
+            'IP-Related (Gross)', 'IP-Related Discount',
+            'IP-Related Discount %', 'Royalties Owed']
+        # Royalties are owed on the IP-related price at the configured rate.
+        royalties = str((Decimal('30.00') * Decimal(str(ROYALTY_PERCENTAGE))
+            ).quantize(Decimal('0.01')))
+        self.assertEqual(
+            {row['Date Ordered']: [row[column] for column in columns]
+                for row in rows},
+            {
+                # No base price in effect.
+                '2017-06-01': ['', '', '', royalties],
+                '2018-06-01': ['40.00', '10.00', '0.25', royalties],
+                # No reactions.
+                '2018-07-01': ['', '-30.00', '', royalties],
+            })
+
+    def test_derived_prices_follow_repricing(self):
+        BasePrice.objects.create(
+            start_date=datetime.date(2017, 1, 1),
+            transaction_type='kit',
+            price_per_reaction=Decimal('20.00'),
+        )
+        self.assertEqual(
+            list(Transaction.objects.order_by('date').values_list(
+                'date', 'ip_related_gross_price_amount',
+                'ip_related_discount_amount', 'price_per_sample_amount')),
+            [
+                (datetime.date(2017, 6, 1), Decimal('80.00'),
+                    Decimal('50.00'), Decimal('25.00')),
+                (datetime.date(2018, 6, 1), Decimal('40.00'),
+                    Decimal('10.00'), Decimal('25.00')),
+                (datetime.date(2018, 7, 1), None, Decimal('-30.00'), None),
+            ])
+
+
+@mock.patch('revenue_tracker.models.transactions.ROYALTY_PERCENTAGE', 0.025)
+class DerivedPriceTest(TestCase):
+
+    columns = [
+        'price_per_sample_amount', 'ip_related_gross_price_amount',
+        'ip_related_discount_amount', 'ip_related_discount_ratio',
+        'royalties_owed_amount']
+
+    def setUp(self):
+        BasePrice.objects.create(
+            start_date=datetime.date(2018, 1, 1),
+            transaction_type='kit',
+            price_per_reaction=Decimal('0.35'),
+        )
+        # Prices whose derived amounts fall halfway between two cents.
+        for total_price, ip_related_price in [
+                (Decimal('10.05'), Decimal('1.00')),
+                (Decimal('0.25'), Decimal('0.10')),
+                (Decimal('2.01'), Decimal('0.30'))]:
+            Transaction.objects.create(
+                transaction_type='kit',
+                number_of_reactions=2,
+                total_price=total_price,
+                ip_related_price=ip_related_price,
+                base_ip_related_price_per_reaction=Decimal('0.00'),
+                date=datetime.date(2018, 6, 1),
+                date_fulfilled=datetime.date(2018, 6, 1),
+            )
+
+    def get_derived_prices(self):
+        return list(Transaction.objects.order_by('pk').values_list(
+            *self.columns))
+
+    def test_saving_and_repricing_store_the_same_amounts(self):
+        saved = self.get_derived_prices()
+        self.assertEqual(
+            [row[0] for row in saved],
+            [Decimal('5.03'), Decimal('0.13'), Decimal('1.01')])
+        self.assertEqual(
+            [row[-1] for row in saved],
+            [Decimal('0.03'), Decimal('0.00'), Decimal('0.01')])
+
+        Transaction.objects.update_derived_prices()
+        self.assertEqual(self.get_derived_prices(), saved)
+
+        # Repricing back and forth also recomputes them in SQL.
+        base_price = BasePrice.objects.get()
+        base_price.price_per_reaction = Decimal('0.20')
+        base_price.save()
+        base_price.price_per_reaction = Decimal('0.35')
+        base_price.save()
+        self.assertEqual(self.get_derived_prices(), saved)
+
+    def test_sums_match_stored_amounts(self):
+        Transaction.objects.update_derived_prices()
+        sums = Transaction.objects.aggregate(
+            royalties=Sum('royalties_owed_amount'),
+            price_per_sample=Sum('price_per_sample_amount'))
+        self.assertEqual(
+            Decimal(str(sums['royalties'])).quantize(Decimal('0.01')),
+            sum(Transaction.objects.values_list(
+                'royalties_owed_amount', flat=True)))
+        self.assertEqual(
+            Decimal(str(sums['price_per_sample'])).quantize(Decimal('0.01')),
+            sum(Transaction.objects.values_list(
+                'price_per_sample_amount', flat=True)))
+
+
+class ImportTest(TestCase):
+
+    def setUp(self):
+        for code in ['C1', 'C2']:
+            create_object(Customer, code=code)
+        create_object(Vendor, name='V1')
+
+    def get_row(self, date, **values):
+        return {
+            'customer': 'C1',
+            'vendor': 'V1',
+            'transaction_type': 'kit',
+            'number_of_reactions': '4',
+            'total_price': '100.00',
+            'ip_related_price': '80.00',
+            'date': date,
+            'date_fulfilled': date,
+            **values,
+        }
+
+    def assertBookkeepingMatchesRebuild(self):
+        def rollup():
+            return list(QuarterlyRevenue.objects.values_list(
+                'year', 'quarter', 'transaction_type', 'institution_type',
+                'total_price', 'ip_related_price', 'ip_related_gross_price',
+                'number_of_reactions', 'number_of_transactions'))
+
+        maintained = rollup()
+        QuarterlyRevenue.objects.rebuild()
+        self.assertEqual(rollup(), maintained)
+        self.assertEqual(CustomerStats.objects.verify(), [])
+        self.assertEqual(VendorStats.objects.verify(), [])
+
+    def test_import_matches_rebuild(self):
+        result = Transaction.objects.bulk_import([
+            self.get_row('2018-02-01'),
+            self.get_row('2018-02-15', customer='C2', transaction_type='service'),
+            self.get_row('2018-05-01', date_fulfilled=''),
+            self.get_row('2018-06-01', customer=''),
+            self.get_row('2019-01-01', number_of_reactions='2'),
+        ], batch_size=2)
+        self.assertEqual(result, {'created': 5, 'errors': []})
+        self.assertEqual(Transaction.objects.count(), 5)
+        self.assertTrue(QuarterlyRevenue.objects.exists())
+        self.assertBookkeepingMatchesRebuild()
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        result = Transaction.objects.bulk_import([
+            self.get_row('2018-02-01'),
+            self.get_row('2018-02-02', number_of_reactions='many'),
+            self.get_row('2018-02-03', customer='C3'),
+            self.get_row('2018-02-04'),
+        ], batch_size=10)
+        self.assertEqual(result['created'], 2)
+        self.assertEqual(
+            [row_number for row_number, message in result['errors']], [2, 3])
+        self.assertIn('number_of_reactions', result['errors'][0][1])
+        self.assertIn("'C3' does not exist", result['errors'][1][1])
+        self.assertEqual(
+            list(Transaction.objects.order_by('date').values_list(
+                'date', flat=True)),
+            [datetime.date(2018, 2, 1), datetime.date(2018, 2, 4)])
+        self.assertBookkeepingMatchesRebuild()
+
+    def test_dry_run_writes_nothing(self):
+        RoyaltySnapshot.objects.close(2018, 'Q1')
+        with self.assertNumQueries(2):
+            result = Transaction.objects.bulk_import([
+                self.get_row('2018-02-01'),
+                self.get_row('2018-02-02', number_of_reactions='many'),
+            ], dry_run=True)
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(len(result['errors']), 1)
+        self.assertFalse(Transaction.objects.exists())
+        self.assertFalse(QuarterlyRevenue.objects.exists())
+        self.assertFalse(CustomerStats.objects.exists())
+        self.assertIsNone(RoyaltySnapshot.objects.get().edited)
+
+    def test_each_batch_commits_with_its_bookkeeping(self):
+        RoyaltySnapshot.objects.close(2018, 'Q1')
+        RoyaltySnapshot.objects.close(2018, 'Q2')
+        rebuild = VendorStats.objects.rebuild
+        calls = itertools.count()
+
+        def fail_second_batch(*args, **kwargs):
+            if next(calls):
+                raise RuntimeError
+            return rebuild(*args, **kwargs)
+
+        with mock.patch.object(
+                VendorStats.objects, 'rebuild', fail_second_batch), \
+                self.assertLogs('revenue_tracker.models.reports', 'WARNING'), \
+                self.assertRaises(RuntimeError):
+            Transaction.objects.bulk_import([
+                self.get_row('2018-02-01'),
+                self.get_row('2018-02-02', customer='C2'),
+                self.get_row('2018-05-01'),
+                self.get_row('2018-05-02', customer='C2'),
+            ], batch_size=2)
+
+        # The first batch and its bookkeeping were saved, and none of the
+        # second.
+        self.assertEqual(
+            list(Transaction.objects.order_by('date').values_list(
+                'date', flat=True)),
+            [datetime.date(2018, 2, 1), datetime.date(2018, 2, 2)])
+        self.assertEqual(
+            set(QuarterlyRevenue.objects.values_list('year', 'quarter')),
+            {(2018, 1)})
+        self.assertEqual(
+            [(snapshot.quarter, snapshot.edited is None)
+                for snapshot in RoyaltySnapshot.objects.order_by('quarter')],
+            [(1, False), (2, True)])
+        self.assertBookkeepingMatchesRebuild()
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            writer = csv.DictWriter(f, fieldnames=list(self.get_row('')))
+            writer.writeheader()
+            writer.writerow(self.get_row('2018-02-01'))
+            writer.writerow(self.get_row('2018-02-02', customer='C3'))
+            f.flush()
+            stdout, stderr = io.StringIO(), io.StringIO()
+            call_command(
+                'import_transactions', f.name, stdout=stdout, stderr=stderr)
+        self.assertIn('Imported 1 transactions; 1 rows have errors.',
+            stdout.getvalue())
+        self.assertIn("Row 2: customer: 'C3' does not exist", stderr.getvalue())
+        self.assertEqual(Transaction.objects.count(), 1)
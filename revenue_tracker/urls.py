@@ -1,13 +1,21 @@
 from django.conf.urls import url
 
-from . import views
+from . import api, views
 
 
 app_name = 'revenue_tracker'
 
 urlpatterns = [
+    url(r'^api/customers\.json$', api.CustomerListJson.as_view(), name='api_customer_list'),
+    url(r'^api/quarters\.json$', api.QuarterlySeriesJson.as_view(), name='api_quarterly_series'),
+    url(r'^api/report\.json$', api.ReportJson.as_view(), name='api_report'),
+    url(r'^api/series\.json$', api.RevenueSeriesJson.as_view(), name='api_revenue_series'),
+    url(r'^api/transactions\.json$', api.TransactionListJson.as_view(), name='api_transaction_list'),
+    url(r'^api/vendors\.json$', api.VendorListJson.as_view(), name='api_vendor_list'),
     url(r'^customer/$', views.CustomerList.as_view(), name='customer_list'),
     url(r'^customer/(?P<pk>\d+)/$', views.CustomerDetail.as_view(), name='customer_detail'),
+    url(r'^export/summary\.csv$', views.TransactionReportExport.as_view(), name='transaction_report_export'),
+    url(r'^export/transactions\.(?P<format>csv|xlsx)$', views.TransactionExport.as_view(), name='transaction_export'),
     url(r'^outstanding/$', views.OutstandingInvoicesList.as_view(), name='outstanding_invoices_list'),
     url(r'^pending/$', views.PendingTransactionsList.as_view(), name='pending_transactions_list'),
     url(r'^vendor/$', views.VendorList.as_view(), name='vendor_list'),
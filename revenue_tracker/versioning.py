@@ -0,0 +1,29 @@
+"""
+Version stamps shared between processes through Django's cache framework.
+
+A stamp is the time at which the data it covers last changed. Processes
+keep derived data (indexes, cached reports, ...) tagged with the stamp it
+was built from and rebuild it once the stamp moves on. If the cache loses
+a stamp, a new one is issued, so the worst case is a spurious rebuild.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def _key(name):
+    return 'revenue_tracker:version:{}'.format(name)
+
+
+def get_version(name):
+    """Return the current version stamp for ``name``."""
+    version = cache.get(_key(name))
+    if version is None:
+        cache.add(_key(name), time.time(), None)
+        version = cache.get(_key(name), time.time())
+    return version
+
+
+def bump_version(name):
+    """Mark the data covered by ``name`` as changed."""
+    cache.set(_key(name), time.time(), None)
@@ -1,29 +1,278 @@
+import csv
 import datetime
+import uuid
 
 from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.db.models import Count, Min, Max
+from django.db.models import Count
+from django.http import (
+    FileResponse, Http404, HttpResponse, StreamingHttpResponse,
+)
 from django.shortcuts import render
-from django.views.generic import DetailView, ListView
+from django.template.context import make_context
+from django.template.loader import get_template
+from django.utils.functional import cached_property
+from django.views.generic import DetailView, ListView, View
 
+from . import exports
+from .concurrency import run_concurrently
 from .models import Customer, Transaction, Vendor
+from .models.reports import get_available_quarters, get_fulfilled_date_range
+from .models.transactions import SERIES_TRUNCATIONS
+from .pagination import InvalidCursor, KeysetPaginator
+from .routers import ReplicaReadMixin
+
+
+def period_label(date, granularity):
+    """Return a label for the period of a revenue series starting on ``date``."""
+    if granularity == 'week':
+        return 'Week of {}'.format(date)
+    if granularity == 'month':
+        return date.strftime('%b %Y')
+    if granularity == 'quarter':
+        return '{} Q{}'.format(date.year, (date.month - 1) // 3 + 1)
+    return str(date.year)
+
+
+class Echo:
+    """A file-like object that returns what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_response(filename, rows):
+    """Stream rows to the client as a CSV file."""
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in rows), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(
+        filename)
+    return response
+
+
+def xlsx_response(filename, sheets):
+    """Send ``(title, rows)`` pairs to the client as an XLSX workbook."""
+    if exports.openpyxl is None:
+        return HttpResponse(
+            'XLSX export requires openpyxl.', content_type='text/plain',
+            status=501)
+    response = FileResponse(
+        exports.write_xlsx(sheets),
+        content_type=('application/vnd.openxmlformats-officedocument.'
+            'spreadsheetml.sheet'))
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(
+        filename)
+    return response
+
+
+class KeysetPaginationMixin:
+    """
+    Paginate a transaction list with keyset pagination: ``?after=`` and
+    ``?before=`` take the cursors of the neighbouring pages. With
+    ``?all=1``, every row is streamed to the client instead, fetched one
+    chunk at a time.
+    """
+    keyset_ordering = ['-date', 'customer_id', 'pk']
+    paginate_by = 100
+    row_template_name = 'revenue_tracker/_transaction_panel_item.html'
+    stream_chunk_size = 500
+
+    @property
+    def streaming(self):
+        return bool(self.request.GET.get('all'))
+
+    def get_paginate_by(self, queryset):
+        if self.streaming:
+            return None
+        return self.paginate_by
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_ordering)
+        try:
+            page = paginator.page(
+                after=self.request.GET.get('after'),
+                before=self.request.GET.get('before'))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor.')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def _page_url(self, **params):
+        query = self.request.GET.copy()
+        for name in ['after', 'before', 'all'] + list(params):
+            query.pop(name, None)
+        query.update(params)
+        return '?{}'.format(query.urlencode())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context['page_obj']
+        if page is not None:
+            if page.has_next():
+                context['next_page_url'] = self._page_url(
+                    after=page.next_cursor)
+            if page.has_previous():
+                context['previous_page_url'] = self._page_url(
+                    before=page.previous_cursor)
+            context['all_rows_url'] = self._page_url(all=1)
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        if not self.streaming:
+            return super().render_to_response(context, **response_kwargs)
+
+        # Render the page around an empty table, then stream the rows into
+        # the gap left at the marker.
+        queryset = context[self.context_object_name]
+        context[self.context_object_name] = []
+        context['stream_marker'] = uuid.uuid4().hex
+        response = super().render_to_response(context, **response_kwargs)
+        head, tail = response.rendered_content.split(
+            context['stream_marker'])
+        rows = KeysetPaginator(
+            queryset, self.stream_chunk_size, self.keyset_ordering)
+        return StreamingHttpResponse(
+            self._stream_rows(head, rows, tail, context),
+            content_type=response['Content-Type'],
+        )
+
+    def _stream_rows(self, head, rows, tail, context):
+        yield head
+        template = get_template(self.row_template_name).template
+        row_context = make_context(context, self.request)
+        with row_context.bind_template(template):
+            for transaction in rows:
+                with row_context.push(
+                        transaction=transaction, transaction_type='all'):
+                    yield template.render(row_context)
+        yield tail
+
+
+class TransactionFilterMixin:
+    """
+    Parse the period (``year`` and ``quarter``, or ``from_date`` and
+    ``to_date``) and type filters of the transaction list from the query
+    string.
+    """
+    _quarters = {
+        'Q1': ['01-01', '03-31'],
+        'Q2': ['04-01', '06-30'],
+        'Q3': ['07-01', '09-30'],
+        'Q4': ['10-01', '12-31'],
+    }
+
+    @cached_property
+    def transaction_date_range(self):
+        """
+        Return the requested period and the first and last dates fulfilled
+        as ``[from_date, to_date, first_date, last_date]``, computed once
+        per request.
+        """
+        year = self.request.GET.get('year', None)
+        quarter = self.request.GET.get('quarter', None)
+
+        first_fulfilled, last_fulfilled = get_fulfilled_date_range()
+
+        if year:
+            if quarter:
+                period = self._quarters[quarter]
+            else:
+                period = ['01-01', '12-31']
+
+            from_date='{}-{}'.format(year, period[0])
+            to_date='{}-{}'.format(year, period[1])
+
+        else:
+            from_date = self.request.GET.get('from_date', first_fulfilled)
+            to_date = self.request.GET.get('to_date', last_fulfilled)
+            if from_date == '':
+                from_date = first_fulfilled
+            if to_date == '':
+                to_date = last_fulfilled
+            if from_date is None:
+                from_date = datetime.date.today()
+            if to_date is None:
+                to_date = datetime.date.today()
+
+        if isinstance(from_date, str):
+            from_date = datetime.date(*[int(d) for d in from_date.split('-')])
+        if isinstance(to_date, str):
+            to_date = datetime.date(*[int(d) for d in to_date.split('-')])
+
+        first_date = first_fulfilled or from_date
+        last_date = last_fulfilled or to_date
+
+        return [from_date, to_date, first_date, last_date]
+
+    def get_type_kwargs(self):
+        institution_type = self.request.GET.get('institution_type', None)
+        transaction_type = self.request.GET.get('transaction_type', None)
+
+        type_kwargs = {}
+        if institution_type:
+            type_kwargs['customer__institution__institution_type'] = institution_type
+        if transaction_type:
+            type_kwargs['transaction_type'] = transaction_type
+        return type_kwargs
+
+    def get_filtered_queryset(self, queryset):
+        """Filter transactions by date fulfilled and type."""
+        transaction_date_range = self.transaction_date_range
+        return queryset.filter(
+            date_fulfilled__gte=transaction_date_range[0],
+            date_fulfilled__lte=transaction_date_range[1],
+            **self.get_type_kwargs(),
+        )
+
+    def get_series_granularity(self):
+        """
+        Return the ``granularity`` requested for a revenue series, or else
+        the finest one that keeps a series over the period short.
+        """
+        granularity = self.request.GET.get('granularity')
+        if granularity in SERIES_TRUNCATIONS:
+            return granularity
+        from_date, to_date = self.transaction_date_range[:2]
+        years = to_date.year - from_date.year
+        if years < 2:
+            return 'month'
+        if years < 8:
+            return 'quarter'
+        return 'year'
+
+    def get_revenue_series(self):
+        """Return the revenue series of the filtered transactions."""
+        from_date, to_date = self.transaction_date_range[:2]
+        return Transaction.objects.get_revenue_series(
+            self.get_series_granularity(),
+            from_date=from_date,
+            to_date=to_date,
+            institution_type=self.request.GET.get('institution_type', None),
+            transaction_type=self.request.GET.get('transaction_type', None))
 
+    def get_report(self):
+        """Return the royalties report for the filtered transactions."""
+        transaction_date_range = self.transaction_date_range
+        return Transaction.objects.get_royalties_report(
+            from_date=transaction_date_range[0],
+            to_date=transaction_date_range[1],
+            institution_type=self.request.GET.get('institution_type', None),
+            transaction_type=self.request.GET.get('transaction_type', None))
 
-class CustomerVendorDetailBase(PermissionRequiredMixin, DetailView):
+
+class CustomerVendorDetailBase(
+        ReplicaReadMixin, PermissionRequiredMixin, DetailView):
     context_object_name = 'customer'
     permission_required = 'revenue_tracker.view_transaction'
     template_name = 'revenue_tracker/customer_detail.html'
 
     def _transaction_date_range(self):
-        dates_fulfilled = Transaction.objects.values('date_fulfilled').aggregate(
-            Min('date_fulfilled'), Max('date_fulfilled'))
-        from_date = self.request.GET.get(
-            'from_date', dates_fulfilled['date_fulfilled__min'])
-        to_date = self.request.GET.get(
-            'to_date', dates_fulfilled['date_fulfilled__max'])
+        first_fulfilled, last_fulfilled = get_fulfilled_date_range()
+        from_date = self.request.GET.get('from_date', first_fulfilled)
+        to_date = self.request.GET.get('to_date', last_fulfilled)
         if from_date == '':
-            from_date = dates_fulfilled['date_fulfilled__min']
+            from_date = first_fulfilled
         if to_date == '':
-            to_date = dates_fulfilled['date_fulfilled__max']
+            to_date = last_fulfilled
         if from_date is None:
             from_date = datetime.date.today()
         if to_date is None:
@@ -37,9 +286,12 @@ class CustomerVendorDetailBase(PermissionRequiredMixin, DetailView):
         to_date=transaction_date_range[1]
         context['from_date'] = str(from_date)
         context['to_date'] = str(to_date)
-        context['tx_count'] = len(set(self.object.transactions.values_list('date')))
+        context['tx_count'] = self.object.tx_count
         return context
 
+    def get_queryset(self):
+        return self.model.objects.with_revenue_stats()
+
 
 class CustomerDetail(CustomerVendorDetailBase):
     model = Customer
@@ -50,58 +302,70 @@ class CustomerDetail(CustomerVendorDetailBase):
         context = super().get_context_data(**kwargs)
         from_date=context['from_date']
         to_date=context['to_date']
-        context['report'] = Transaction.objects.get_royalties_report(
-            from_date=from_date,
-            to_date=to_date,
-            customer_id=self.object.pk)
-        context['fulfilled_list'] = Transaction.objects.filter(
-            date_fulfilled__gte=from_date,
-            date_fulfilled__lte=to_date,
-            customer__pk=self.object.pk)
-        context['unfulfilled_list'] = Transaction.objects.filter(
-            date_fulfilled=None,
-            customer__pk=self.object.pk)
-        context['report_unfulfilled'] = Transaction.objects.get_royalties_report(
-            in_progress_only=True,
-            customer_id=self.object.pk)
-        context['report_including_unfulfilled'] = Transaction.objects.get_royalties_report(
-            from_date=from_date,
-            to_date=to_date,
-            include_in_progress=True,
-            customer_id=self.object.pk)
+        results = run_concurrently(
+            report=lambda: Transaction.objects.get_royalties_report_bundle(
+                from_date=from_date,
+                to_date=to_date,
+                customer_id=self.object.pk),
+            fulfilled_list=lambda: list(
+                Transaction.objects.for_display().filter(
+                    date_fulfilled__gte=from_date,
+                    date_fulfilled__lte=to_date,
+                    customer__pk=self.object.pk)),
+            unfulfilled_list=lambda: list(
+                Transaction.objects.for_display().filter(
+                    date_fulfilled=None,
+                    customer__pk=self.object.pk)),
+        )
+        context.update(results.pop('report'))
+        context.update(results)
         context['is_vendor'] = False
         return context
 
 
-class CustomerList(PermissionRequiredMixin, ListView):
+class CustomerList(ReplicaReadMixin, PermissionRequiredMixin, ListView):
     context_object_name = 'customer_list'
     model = Customer
     permission_denied_message = 'You do not have permission to view customers.'
     permission_required = 'revenue_tracker.view_transaction'
 
+    def get_queryset(self):
+        return Customer.objects.select_related(
+            'contact', 'institution').with_revenue_stats()
+
 
-class OutstandingInvoicesList(PermissionRequiredMixin, ListView):
+class OutstandingInvoicesList(
+        ReplicaReadMixin, KeysetPaginationMixin, PermissionRequiredMixin,
+        ListView):
     context_object_name = 'transaction_list'
     model = Transaction
     permission_denied_message = ('You do not have permission to view '
         'transactions with outstanding invoices.')
     permission_required = 'revenue_tracker.view_transaction'
+    keyset_ordering = ['date_fulfilled', 'customer_id', 'pk']
     template_name = 'revenue_tracker/outstanding_invoices_list.html'
 
     def get_context_data(self, **kwargs):
-        context = super(OutstandingInvoicesList, self).get_context_data(**kwargs)
+        results = run_concurrently(
+            page=lambda: super(OutstandingInvoicesList, self).get_context_data(
+                **kwargs),
+            report=lambda: Transaction.objects.get_royalties_report(
+                outstanding=True),
+        )
+        context = results['page']
         context['outstanding'] = True
-        context['report'] = Transaction.objects.get_royalties_report(
-            outstanding=True)
+        context['report'] = results['report']
         return context
 
     def get_queryset(self):
-        return Transaction.objects.filter(
+        return Transaction.objects.for_display().filter(
                 date_fulfilled__isnull=False, date_paid__isnull=True
             ).order_by('date_fulfilled')
 
 
-class PendingTransactionsList(PermissionRequiredMixin, ListView):
+class PendingTransactionsList(
+        ReplicaReadMixin, KeysetPaginationMixin, PermissionRequiredMixin,
+        ListView):
     context_object_name = 'transaction_list'
     model = Transaction
     permission_denied_message = ('You do not have permission to view pending '
@@ -110,16 +374,21 @@ class PendingTransactionsList(PermissionRequiredMixin, ListView):
     template_name = 'revenue_tracker/pending_transactions_list.html'
 
     def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
         transaction_type = self.request.GET.get('transaction_type', None)
         institution_type = self.request.GET.get('institution_type', None)
+        results = run_concurrently(
+            page=lambda: super(PendingTransactionsList, self).get_context_data(
+                **kwargs),
+            report=lambda: Transaction.objects.get_royalties_report(
+                in_progress_only=True,
+                institution_type=institution_type,
+                transaction_type=transaction_type,
+            ),
+        )
+        context = results['page']
         context['transaction_type'] = transaction_type
         context['institution_type'] = institution_type
-        context['report'] = Transaction.objects.get_royalties_report(
-            in_progress_only=True,
-            institution_type=institution_type,
-            transaction_type=transaction_type,
-        )
+        context['report'] = results['report']
         return context
 
     def get_queryset(self):
@@ -132,147 +401,136 @@ class PendingTransactionsList(PermissionRequiredMixin, ListView):
         if transaction_type:
             type_kwargs['transaction_type'] = transaction_type
 
-        return Transaction.objects.filter(
+        return Transaction.objects.for_display().filter(
             date_fulfilled=None,
             **type_kwargs,
         )
 
 
-class TransactionDetail(PermissionRequiredMixin, DetailView):
+class TransactionDetail(
+        ReplicaReadMixin, PermissionRequiredMixin, DetailView):
     context_object_name = 'transaction'
     model = Transaction
     permission_denied_message = ('You do not have permission to transaction '
         'details.')
     permission_required = 'revenue_tracker.view_transaction'
 
+    def get_queryset(self):
+        return Transaction.objects.for_display()
+
+
+class TransactionExport(
+        ReplicaReadMixin, TransactionFilterMixin, PermissionRequiredMixin,
+        View):
+    """
+    Export the transactions shown by ``TransactionList`` (with the same
+    filters) as CSV, streamed as it is read, or as an XLSX workbook that
+    also has a sheet with their royalties report, which is written to a
+    temporary file before it is sent.
+    """
+    chunk_size = 2000
+    permission_denied_message = ('You do not have permission to export '
+        'transactions.')
+    permission_required = 'revenue_tracker.view_transaction'
 
-class TransactionList(PermissionRequiredMixin, ListView):
+    def get(self, request, *args, **kwargs):
+        rows = exports.transaction_rows(
+            self.get_filtered_queryset(Transaction.objects.all()),
+            chunk_size=self.chunk_size)
+        if kwargs['format'] == 'xlsx':
+            return xlsx_response('transactions.xlsx', [
+                ('Transactions', rows),
+                ('Summary', exports.report_rows(self.get_report())),
+            ])
+        return csv_response('transactions.csv', rows)
+
+
+class TransactionList(
+        ReplicaReadMixin, KeysetPaginationMixin, TransactionFilterMixin,
+        PermissionRequiredMixin, ListView):
     context_object_name = 'transaction_list'
     model = Transaction
     permission_denied_message = ('You do not have permission to view '
         'transactions.')
     permission_required = 'revenue_tracker.view_transaction'
 
-    _quarters = {
-        'Q1': ['01-01', '03-31'],
-        'Q2': ['04-01', '06-30'],
-        'Q3': ['07-01', '09-30'],
-        'Q4': ['10-01', '12-31'],
-    }
-
-    def _transaction_date_range(self):
-        year = self.request.GET.get('year', None)
-        quarter = self.request.GET.get('quarter', None)
-
-        dates_fulfilled = Transaction.objects.values('date_fulfilled').aggregate(
-            Min('date_fulfilled'), Max('date_fulfilled'))
-
-        if year:
-            if quarter:
-                period = self._quarters[quarter]
-            else:
-                period = ['01-01', '12-31']
-
-            from_date='{}-{}'.format(year, period[0])
-            to_date='{}-{}'.format(year, period[1])
-
-        else:
-            from_date = self.request.GET.get(
-                'from_date', dates_fulfilled['date_fulfilled__min'])
-            to_date = self.request.GET.get(
-                'to_date', dates_fulfilled['date_fulfilled__max'])
-            if from_date == '':
-                from_date = dates_fulfilled['date_fulfilled__min']
-            if to_date == '':
-                to_date = dates_fulfilled['date_fulfilled__max']
-            if from_date is None:
-                from_date = datetime.date.today()
-            if to_date is None:
-                to_date = datetime.date.today()
-
-        if isinstance(from_date, str):
-            from_date = datetime.date(*[int(d) for d in from_date.split('-')])
-        if isinstance(to_date, str):
-            to_date = datetime.date(*[int(d) for d in to_date.split('-')])
-
-        first_date = dates_fulfilled['date_fulfilled__min'] or from_date
-        last_date = dates_fulfilled['date_fulfilled__max'] or to_date
-
-        return [from_date, to_date, first_date, last_date]
-
     def get_context_data(self, **kwargs):
-        context = super(TransactionList, self).get_context_data(**kwargs)
-        transaction_date_range = self._transaction_date_range()
+        transaction_date_range = self.transaction_date_range
         from_date=transaction_date_range[0]
         to_date=transaction_date_range[1]
         first_date=transaction_date_range[2]
         last_date=transaction_date_range[3]
+        transaction_type = self.request.GET.get('transaction_type', None)
+        institution_type = self.request.GET.get('institution_type', None)
+
+        # The page, the reports, the revenue series and the unfulfilled
+        # transactions are independent, so fetch them all at once.
+        results = run_concurrently(
+            page=lambda: super(TransactionList, self).get_context_data(
+                **kwargs),
+            report=lambda: Transaction.objects.get_royalties_report_bundle(
+                from_date=from_date,
+                to_date=to_date,
+                institution_type=institution_type,
+                transaction_type=transaction_type),
+            series=self.get_revenue_series,
+            available_quarters=get_available_quarters,
+            unfulfilled_list=lambda: list(
+                Transaction.objects.for_display().filter(
+                    date_fulfilled=None, **self.get_type_kwargs())),
+        )
+        context = results['page']
 
+        available_quarters = results['available_quarters']
         tx_date_range = {}
         for year in range(first_date.year, last_date.year + 1):
-            tx_date_range[year] = []
-            for quarter, quarter_range in self._quarters.items():
-                if Transaction.objects.filter(
-                    date_fulfilled__gte='{}-{}'.format(year, quarter_range[0]),
-                    date_fulfilled__lte='{}-{}'.format(year, quarter_range[1])
-                ):
-                    tx_date_range[year].append(quarter)
+            tx_date_range[year] = [
+                quarter for quarter in self._quarters
+                if (year, quarter) in available_quarters]
 
         context['tx_date_range'] = tx_date_range
         context['year'] = self.request.GET.get('year', None)
         context['quarter'] = self.request.GET.get('quarter', None)
-        transaction_type = self.request.GET.get('transaction_type', None)
-        institution_type = self.request.GET.get('institution_type', None)
         context['transaction_type'] = transaction_type
         context['institution_type'] = institution_type
-        context['report'] = Transaction.objects.get_royalties_report(
-            from_date=from_date,
-            to_date=to_date,
-            institution_type=institution_type,
-            transaction_type=transaction_type)
+        context.update(results['report'])
         context['from_date'] = str(from_date)
         context['to_date'] = str(to_date)
 
-        type_kwargs = {}
-        if institution_type:
-            type_kwargs['customer__institution__institution_type'] = institution_type
-        if transaction_type:
-            type_kwargs['transaction_type'] = transaction_type
-        context['unfulfilled_list'] = Transaction.objects.filter(
-            date_fulfilled=None, **type_kwargs)
-
-        context['report_including_unfulfilled'] = Transaction.objects.get_royalties_report(
-            from_date=from_date,
-            to_date=to_date,
-            institution_type=institution_type,
-            transaction_type=transaction_type,
-            include_in_progress=True)
-        context['report_unfulfilled'] = Transaction.objects.get_royalties_report(
-            institution_type=institution_type,
-            transaction_type=transaction_type,
-            in_progress_only=True)
+        context['unfulfilled_list'] = results['unfulfilled_list']
+        context['export_query'] = self._page_url()[1:]
+
+        granularity = self.get_series_granularity()
+        series = results['series']
+        context['series_granularity'] = granularity
+        context['series_max_total_price'] = max(
+            [point['sum_total_price'] for point in series] + [0])
+        context['revenue_series'] = [
+            (period_label(point['date'], granularity), point)
+            for point in series]
+        context['series_granularity_urls'] = [
+            (name, self._page_url(granularity=name))
+            for name in SERIES_TRUNCATIONS]
         return context
 
     def get_queryset(self):
-        transaction_date_range = self._transaction_date_range()
-        if transaction_date_range == [None, None]:
-            return None
-        else:
-            type_kwargs = {}
+        return self.get_filtered_queryset(Transaction.objects.for_display())
 
-            institution_type = self.request.GET.get('institution_type', None)
-            transaction_type = self.request.GET.get('transaction_type', None)
 
-            if institution_type:
-                type_kwargs['customer__institution__institution_type'] = institution_type
-            if transaction_type:
-                type_kwargs['transaction_type'] = transaction_type
+class TransactionReportExport(
+        ReplicaReadMixin, TransactionFilterMixin, PermissionRequiredMixin,
+        View):
+    """
+    Return the royalties report summarized by ``TransactionList`` (with the
+    same filters) as CSV.
+    """
+    permission_denied_message = ('You do not have permission to export '
+        'transactions.')
+    permission_required = 'revenue_tracker.view_transaction'
 
-            return Transaction.objects.filter(
-                date_fulfilled__gte=transaction_date_range[0],
-                date_fulfilled__lte=transaction_date_range[1],
-                **type_kwargs,
-            )
+    def get(self, request, *args, **kwargs):
+        return csv_response(
+            'transaction-summary.csv', exports.report_rows(self.get_report()))
 
 
 class VendorDetail(CustomerVendorDetailBase):
@@ -284,20 +542,27 @@ class VendorDetail(CustomerVendorDetailBase):
         context = super().get_context_data(**kwargs)
         from_date=context['from_date']
         to_date=context['to_date']
-        context['fulfilled_list'] = Transaction.objects.filter(
-            date_fulfilled__gte=from_date,
-            date_fulfilled__lte=to_date,
-            vendor__pk=self.object.pk)
-        context['unfulfilled_list'] = Transaction.objects.filter(
-            date_fulfilled=None,
-            vendor__pk=self.object.pk)
+        context.update(run_concurrently(
+            fulfilled_list=lambda: list(
+                Transaction.objects.for_display().filter(
+                    date_fulfilled__gte=from_date,
+                    date_fulfilled__lte=to_date,
+                    vendor__pk=self.object.pk)),
+            unfulfilled_list=lambda: list(
+                Transaction.objects.for_display().filter(
+                    date_fulfilled=None,
+                    vendor__pk=self.object.pk)),
+        ))
         context['is_vendor'] = True
         return context
 
 
-class VendorList(PermissionRequiredMixin, ListView):
+class VendorList(ReplicaReadMixin, PermissionRequiredMixin, ListView):
     context_object_name = 'vendor_list'
     model = Vendor
     permission_denied_message = 'You do not have permission to view vendors.'
     permission_required = 'revenue_tracker.view_transaction'
     template_name = 'revenue_tracker/customer_list.html'
+
+    def get_queryset(self):
+        return Vendor.objects.select_related('contact').with_revenue_stats()
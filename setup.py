@@ -58,4 +58,8 @@ setup(
         'Topic :: Office/Business :: Financial :: Accounting',
     ],
     install_requires=install_requires,
+    extras_require={
+        'cube': ['numpy>=1.13'],
+        'xlsx': ['openpyxl>=2.5'],
+    },
 )